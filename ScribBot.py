@@ -22,14 +22,25 @@ You can improve it farther or create your own one.
 
 
 
-from phi.agent.agent import Agent
-from phi.model.groq.groq import Groq
-from phi.tools.duckduckgo import DuckDuckGo
-from phi.tools.googlesearch import GoogleSearch
-from phi.tools.wikipedia import WikipediaTools
-from dotenv import load_dotenv
-import datetime, time, json, os
+if __name__ == "__main__":
+    # Settings are read from the environment when the modules below are
+    # imported, so .env is loaded first. Importing this file (tests,
+    # benchmarks, worker processes) doesn't touch the environment.
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+from core import agent_pool, followup_pool, model_router, chat_history, analyze_notes, extract_and_format, create_markdown
+from history import HISTORY, FOLLOWUP_WINDOW, chat_context
+from tool_classifier import route_stats
+from telegram_reply import TELEGRAM_LIMIT, deliver, retry_after
+from scheduler import ChatScheduler, QueueFull
+from webhook import run_webhook, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH
+from workers import WorkerPool, build_front_application, WORKERS
+from metrics import span, timed, trace, count, start_metrics_server
+import asyncio, argparse, os, time
 from telegram import Update
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -39,293 +50,138 @@ from telegram.ext import (
 )
 
 
-load_dotenv()
-
-BOT_TOKEN = os.getenv("BOT_API_KEY")
-
-now = datetime.datetime.now()
-datetime_creation = now.strftime('%Y-%m-%d %H:%M')
-
+# How many notes are analyzed at the same time, each one in its own worker
+# thread (map-reduce and parallel verification run several agents for
+# one message, limited by the agent pools). Other messages wait for a
+# free slot instead of blocking the whole bot.
+MAX_CONCURRENT_RUNS = int(os.getenv("SCRIBE_MAX_CONCURRENT_RUNS", "4"))
+agent_run_slots = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
 
+# Streaming: show each section (Ideas, Assumptions, ...) as soon as the
+# model finished writing it, by editing the "processing" message.
+# Telegram limits how often a message can be edited, so edits are throttled.
+STREAMING = os.getenv("SCRIBE_STREAMING", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("SCRIBE_STREAM_EDIT_INTERVAL", "1.5"))  # seconds
 
 
 # ===============================================
-#                 Pure Utilities
+#            Side-effect Utilities
 # ===============================================
+# A function has side effects if it does anything
+# beyond returning a value.
 
-def parse_response_content(response: str):
-    """
-    Get the agent response and parse it to a valid JSON 
-    """
-    if not response or not response.strip():
-        raise ValueError("Agent returned empty response")
-
-    response = response.strip()
-
-    # Remove markdown fences if present
-    if response.startswith("```"):
-        response = response.strip("`")
-        response = response.replace("json", "", 1).strip()
-
-    # Remove wrapping quotes 
-    if (
-        (response.startswith("'") and response.endswith("'")) or
-        (response.startswith('"') and response.endswith('"'))
-    ):
-        response = response[1:-1].strip()
-
-    try:
-        return json.loads(response)
-    except json.JSONDecodeError as e:
-        raise ValueError(
-            f"Invalid JSON returned by agent:\n{e}\n\nRaw response:\n{response}"
-        )
-
-
-
-def extract_and_format(parsed_resopnse,cat_name):
+async def has_followup_context(chat_id):
     """
-    Extract the values of each key in the response
+    The chat got a result recently, so a short message is a follow-up.
     """
-    content = ""
-    for elem in parsed_resopnse[cat_name]:
-        content += f"- {elem}\n"
-    return content 
-
+    if not HISTORY:
+        return False
+    recent = await asyncio.to_thread(chat_history.recent, chat_id, limit=1, since=time.time() - FOLLOWUP_WINDOW)
+    return bool(recent)
 
 
-# ===============================================
-#            Side-effect Utilities
-# ===============================================
-# A function has side effects if it does anything
-# beyond returning a value.
-
+@timed("get_text")
 async def get_text(update):
     """
-    Receive user input (from telegram bot)
+    Receive user input (from telegram bot). Short messages are only
+    accepted as follow-ups (see history.py).
     """
     text = update.message.text
-    if len(text.strip()) < 40:
+    if len(text.strip()) < 40 and not await has_followup_context(update.effective_chat.id):
         await update.message.reply_text("message is too short. It must has more than 40 chars.")
         return None
-    await update.message.reply_text(f"Received and proccesing...")
     return text
 
 
-def safe_agent_run(agent,prompt, retries=3, delay=0.5):
-
-    """
-    Slow down retries of external API/tools if first 
-    try failed, to avoid rate-limiting, temp-ban or IP block.
-    """
-
-    for i in range(retries):
-        try:
-            response = agent.run(prompt)
-            return response
-        except Exception as e:
-            print(f"Attempt {i+1} failed: {e}")
-            time.sleep(delay * (2 ** i))  # Exponential backoff
-    raise RuntimeError("All retries failed.")
-
-
-# ===============================================
-#            Prompt and Instructions 
-# ===============================================
-# Notes: 
-# The more precise prompt is, the better result you get.
-# Instructions: Who the agent is and how it should behave
-# Prompt: What the agent should do right now
-
-
-def build_prompt(user_message):
-    return  f"""
-You are an expert brainstorm helper assistant.
-
-You have access to the following tools:
-["Google Search", "Wikipedia", "DuckDuckGo"]
-
-Use tools ONLY when external knowledge is required to verify facts,
-check assumptions, or provide reliable resources.
-Do NOT search unnecessarily.
-
-The user provides raw brainstorm notes as plain text.
-The notes may be messy, informal, incomplete, or contain assumptions,
-questions, spelling mistakes, and mixed ideas.
-
-Your responsibilities:
-
-1. Organize the content into clear ideas without changing the meaning.
-2. Correct obvious spelling mistakes ONLY when the meaning is clear.
-3. Identify assumptions made by the user (explicit or implicit).
-4. For each assumption:
-   - State it clearly using this format:
-     "Your assumption was: <assumption>"
-   - Verify it using reliable sources when needed.
-   - Respond with:
-     - "Yes, this assumption is correct."
-     - OR "No, this assumption is incorrect. The correct information is: <correction>"
-5. Identify questions in the notes (explicit or implied).
-   - If answering requires external knowledge, use tools.
-   - Present answers in a clear question → answer style.
-6. Extract and provide helpful resources related to the topic.
-   Resources may include:
-     - Official websites
-     - Trusted articles
-     - Books
-     - Videos
-     - Communities
-   Prefer official and well-established sources.
-7. Write a short, clear summary of the topic in simple language.
-8. Provide practical, realistic recommendations to help the user move forward.
-9. Generate a short, clear title that reflects the main topic.
-
-IMPORTANT RULES:
-- Do NOT invent facts or questions.
-- Do NOT over-correct grammar or rewrite the user's ideas.
-- Do NOT include unverified or low-quality resources.
-- Keep answers realistic and grounded.
-- Maintain a consistent response structure.
-
-Resources rule:
-- Do NOT blindly reuse links found in the user's notes.
-- If links appear in the notes, treat them as "user-saved links".
-- Only include a link in "Resources" if it is relevant, trustworthy,
-  and adds value beyond what the user already provided.
-- Prefer adding NEW, high-quality resources when possible.
-- If no better resources exist, you may include selected user links,
-  but only after evaluation.
-
-Summary rule:
-- The Summary MUST reflect the final understanding after analysis.
-- It should be based on the verified answers and assumption checks,
-  NOT a recap of the user's original notes.
-- The summary should answer: "What should the user now understand?"
-
-CLARIFICATIONS:
-- "Resources" must be curated by you. Do NOT automatically reuse links
-  found in the user's notes unless they are evaluated and still useful.
-- The "Summary" must summarize the conclusions and insights you produced
-  after verification, not the user's raw brainstorm.
-
-INVALID INPUT:
-- If the input is meaningless, empty, or non-textual, return ONLY:
-
-
-  "error": "Invalid or insufficient content"
-
-
-OUTPUT FORMAT (MANDATORY):
-- Return ONE valid JSON object.
-- No markdown.
-- No explanations.
-- No text outside JSON.
-- Output MUST start with '{' and end with '}'.
-
-JSON SCHEMA (STRICT):
-
-  "Ideas": ["string"],
-  "Assumptions": ["string"],
-  "Assumption Checks": ["string"],
-  "Questions": ["string"],
-  "Verified Answers": ["string"],
-  "Resources": ["string"],
-  "Summary": ["string"],
-  "Recommendations": ["string"],
-  "Title": "string",
-  "Tools": ["string"]
-
-
-User brainstorm message content:
-\"\"\"{user_message}\"\"\"
-"""
-
-
-INSTRUCTIONS = [
-    "You are an expert brainstorm helper agent.",
-    "Your primary role is to help the user clarify and structure their raw brainstorm notes.",
-    "You may use Google Search, DuckDuckGo, and Wikipedia ONLY when external knowledge is required.",
-    "Do NOT use tools unnecessarily or by default.",
-    "Keep answers realistic, grounded, and concise.",
-   """Resources rule (STRICT):
-- Only include resources if they add NEW value beyond common knowledge.
-- If no high-quality external resource is clearly useful, return an empty list.
-- Do NOT include generic sites by default.
-""",
-"""
-Tool selection rules:
-- Use Google Search first then DuckDuckGo if needed for specific, up-to-date, or complex queries (like salaries, visa requirements, local regulations).
-- Use Wikipedia only for general knowledge, definitions, or historical/contextual info.
-- If Wikipedia returns PageError, do not retry infinitely; move on to search engines.
-"""
-]
-
-
 # ===============================================
-#              Agent Configuration
+#           Layout (formatting output) 
 # ===============================================
 
-AGENT_SCRIBE_CONFIG = {
-    "name": "Scribe",
-    "model":[
-        "llama-3.3-70b-versatile",
-        "moonshotai/kimi-k2-instruct-0905",
-        "openai/gpt-oss-120b",
-    ],
-    "tools": [GoogleSearch(), DuckDuckGo(), WikipediaTools()],
-    "instructions": INSTRUCTIONS,
-}
-
-
-def agent_scribe(config):
-    return Agent(
-        name=config["name"],
-        model=Groq(id=config["model"][1]),
-        tools=config["tools"],
-        instructions=config["instructions"],
-        show_tool_calls=False,
-        markdown=False,
+def create_partial_markdown(sections):
+    """
+    Format the sections received so far (while streaming)
+    """
+    labels = [
+        ("Ideas", "Ideas"),
+        ("Assumptions", "Assumptions"),
+        ("Assumption Checks", "Checked Assumptions"),
+        ("Questions", "Questions Found"),
+        ("Verified Answers", "Questions Answered"),
+        ("Resources", "Resources"),
+        ("Recommendations", "Recommendations"),
+        ("Summary", "Summary"),
+    ]
+    result = f"*{sections.get('Title', 'Working on it...')}*\n\n"
+    for key, label in labels:
+        if isinstance(sections.get(key), list):
+            result += f"*{label}*\n{extract_and_format(sections, key)}\n"
+    result += "_still working..._"
+    return result
 
-    )
 
 # ===============================================
-#           Layout (formatting output) 
+#       Telegram Bot & User Interactions 
 # ===============================================
 
-def create_markdown(parsed_response):
+class ProgressMessage:
+    """
+    The "Received and processing..." message, edited while the answer
+    is streamed. Edits are throttled to STREAM_EDIT_INTERVAL.
     """
-    Format the response into a markdown for telegram
+
+    def __init__(self, message):
+        self.message = message
+        self.last_edit = 0.0
+        self.last_text = message.text
+
+    async def update(self, text):
+        if time.monotonic() - self.last_edit < STREAM_EDIT_INTERVAL:
+            return
+        if len(text) > TELEGRAM_LIMIT:
+            # Only a preview: the full answer is split when it's done
+            text = text[:TELEGRAM_LIMIT - 100] + "...\n\n_still working..._"
+        try:
+            await self.edit(text)
+        except TelegramError as e:
+            # Only a preview: a flood limit or network error here must not
+            # stop the run (the final answer is sent by telegram_reply.py)
+            print(f"Progress edit failed, still streaming: {e}")
+            if isinstance(e, RetryAfter):
+                # No more previews until Telegram accepts edits again
+                self.last_edit = time.monotonic() + retry_after(e)
+            count("scribe_progress_edit_errors_total", error=type(e).__name__)
+
+    async def edit(self, text):
+        if text == self.last_text:
+            return
+        self.last_edit = time.monotonic()
+        with span("reply_text", chars=len(text)) as reply:
+            try:
+                await self.message.edit_text(text, parse_mode="Markdown")
+            except BadRequest:
+                # Telegram Markdown is fragile, show it as plain text instead
+                reply["plain_text_fallback"] = True
+                await self.message.edit_text(text)
+        self.last_text = text
+
+
+def progress_updater(progress, loop):
     """
-    title = parsed_response["Title"]
-    ideas = extract_and_format(parsed_response, "Ideas")
-    assumptions = extract_and_format(parsed_response, "Assumptions")
-    assumptions_checks = extract_and_format(parsed_response, "Assumption Checks")
-    questions = extract_and_format(parsed_response, "Questions")
-    verified_answers = extract_and_format(parsed_response, "Verified Answers")
-    resources = extract_and_format(parsed_response, "Resources")
-    recommendations = extract_and_format(parsed_response, "Recommendations")
-    summary = parsed_response['Summary']
-
-
-    result = f"""
-
-*{title}*\n
-*{datetime_creation}*\n
-*Ideas\n{ideas}*\n\n
-*Assumptions*\n{assumptions}\n
-*Checked Assumptions*\n{assumptions_checks}\n\n
-*Questions Found*\n{questions}\n\n
-*Questions Answered*\n{verified_answers}\n\n
-*Resources*\n{resources}\n\n
-*Recommendations*\n{recommendations}\n\n
-*Summary*\n{summary}\n
+    on_sections for core.analyze_notes, called in the worker thread while
+    the answer is streamed: shows the sections on the progress message.
+    The run never waits for Telegram: sections that arrive while an edit
+    is still being sent are skipped (the next edit has them too).
     """
-    return result
+    pending = None
 
+    def on_sections(sections):
+        nonlocal pending
+        if loop.is_closed() or (pending is not None and not pending.done()):
+            return
+        pending = asyncio.run_coroutine_threadsafe(progress.update(create_partial_markdown(sections)), loop)
+
+    return on_sections
 
-# ===============================================
-#       Telegram Bot & User Interactions 
-# ===============================================
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -338,6 +194,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     "1 Paste your brainstorming notes.\n"
     "2 Send them to me.\n"
     "3 I’ll organize, analyze,search internet and provide a structured response.\n\n"
+    "Changed your mind? Send /cancel to drop notes that are still waiting.\n\n"
+    "Ask a short follow-up right after an answer, I remember it. /forget starts over.\n\n"
     "That’s it!"
     )
     await update.message.reply_text(welcome_message, parse_mode="Markdown")
@@ -345,16 +203,120 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    "/stats": latency, errors and rate limits per model (for monitoring)
+    """
+    lines = []
+    for model, model_stats in model_router.stats().items():
+        p50 = model_stats["p50_latency"]
+        lines.append(
+            f"{model}\n"
+            f"  requests: {model_stats['requests']}, errors: {model_stats['errors']}, 429s: {model_stats['rate_limited']}\n"
+            f"  p50: {f'{p50:.1f}s' if p50 is not None else '-'}, healthy: {model_stats['healthy']}"
+        )
+    queue_stats = scheduler.stats()
+    lines.append(f"queue\n  running: {queue_stats['running']}, waiting: {queue_stats['queued']}")
+    routes = route_stats()
+    lines.append("routes\n" + "\n".join(
+        f"  {route}: {routes[route]['chosen']} chosen, mean run {routes[route]['mean_seconds'] or '-'}s"
+        for route in ("tools", "lean")
+    ))
+    await update.message.reply_text("\n".join(lines))
+
+
+# Fair queue between the handler and the agent (see scheduler.py)
+scheduler = ChatScheduler()
+
+
 async def msg_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Check the notes and put them in the chat's queue. The reply comes
+    when it's this chat's turn and the agent is done.
+    """
+    user_message = await get_text(update)
+    if user_message is None:
+        return
+    chat_id = update.effective_chat.id
     try:
-        user_message = await get_text(update)
-        prompt = build_prompt(user_message)
-        scribe = agent_scribe(AGENT_SCRIBE_CONFIG)
-        response = safe_agent_run(scribe,prompt)
-        response_content = response.content
-        parsed_response = parse_response_content(response_content)
-        markdown_content = create_markdown(parsed_response)
-        await update.message.reply_text(markdown_content, parse_mode="Markdown")
+        job = scheduler.submit(chat_id, lambda: handle_message(update, user_message))
+    except QueueFull as e:
+        print(f"Rejected notes from chat {chat_id}: {e}")
+        count("scribe_rejected_total")
+        await update.message.reply_text(
+            "I'm busy with too many notes right now, please send these again in a few minutes."
+        )
+        return
+
+    position = scheduler.position(job)
+    if position:
+        await update.message.reply_text(f"You are #{position} in line. Send /cancel to drop your notes.")
+    try:
+        await job.wait()
+    except asyncio.CancelledError:
+        # /cancel: the user already got an answer from the cancel command
+        if not job.cancelled:
+            raise
+
+
+async def forget(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    "/forget": drop this chat's history, the next message starts over
+    """
+    forgotten = await asyncio.to_thread(chat_history.forget, update.effective_chat.id)
+    await update.message.reply_text(f"Forgot {forgotten} previous results." if forgotten else "Nothing to forget.")
+
+
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    "/cancel": drop this chat's waiting notes and stop the running ones
+    """
+    cancelled = scheduler.cancel(update.effective_chat.id)
+    if cancelled:
+        await update.message.reply_text(f"Cancelled {cancelled} notes.")
+    else:
+        await update.message.reply_text("Nothing to cancel.")
+
+
+async def analyze_message(user_message, progress, history=None, chat_id=None):
+    """
+    Notes -> parsed JSON response (core.analyze_notes, the same pipeline
+    as the local agent). It is blocking (cache, Groq, search tools), so it
+    runs in a worker thread: the event loop stays free to serve other
+    chats while the agent is working.
+    history: summary of the chat's previous results for a follow-up.
+    """
+    on_sections = progress_updater(progress, asyncio.get_running_loop()) if STREAMING else None
+    with span("agent_slot_wait"):
+        await agent_run_slots.acquire()
+    try:
+        return await asyncio.to_thread(analyze_notes, user_message, "message", history, chat_id, on_sections)
+    finally:
+        agent_run_slots.release()
+
+
+async def handle_message(update, user_message):
+    with trace("message", chat=update.effective_chat.id):
+        await answer_message(update, user_message)
+
+
+async def answer_message(update, user_message):
+    try:
+        with span("reply_text"):
+            placeholder = await update.message.reply_text("Received and proccesing...")
+        progress = ProgressMessage(placeholder)
+        chat_id = update.effective_chat.id
+        history = await asyncio.to_thread(chat_context, chat_history, chat_id, user_message)
+        if history is not None:
+            print(f"Follow-up in chat {chat_id}, using the previous results.")
+        parsed_response = await analyze_message(user_message, progress, history, chat_id)
+        if "error" in parsed_response:
+            raise ValueError(parsed_response["error"])
+        if HISTORY:
+            await asyncio.to_thread(chat_history.add, chat_id, user_message, parsed_response)
+        # Split into several messages or sent as a file when it's long
+        # (see telegram_reply.py), the .md file is the same as the local agent writes
+        await deliver(placeholder, parsed_response, create_markdown(parsed_response))
     except Exception as e:
           await update.message.reply_text(
             "Something went wrong internally. Please try again.\nMake sure the input is a text and more then 40 chars long."
@@ -365,8 +327,61 @@ async def msg_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
-app = ApplicationBuilder().token(BOT_TOKEN).build()
-app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND,msg_handler))
-app.add_handler(CommandHandler("start", start))
-app.run_polling()
+# ===============================================
+#           Main Starting Point
+# ===============================================
 
+def build_application(token=None, webhook=False):
+    """
+    The telegram Application with all handlers. Nothing is started here.
+
+    webhook=True builds it without the polling updater: updates are
+    pushed in by webhook.py instead.
+    """
+    # A pooled agent for every run that may execute at the same time
+    agent_pool.size = max(agent_pool.size, MAX_CONCURRENT_RUNS)
+    followup_pool.size = max(followup_pool.size, MAX_CONCURRENT_RUNS)
+    # concurrent_updates lets telegram hand us updates from different chats
+    # in parallel. Agent runs are still capped by MAX_CONCURRENT_RUNS.
+    builder = ApplicationBuilder().token(token or os.getenv("BOT_API_KEY")).concurrent_updates(True)
+    if webhook:
+        builder = builder.updater(None)
+    app = builder.build()
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND,msg_handler))
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("stats", stats))
+    app.add_handler(CommandHandler("cancel", cancel))
+    app.add_handler(CommandHandler("forget", forget))
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scribe telegram bot")
+    parser.add_argument("--webhook", action="store_true", default=os.getenv("SCRIBE_WEBHOOK", "0") == "1",
+                        help="receive updates via webhook instead of polling")
+    parser.add_argument("--host", default=WEBHOOK_HOST)
+    parser.add_argument("--port", type=int, default=WEBHOOK_PORT)
+    parser.add_argument("--path", default=WEBHOOK_PATH)
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="worker processes (0 = handle everything in this process)")
+    args = parser.parse_args(argv)
+
+    start_metrics_server()
+    token = os.getenv("BOT_API_KEY")
+
+    if args.workers > 0:
+        # This process only receives updates, the workers build the agents
+        # (phi, groq and the tools are never imported here)
+        app = build_front_application(WorkerPool(args.workers, token), token, webhook=args.webhook)
+    else:
+        app = build_application(token, webhook=args.webhook)
+        # Build the agents before the first message arrives
+        agent_pool.prewarm([model_router.pick()], count=MAX_CONCURRENT_RUNS)
+    if args.webhook:
+        run_webhook(app, host=args.host, port=args.port, path=args.path)
+    else:
+        app.run_polling()
+
+
+if __name__ == "__main__":
+    main()
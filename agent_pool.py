@@ -0,0 +1,147 @@
+
+"""
+Pool of ready-to-use agents.
+
+Building an Agent for every message means a new Groq client, a new HTTP
+connection pool (TLS handshake on the first request) and new tool
+wiring each time. The pool keeps agents alive between runs instead:
+
+- agents are created once (per model) and handed out one run at a time,
+  so an agent and its tool instances are never used by two runs at once,
+- after every run the agent is reset (new session, empty memory), so no
+  conversation leaks from one user to the next,
+- every Groq client shares one keep-alive HTTP connection pool, so
+  connections to Groq stay warm between messages.
+"""
+
+
+import os, queue, threading
+from contextlib import contextmanager
+
+
+AGENT_POOL_SIZE = int(os.getenv("SCRIBE_AGENT_POOL_SIZE", "4"))   # agents per model
+GROQ_TIMEOUT = float(os.getenv("SCRIBE_GROQ_TIMEOUT", "120"))      # seconds per API request
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def shared_http_client():
+    """
+    One keep-alive connection pool for every Groq client in the process.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(
+                timeout=GROQ_TIMEOUT,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120),
+            )
+        return _http_client
+
+
+def reset_agent(agent):
+    """
+    Forget everything about the previous run: memory, session id,
+    model state (the Groq client and its connections are kept).
+    """
+    model = agent.model
+    functions, tools = (model.functions, model.tools) if model is not None else (None, None)
+    agent.new_session()
+    agent.run_response = None
+    # new_session() clears the model's functions (not its tool definitions).
+    # Agent.run would then process the toolkit functions again, wrapping
+    # their entrypoint in one more validate_call layer every run (slower
+    # tool calls, then a RecursionError). They don't change between runs,
+    # so the processed ones are kept and the next run adds nothing.
+    if model is not None:
+        model.functions = functions
+        model.tools = tools
+    # Reaching tool_call_limit turns tool calls off on the model; the
+    # next run starts with its full budget again
+    if agent.tool_call_limit is not None and agent.model is not None:
+        agent.model.tool_choice = agent.tool_choice
+
+
+class AgentPool:
+    """
+    Hands out agents for one run at a time.
+
+        pool = AgentPool(lambda model_id: agent_scribe(config, model_id))
+        with pool.agent(model_id) as scribe:
+            scribe.run(prompt)
+
+    factory(model_id) builds a new agent. At most `size` agents exist per
+    model; when all of them are busy, the caller waits for one to be free.
+    """
+
+    def __init__(self, factory, size=AGENT_POOL_SIZE):
+        self.factory = factory
+        self.size = size
+        self._idle = {}       # model_id -> Queue of idle agents
+        self._created = {}    # model_id -> number of agents built
+        self._lock = threading.Lock()
+
+    def _queue_for(self, model_id):
+        with self._lock:
+            if model_id not in self._idle:
+                self._idle[model_id] = queue.Queue()
+                self._created[model_id] = 0
+            return self._idle[model_id]
+
+    def _take(self, model_id):
+        idle = self._queue_for(model_id)
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created[model_id] < self.size
+            if can_create:
+                self._created[model_id] += 1
+        if can_create:
+            try:
+                return self.factory(model_id)
+            except Exception:
+                with self._lock:
+                    self._created[model_id] -= 1
+                raise
+        return idle.get()
+
+    @contextmanager
+    def agent(self, model_id):
+        scribe = self._take(model_id)
+        try:
+            yield scribe
+        finally:
+            reset_agent(scribe)
+            idle = self._idle.get(model_id)
+            if idle is not None:
+                idle.put(scribe)
+
+    def reset(self):
+        """
+        Forget the idle agents (e.g. after the agent config changed).
+        Agents in use are dropped when they are returned.
+        """
+        with self._lock:
+            self._idle.clear()
+            self._created.clear()
+
+    def prewarm(self, model_ids, count=1):
+        """
+        Build `count` agents per model ahead of time (e.g. at bot start).
+        """
+        for model_id in model_ids:
+            agents = [self._take(model_id) for _ in range(min(count, self.size))]
+            for scribe in agents:
+                self._idle[model_id].put(scribe)
+
+    def stats(self):
+        with self._lock:
+            return {
+                model_id: {"created": self._created[model_id], "idle": self._idle[model_id].qsize()}
+                for model_id in self._idle
+            }
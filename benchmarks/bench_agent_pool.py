@@ -0,0 +1,146 @@
+
+"""
+Per-message agent setup cost: new agent per message vs pooled agents.
+
+Before: every message built a new Agent, a new Groq model (and a new
+Groq client + HTTP connection pool on each API call) and new tools.
+After: agents come from AgentPool and are reset between runs.
+
+Only the local setup work is measured (no request is sent), so it runs
+offline. Then a pooled agent is reused for hundreds of real runs (stub
+model, see stubs.py): every run must call a tool successfully, send the
+same tool definitions and use the tool functions processed on the first
+run (a reset that misses model state makes the definitions grow or
+wraps the tool functions once more every run, until tool calls fail).
+Use --network to also measure the connection cost to Groq (new
+connection per message vs the shared keep-alive pool).
+
+    python benchmarks/bench_agent_pool.py --messages 200 --reuse-runs 300
+"""
+
+
+import argparse, os, statistics, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("SCRIBE_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "bench_cache.db"))
+
+import httpx
+from phi.agent.agent import Agent
+from phi.model.groq.groq import Groq
+from phi.tools.duckduckgo import DuckDuckGo
+from phi.tools.googlesearch import GoogleSearch
+from phi.tools.wikipedia import WikipediaTools
+
+import core
+from agent_pool import AgentPool, shared_http_client
+from stubs import install_stubs
+
+
+def setup_without_pool(model_id):
+    """
+    What msg_handler did before: build everything for one message.
+    """
+    scribe = Agent(
+        name=core.AGENT_SCRIBE_CONFIG["name"],
+        model=Groq(id=model_id),
+        tools=[GoogleSearch(), DuckDuckGo(), WikipediaTools()],
+        instructions=core.AGENT_SCRIBE_CONFIG["instructions"],
+        show_tool_calls=False,
+        markdown=False,
+    )
+    scribe.update_model()          # tool wiring done at the start of a run
+    scribe.model.get_client()      # phi creates a client for every API call
+    return scribe
+
+
+def setup_with_pool(pool, model_id):
+    with pool.agent(model_id) as scribe:
+        scribe.update_model()
+        scribe.model.get_client()
+
+
+def measure(fn, messages):
+    timings = []
+    for _ in range(messages):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{name:<28} mean {statistics.mean(timings):8.3f} ms | p50 {statistics.median(timings):8.3f} ms | p95 {p95:8.3f} ms")
+
+
+def check_reuse(runs):
+    """
+    Run one pooled agent `runs` times (one tool call per run): every run
+    must get the tool's result and send the same tool definitions with
+    the same tool functions as the first one.
+    """
+    install_stubs(llm_latency=0, tool_latency=0, tool_rounds=1)
+    model_id = core.AGENT_SCRIBE_CONFIG["model"][1]
+    for name, pool in (("agent", core.agent_pool), ("verifier", core.verifier_pool)):
+        pool.size = 1
+        tools, entrypoints, timings = [], set(), []
+        for run in range(runs):
+            with pool.agent(model_id) as agent:
+                start = time.perf_counter()
+                response = agent.run("Notes: is Python enough to build AI agents?")
+                timings.append((time.perf_counter() - start) * 1000)
+                results = [m.content for m in response.messages if m.role == "tool"]
+                assert results and "Error" not in str(results[0]), f"{name} pool: tool call failed on run {run + 1}: {results}"
+                tools.append(len(agent.model.tools or []))
+                entrypoints.add(id(agent.model.functions["google_search"].entrypoint))
+        assert len(set(tools)) == 1, f"{name} pool: tool definitions per run grew: {sorted(set(tools))}"
+        assert len(entrypoints) == 1, f"{name} pool: tool functions were processed again on {len(entrypoints) - 1} runs"
+        tenth = max(1, runs // 10)
+        print(
+            f"{name + ' pool:':<17} {tools[0]} tool definitions and a working tool call on each of {runs} runs "
+            f"(first {tenth}: {statistics.mean(timings[:tenth]):.1f} ms/run, last {tenth}: {statistics.mean(timings[-tenth:]):.1f} ms/run)"
+        )
+
+
+def measure_network(messages, url="https://api.groq.com/openai/v1/models"):
+    def new_connection():
+        with httpx.Client(timeout=10) as client:
+            client.get(url)
+
+    def shared_connection():
+        shared_http_client().get(url)
+
+    report("connect: new per message", measure(new_connection, messages))
+    report("connect: shared pool", measure(shared_connection, messages))
+
+
+def bench(messages, network, reuse_runs):
+    model_id = core.AGENT_SCRIBE_CONFIG["model"][1]
+    pool = AgentPool(lambda model_id: core.agent_scribe(core.AGENT_SCRIBE_CONFIG, model_id), size=1)
+    pool.prewarm([model_id])
+
+    print(f"Agent setup per message ({messages} messages, no network)")
+    before = measure(lambda: setup_without_pool(model_id), messages)
+    after = measure(lambda: setup_with_pool(pool, model_id), messages)
+    report("before: new agent", before)
+    report("after: pooled agent", after)
+    print(f"speed-up: {statistics.mean(before) / statistics.mean(after):.1f}x")
+
+    print("\nReused agents (stub model)")
+    check_reuse(reuse_runs)
+
+    if network:
+        print("\nConnection cost to Groq (TLS handshake included for new connections)")
+        measure_network(min(messages, 20))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--reuse-runs", type=int, default=300, help="runs of one reused agent per pool")
+    parser.add_argument("--network", action="store_true", help="also measure real connections to Groq")
+    args = parser.parse_args()
+    bench(args.messages, args.network, args.reuse_runs)
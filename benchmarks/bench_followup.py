@@ -0,0 +1,105 @@
+
+"""
+Follow-up questions: re-pasting the notes vs the chat history (history.py).
+
+For every notes size a chat sends its notes, then asks a short follow-up
+question in one of two ways:
+
+- repaste: the whole notes again with the question at the end (what
+  users did before there was a history): a full run.
+- history: only the question; the prompt gets a summary of the previous
+  result instead of the notes.
+
+Reported for the second message only: input tokens of all model calls
+(as counted by the stub model), model calls, and time. The bot handler
+runs with the stubs (stubs.py), parallel verification on (the full run
+verifies everything again) unless --no-verify. The near-duplicate cache
+is off: it would answer the re-pasted notes with the old result.
+
+    python benchmarks/bench_followup.py --sizes 1500 5000 10000
+"""
+
+
+import argparse, asyncio, contextlib, io, os, statistics, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Before importing Scribe: private cache file, no client-side rate limits
+os.environ["SCRIBE_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="scribe_bench_"), "bench_cache.db")
+os.environ["SCRIBE_SIMILAR_CACHE"] = "0"
+os.environ["SCRIBE_STREAMING"] = "0"
+os.environ["SCRIBE_TELEGRAM_SEND_INTERVAL"] = "0"
+for provider in ("GROQ", "GOOGLE", "DUCKDUCKGO", "WIKIPEDIA", "TELEGRAM"):
+    os.environ[f"SCRIBE_{provider}_RPM"] = "0"
+os.environ["SCRIBE_GROQ_TPM"] = "0"
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("BOT_API_KEY", "benchmark-token")
+if "--no-verify" not in sys.argv:
+    os.environ["SCRIBE_PARALLEL_VERIFY"] = "1"
+
+import ScribBot
+from metrics import registry
+from bench_prompt import make_messy_notes
+from stubs import install_stubs, FakeUpdate
+
+
+# Numbered: the stub's answers are all the same, so without the number the
+# response cache would answer the follow-ups of the next rounds
+QUESTION = "What about Germany specifically, is the salary there worth it? ({})"
+
+
+def input_tokens():
+    """
+    (input tokens, model runs) counted so far.
+    """
+    snapshot = registry.snapshot()
+    tokens = sum(v for k, v in snapshot["counters"].items() if k.startswith("scribe_tokens_total") and '"input"' in k)
+    runs = sum(h["count"] for k, h in snapshot["histograms"].items() if k.startswith("scribe_run_input_tokens"))
+    return tokens, runs
+
+
+async def send(text, chat_id):
+    """
+    One message through the bot handler -> (seconds, input tokens, model runs).
+    """
+    tokens, runs = input_tokens()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await ScribBot.msg_handler(FakeUpdate(text, chat_id), None)
+    elapsed = time.perf_counter() - start
+    after_tokens, after_runs = input_tokens()
+    return elapsed, after_tokens - tokens, after_runs - runs
+
+
+async def bench(sizes, rounds):
+    print(f"{'notes':>7}{'way':>9}{'seconds':>10}{'tokens':>9}{'runs':>6}")
+    chat_id = 0
+    for size in sizes:
+        results = {"repaste": [], "history": []}
+        for i in range(rounds):
+            notes = make_messy_notes(size, seed=size + i)
+            for way in results:
+                chat_id += 1
+                await send(notes, chat_id)
+                question = QUESTION.format(chat_id)
+                followup = f"{notes}\n\n{question}" if way == "repaste" else question
+                results[way].append(await send(followup, chat_id))
+        for way, rows in results.items():
+            seconds, tokens, runs = (statistics.median(column) for column in zip(*rows))
+            print(f"{size:>7}{way:>9}{seconds:>10.2f}{tokens:>9.0f}{runs:>6.0f}")
+        repaste, history = (statistics.median(row[1] for row in results[way]) for way in ("repaste", "history"))
+        print(f"{'':>7}{'saved':>9}{'':>10}{1 - history / repaste:>9.0%}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1500, 5000, 10000], help="notes sizes in characters")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    parser.add_argument("--no-verify", action="store_true", help="full runs without parallel verification")
+    args = parser.parse_args()
+
+    install_stubs(llm_latency=args.llm_latency, tool_latency=args.tool_latency)
+    asyncio.run(bench(args.sizes, args.rounds))
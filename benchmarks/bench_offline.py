@@ -0,0 +1,237 @@
+
+"""
+Offline end-to-end benchmark of Scribe.
+
+Groq and the search tools are replaced by the stubs in stubs.py
+(configurable latency, canned JSON), everything else is the real code:
+agent runs with tool calls, JSON parsing, markdown rendering, the
+local agent (main.py) and the bot handler (ScribBot.msg_handler, driven
+with fake telegram updates).
+
+Scenarios:
+- render: parse_response_content + create_markdown only (CPU work)
+- cli:    main.process_notes_file, the work main.main() does, for many
+          notes files at once (plus one run of main.main() itself)
+- bot:    ScribBot.msg_handler for many messages at once
+
+Every scenario runs for each notes size x concurrency level and reports
+throughput, p50/p95/p99 latency and peak memory (tracemalloc).
+No network is needed.
+
+    python benchmarks/bench_offline.py
+    python benchmarks/bench_offline.py --sizes 500 5000 --concurrency 1 8 --requests 32
+"""
+
+
+import argparse, asyncio, contextlib, io, os, statistics, sys, tempfile, time, tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Before importing Scribe: private cache file, no client-side rate limits,
+# fake keys (nothing is sent anywhere).
+BENCH_DIR = tempfile.mkdtemp(prefix="scribe_bench_")
+os.environ["SCRIBE_CACHE_PATH"] = os.path.join(BENCH_DIR, "bench_cache.db")
+# The notes only differ in their first line: every one must reach the agent
+os.environ["SCRIBE_SIMILAR_CACHE"] = "0"
+for provider in ("GROQ", "GOOGLE", "DUCKDUCKGO", "WIKIPEDIA"):
+    os.environ[f"SCRIBE_{provider}_RPM"] = "0"
+os.environ["SCRIBE_GROQ_TPM"] = "0"
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+os.environ.setdefault("BOT_API_KEY", "benchmark-token")
+
+import json
+import core
+import main
+import ScribBot
+from stubs import canned_response, make_notes, install_stubs, FakeUpdate
+
+
+# ===============================================
+#                 Measuring
+# ===============================================
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def summarize(name, size, concurrency, latencies, elapsed, peak_bytes, failures):
+    ordered = sorted(latencies) or [0.0]
+    return {
+        "scenario": name,
+        "size": size,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "failures": failures,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "peak_mb": peak_bytes / (1024 * 1024),
+    }
+
+
+def print_row(row):
+    print(
+        f"{row['scenario']:<7} size {row['size']:>6} | conc {row['concurrency']:>3} | "
+        f"{row['requests']:>4} req | {row['throughput']:8.2f} req/s | "
+        f"p50 {row['p50_ms']:9.1f} ms | p95 {row['p95_ms']:9.1f} ms | p99 {row['p99_ms']:9.1f} ms | "
+        f"peak {row['peak_mb']:7.2f} MB" + (f" | {row['failures']} failed" if row["failures"] else "")
+    )
+
+
+@contextlib.contextmanager
+def measured():
+    """
+    Wall time + peak traced memory of the block. Scribe's own prints
+    are hidden so they don't distort the timings.
+    """
+    result = {}
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield result
+    result["elapsed"] = time.perf_counter() - start
+    result["peak"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+
+# ===============================================
+#                 Scenarios
+# ===============================================
+
+def bench_render(size, concurrency, requests):
+    """
+    Parsing + markdown rendering, no agent involved.
+    size is the number of entries per list in the response.
+    """
+    items = max(1, size // 100)
+    raw = json.dumps(canned_response(items))
+
+    def one():
+        start = time.perf_counter()
+        core.create_markdown(core.parse_response_content(raw))
+        return time.perf_counter() - start
+
+    with measured() as m:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(lambda _: one(), range(requests)))
+    return summarize("render", size, concurrency, latencies, m["elapsed"], m["peak"], 0)
+
+
+def bench_cli(size, concurrency, requests):
+    notes_dir = tempfile.mkdtemp(dir=BENCH_DIR)
+    output_dir = tempfile.mkdtemp(dir=BENCH_DIR)
+    paths = []
+    for i in range(requests):
+        path = os.path.join(notes_dir, f"notes_{i}.txt")
+        with open(path, "w") as f:
+            f.write(make_notes(size, seed=i))
+        paths.append(path)
+
+    def one(i):
+        start = time.perf_counter()
+        main.process_notes_file(paths[i], output_dir, file_prefix=f"{i:04d}_")
+        return time.perf_counter() - start
+
+    latencies, failures = [], 0
+    with measured() as m:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(one, i) for i in range(requests)]
+            for future in futures:
+                try:
+                    latencies.append(future.result())
+                except Exception:
+                    failures += 1
+    return summarize("cli", size, concurrency, latencies, m["elapsed"], m["peak"], failures)
+
+
+def bench_cli_main(size):
+    """
+    One full main.main() run (the entry point itself, single file).
+    """
+    notes_path = os.path.join(BENCH_DIR, "main_notes.txt")
+    with open(notes_path, "w") as f:
+        f.write(make_notes(size, seed=-1))
+    main.NOTES_FILE_PATH = notes_path
+    main.OUTPUT_FILE_PATH = tempfile.mkdtemp(dir=BENCH_DIR)
+
+    with measured() as m:
+        start = time.perf_counter()
+        main.main()
+        latency = time.perf_counter() - start
+    return summarize("main", size, 1, [latency], m["elapsed"], m["peak"], 0)
+
+
+def bench_bot(size, concurrency, requests):
+    async def one(i, slots):
+        async with slots:
+            update = FakeUpdate(make_notes(size, seed=10_000 + i), chat_id=i)
+            start = time.perf_counter()
+            await ScribBot.msg_handler(update, None)
+            reply = update.message.replies[-1] if update.message.replies else None
+            if reply is None or "Something went wrong" in reply.text:
+                raise RuntimeError("bot did not answer")
+            return time.perf_counter() - start
+
+    async def run_all():
+        slots = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(one(i, slots) for i in range(requests)), return_exceptions=True)
+
+    with measured() as m:
+        results = asyncio.run(run_all())
+    latencies = [r for r in results if not isinstance(r, BaseException)]
+    return summarize("bot", size, concurrency, latencies, m["elapsed"], m["peak"], len(results) - len(latencies))
+
+
+# ===============================================
+#                 Main
+# ===============================================
+
+def bench(scenarios, sizes, concurrency_levels, requests, llm_latency, tool_latency, tool_rounds):
+    top = max(concurrency_levels)
+    core.agent_pool.size = max(core.agent_pool.size, top)
+    core.followup_pool.size = max(core.followup_pool.size, top)
+    install_stubs(llm_latency=llm_latency, tool_latency=tool_latency, tool_rounds=tool_rounds)
+    # The bot's own cap on parallel agent runs is part of what we measure
+    print(f"Stub LLM latency {llm_latency}s, tool latency {tool_latency}s, {tool_rounds} tool call(s) per run")
+    print(f"Bot MAX_CONCURRENT_RUNS = {ScribBot.MAX_CONCURRENT_RUNS}\n")
+
+    rows = []
+    if "cli" in scenarios:
+        rows.append(bench_cli_main(sizes[0]))
+        print_row(rows[-1])
+    for name in scenarios:
+        for size in sizes:
+            for concurrency in concurrency_levels:
+                if name == "render":
+                    row = bench_render(size, concurrency, requests * 10)
+                elif name == "cli":
+                    row = bench_cli(size, concurrency, requests)
+                else:
+                    row = bench_bot(size, concurrency, requests)
+                rows.append(row)
+                print_row(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["render", "cli", "bot"], choices=["render", "cli", "bot"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[500, 5000], help="notes size in characters")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=16, help="requests per size/concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per stub model call")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="seconds per stub tool call")
+    parser.add_argument("--tool-rounds", type=int, default=1, help="tool calls before the model answers")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    rows = bench(
+        args.scenarios, args.sizes, args.concurrency, args.requests,
+        args.llm_latency, args.tool_latency, args.tool_rounds,
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
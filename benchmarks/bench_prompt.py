@@ -0,0 +1,127 @@
+
+"""
+Prompt size: estimated input tokens of one request (system message with
+the instructions + prompt), split into the static part that is the same
+on every call (cacheable by the provider) and the part that changes.
+
+The notes are messy on purpose (extra spaces and blank lines, repeated
+lines) like real brainstorm notes, `--sizes` characters each. Both
+routes are measured: "tools" (full agent) and "lean" (no tools).
+Tool definitions are not counted.
+
+--compare REV measures the same notes on an older commit (checked out in
+a temporary git worktree, see bench_startup.py):
+
+    python benchmarks/bench_prompt.py --compare HEAD~1
+"""
+
+
+import argparse, json, os, random, subprocess, sys, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_startup import ROOT, checkout, remove_checkout
+
+
+# Runs in the measured tree: notes (JSON on stdin) -> characters per route
+MEASURE = """
+import json, sys
+import core
+
+notes = json.loads(sys.stdin.read())
+routes = {"tools": ("build_prompt", "agent_scribe"), "lean": ("build_lean_prompt", "agent_lean")}
+results = {}
+for route, (build_name, agent_name) in routes.items():
+    if not hasattr(core, build_name):
+        continue
+    system = getattr(core, agent_name)(core.AGENT_SCRIBE_CONFIG).get_system_message()
+    system = system.content if system is not None else ""
+    empty = getattr(core, build_name)("", "message")
+    results[route] = [
+        {"system": len(system), "prompt": len(getattr(core, build_name)(text, "message")), "static": len(system) + len(empty)}
+        for text in notes
+    ]
+print(json.dumps(results))
+"""
+
+SENTENCES = [
+    "I want to become an AI agents developer, is it worth it?",
+    "Freelancing on Upwork might pay more than a junior job.",
+    "Python is probably enough, I don't need to learn Rust.",
+    "How much do AI engineers earn in Germany?",
+    "Maybe build a portfolio of three small agents first.",
+    "Everyone says prompt engineering is dead, is that true?",
+    "Need to check visa requirements for remote work.",
+    "Ask Sam about the startup idea on Friday.",
+]
+
+
+def make_messy_notes(size, seed=0):
+    """
+    Notes of about `size` characters with double spaces, extra blank
+    lines and some lines repeated word for word.
+    """
+    rng = random.Random(seed)
+    lines = []
+    while sum(len(line) + 1 for line in lines) < size:
+        if lines and rng.random() < 0.15:
+            lines.append(rng.choice(lines))                   # pasted twice
+        else:
+            line = f"{rng.choice(SENTENCES)} (note {len(lines)})"
+            lines.append(line.replace(" ", "  ", rng.randint(0, 2)))
+        if rng.random() < 0.2:
+            lines.append("\n")                                # extra blank lines
+    return "\n".join(lines)[:size]
+
+
+def measure(cwd, notes):
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "benchmark-key")
+    env.setdefault("SCRIBE_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "bench_cache.db"))
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE], cwd=cwd, env=env, input=json.dumps(notes), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1] if result.stderr else "measurement failed")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def tokens(chars):
+    return chars // 4 + 1
+
+
+def report(sizes, current, baseline=None, rev=None):
+    header = f"{'route':<7}{'notes':>7}{'tokens':>9}{'static':>9}{'cacheable':>11}"
+    if baseline is not None:
+        header += f"{rev:>12}{'saved':>8}"
+    print(header)
+    for route, rows in current.items():
+        for size, row in zip(sizes, rows):
+            total = tokens(row["system"] + row["prompt"])
+            static = tokens(row["static"])
+            line = f"{route:<7}{size:>7}{total:>9}{static:>9}{static / total:>10.0%}"
+            if baseline is not None and route in baseline:
+                before = baseline[route][sizes.index(size)]
+                before_total = tokens(before["system"] + before["prompt"])
+                line += f"{before_total:>12}{1 - total / before_total:>8.0%}"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 1500, 5000], help="notes sizes in characters")
+    parser.add_argument("--compare", metavar="REV", help="also measure this git revision")
+    args = parser.parse_args()
+
+    notes = [make_messy_notes(size, seed) for seed, size in enumerate(args.sizes)]
+    current = measure(ROOT, notes)
+    baseline = None
+    if args.compare:
+        path = checkout(args.compare)
+        try:
+            baseline = measure(path, notes)
+        finally:
+            remove_checkout(path)
+    if current is not None:
+        report(args.sizes, current, baseline, args.compare)
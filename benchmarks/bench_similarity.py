@@ -0,0 +1,140 @@
+
+"""
+Near-duplicate cache (similarity.py) at scale: add and lookup latency,
+recall and file size with `--entries` stored notes.
+
+Filling the index with real signatures would take minutes (a signature
+of 800 characters of notes costs about a millisecond), so most entries
+get random signatures and short filler notes. `--real` entries are real
+notes; the lookups are edited versions of them (hits, one sentence
+changed or added) and unrelated notes (misses). Lookup timings include
+computing the signature of the query.
+
+Eviction: the last step adds `--extra` entries one by one to a full
+index (max_entries = entries) and checks that it stays at its limit.
+
+    python benchmarks/bench_similarity.py --entries 100000
+"""
+
+
+import argparse, os, random, statistics, sys, tempfile, time, uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity import SimilarityIndex, NUM_PERM, SIMILAR_DELTA, minhash, shingles
+
+
+WORDS = (
+    "agent freelance income market python course salary client project remote visa rent "
+    "startup idea plan learn skill portfolio price tax contract deadline team product users "
+    "growth marketing budget hiring model data cloud server mobile design research goal"
+).split()
+
+RESULT = {"Title": "Stored notes", "Ideas": ["idea"], "Summary": ["summary"]}
+
+
+def sentence(rng):
+    words = rng.choices(WORDS, k=rng.randint(8, 14))
+    return " ".join(words).capitalize() + rng.choice([".", "?", "."])
+
+
+def make_notes(rng, paragraphs=6):
+    return "\n\n".join(" ".join(sentence(rng) for _ in range(3)) for _ in range(paragraphs))
+
+
+def edit_notes(rng, notes):
+    """
+    A near duplicate: one sentence rewritten and one added.
+    """
+    paragraphs = notes.split("\n\n")
+    i = rng.randrange(len(paragraphs))
+    sentences = paragraphs[i].split(". ")
+    sentences[0] = sentence(rng).rstrip(".?")
+    paragraphs[i] = ". ".join(sentences)
+    paragraphs.append(sentence(rng))
+    return "\n\n".join(paragraphs)
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return (
+        statistics.median(timings) * 1000,
+        timings[int(len(timings) * 0.95) - 1] * 1000,
+    )
+
+
+def fill(index, entries, real_notes, rng, batch=5000):
+    fillers = entries - len(real_notes)
+    for start in range(0, fillers, batch):
+        index.add_many([
+            (uuid.uuid4().hex, f"filler {i}", RESULT, [rng.getrandbits(32) for _ in range(NUM_PERM)])
+            for i in range(start, min(fillers, start + batch))
+        ])
+    index.add_many([(uuid.uuid4().hex, notes, RESULT) for notes in real_notes])
+
+
+def bench(entries, real, lookups, extra, seed):
+    rng = random.Random(seed)
+    path = os.path.join(tempfile.mkdtemp(), "bench_similarity.db")
+    index = SimilarityIndex(path=path, max_entries=entries)
+
+    real_notes = [make_notes(rng) for _ in range(real)]
+    start = time.perf_counter()
+    fill(index, entries, real_notes, rng)
+    print(f"filled {len(index)} entries in {time.perf_counter() - start:.1f}s, "
+          f"file {os.path.getsize(path) / 1e6:.1f} MB (+ WAL)\n")
+
+    sample = real_notes[:lookups]
+    signature_times = []
+    for notes in sample:
+        start = time.perf_counter()
+        minhash(shingles(notes))
+        signature_times.append(time.perf_counter() - start)
+
+    hit_times, found = [], 0
+    for notes in sample:
+        query = edit_notes(rng, notes)
+        start = time.perf_counter()
+        match = index.lookup(query)
+        hit_times.append(time.perf_counter() - start)
+        found += match is not None and match["notes"] == notes
+
+    miss_times, false_hits = [], 0
+    for _ in range(len(sample)):
+        query = make_notes(rng)
+        start = time.perf_counter()
+        match = index.lookup(query)
+        miss_times.append(time.perf_counter() - start)
+        false_hits += match is not None
+
+    add_times = []
+    for _ in range(extra):
+        notes = make_notes(rng)
+        start = time.perf_counter()
+        index.add(uuid.uuid4().hex, notes, RESULT)
+        add_times.append(time.perf_counter() - start)
+
+    print(f"{'step':<26}{'p50':>10}{'p95':>10}")
+    for name, timings in (
+        ("signature (800 chars)", signature_times),
+        ("lookup, near duplicate", hit_times),
+        ("lookup, new notes", miss_times),
+        ("add + eviction", add_times),
+    ):
+        p50, p95 = percentiles(timings)
+        print(f"{name:<26}{p50:8.2f}ms{p95:8.2f}ms")
+
+    print(f"\nnear duplicates found: {found}/{len(sample)} (threshold {SIMILAR_DELTA})")
+    print(f"false matches for new notes: {false_hits}/{len(sample)}")
+    print(f"entries after {extra} adds to a full index: {len(index)} (limit {entries})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100000, help="stored notes")
+    parser.add_argument("--real", type=int, default=1000, help="stored notes with real signatures")
+    parser.add_argument("--lookups", type=int, default=200, help="near-duplicate and new-notes lookups (each)")
+    parser.add_argument("--extra", type=int, default=200, help="adds to the full index (eviction)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    bench(args.entries, args.real, args.lookups, args.extra, args.seed)
@@ -0,0 +1,120 @@
+
+"""
+Startup time: how long until an entry point can do its first real work.
+
+Each target runs in a fresh interpreter (so nothing is cached in
+sys.modules), several times, and the median is reported:
+
+- import core / main / ScribBot / workers: the module imports alone,
+- cli --help: `python main.py --watch --help`, a whole CLI invocation,
+- first agent: import core and build one agent (phi, groq and the
+  tools are imported here, not when core is imported).
+
+--compare REV runs the same targets on an older commit (checked out in
+a temporary git worktree), e.g. the commit before the shared core:
+
+    python benchmarks/bench_startup.py --runs 5 --compare HEAD~1
+"""
+
+
+import argparse, os, statistics, subprocess, sys, tempfile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMER = "import time; _start = time.perf_counter()\n{code}\nprint(time.perf_counter() - _start)"
+
+TARGETS = {
+    "import core": TIMER.format(code="import core"),
+    "import main": TIMER.format(code="import main"),
+    "import ScribBot": TIMER.format(code="import ScribBot"),
+    "import workers": TIMER.format(code="import workers"),
+    "first agent": TIMER.format(code="import core; core.agent_scribe(core.AGENT_SCRIBE_CONFIG)"),
+}
+
+# Whole processes, timed from the outside
+COMMANDS = {
+    "cli --help": ["main.py", "--watch", "--help"],
+}
+
+
+def environment():
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "benchmark-key")
+    env.setdefault("SCRIBE_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "bench_cache.db"))
+    return env
+
+
+def time_code(code, cwd, env):
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_command(args, cwd, env):
+    code = (
+        "import subprocess, sys, time; start = time.perf_counter()\n"
+        f"ok = subprocess.run([sys.executable] + {args!r}, capture_output=True).returncode == 0\n"
+        "print(time.perf_counter() - start if ok else 'failed')"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    output = result.stdout.strip()
+    return float(output) if output and output != "failed" else None
+
+
+def measure(cwd, runs):
+    env = environment()
+    results = {}
+    for name, code in TARGETS.items():
+        timings = [time_code(code, cwd, env) for _ in range(runs)]
+        results[name] = statistics.median(timings) if None not in timings else None
+    for name, args in COMMANDS.items():
+        timings = [time_command(args, cwd, env) for _ in range(runs)]
+        results[name] = statistics.median(timings) if None not in timings else None
+    return results
+
+
+def checkout(rev):
+    path = tempfile.mkdtemp(prefix="scribe_startup_")
+    subprocess.run(["git", "worktree", "add", "--detach", path, rev], cwd=ROOT, check=True, capture_output=True)
+    return path
+
+
+def remove_checkout(path):
+    subprocess.run(["git", "worktree", "remove", "--force", path], cwd=ROOT, capture_output=True)
+
+
+def fmt(seconds):
+    return f"{seconds * 1000:9.1f} ms" if seconds is not None else f"{'-':>12}"
+
+
+def report(current, baseline=None, rev=None):
+    header = f"{'target':<18}{'this tree':>12}"
+    if baseline is not None:
+        header += f"{rev:>14}{'speed-up':>10}"
+    print(header)
+    for name, seconds in current.items():
+        line = f"{name:<18}{fmt(seconds)}"
+        if baseline is not None:
+            before = baseline.get(name)
+            ratio = f"{before / seconds:9.1f}x" if before and seconds else f"{'-':>10}"
+            line += f"  {fmt(before)}{ratio}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--compare", metavar="REV", help="also measure this git revision")
+    args = parser.parse_args()
+
+    current = measure(ROOT, args.runs)
+    baseline = None
+    if args.compare:
+        path = checkout(args.compare)
+        try:
+            baseline = measure(path, args.runs)
+        finally:
+            remove_checkout(path)
+    report(current, baseline, args.compare)
@@ -0,0 +1,69 @@
+
+"""
+Verification latency: one agent doing every search in its own
+tool-calling loop vs the parallel verification stage (verification.py).
+
+Runs offline on the stubs (benchmarks/stubs.py). The canned notes have
+`--items` assumptions and `--items` questions, and every one of them
+needs one search:
+
+- single: one agent run that makes 2 * items tool calls in a row,
+- parallel: extract (no tools) + every item verified by its own agent
+  at the same time (one tool call each) + summary (no tools).
+
+    python benchmarks/bench_verify.py --items 5 --llm-latency 0.5 --tool-latency 0.3
+"""
+
+
+import argparse, contextlib, io, os, statistics, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Before importing Scribe: private cache file, no client-side rate limits
+os.environ["SCRIBE_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_cache.db")
+for provider in ("GROQ", "GOOGLE", "DUCKDUCKGO", "WIKIPEDIA"):
+    os.environ[f"SCRIBE_{provider}_RPM"] = "0"
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+
+import core
+from verification import verify_notes
+from stubs import install_stubs, make_notes
+
+
+def timed_runs(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench(items, runs, llm_latency, tool_latency, workers):
+    notes = make_notes(800)
+    print(f"{items} assumptions + {items} questions, stub LLM {llm_latency}s, tool {tool_latency}s, {runs} runs\n")
+
+    install_stubs(llm_latency=llm_latency, tool_latency=tool_latency, tool_rounds=2 * items, items=items)
+    single = timed_runs(lambda: core.run_prompt(core.build_prompt(notes)), runs)
+
+    core.verifier_pool.size = max(core.verifier_pool.size, workers)
+    install_stubs(llm_latency=llm_latency, tool_latency=tool_latency, tool_rounds=1, items=items)
+    parallel = timed_runs(lambda: verify_notes(notes, core.run_plain, core.run_verification, workers=workers), runs)
+
+    one_verification = 2 * llm_latency + tool_latency
+    print(f"{'single agent':<22} median {statistics.median(single):6.2f}s")
+    print(f"{'parallel verification':<22} median {statistics.median(parallel):6.2f}s")
+    print(f"{'slowest verification':<22}        {one_verification:6.2f}s (+ extract and summary calls)")
+    print(f"speed-up: {statistics.median(single) / statistics.median(parallel):.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5, help="assumptions and questions (each)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per stub model call")
+    parser.add_argument("--tool-latency", type=float, default=0.3, help="seconds per stub tool call")
+    parser.add_argument("--workers", type=int, default=10, help="verifications at the same time")
+    args = parser.parse_args()
+    bench(args.items, args.runs, args.llm_latency, args.tool_latency, args.workers)
@@ -0,0 +1,167 @@
+
+"""
+Offline Wikipedia index (wiki_index.py): indexing speed and memory, and
+lookup latency compared with the online Wikipedia tool.
+
+A synthetic MediaWiki dump (.xml.bz2, `--pages` articles with templates,
+references, links and headings, plus redirects) is written to a temp
+directory and indexed like a real dump. Then the same lookups the agent
+makes are timed on the index: exact titles, redirects, free-text
+searches and misses.
+
+`--online` also times phi's WikipediaTools on a few real topics (needs
+network; the offline numbers don't). To time a real dump instead:
+
+    python benchmarks/bench_wiki.py --pages 200000
+    python benchmarks/bench_wiki.py --dump enwiki-latest-pages-articles1.xml.bz2 --online
+"""
+
+
+import argparse, bz2, itertools, os, random, statistics, sys, tempfile, time
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wiki_index import WikiIndex, build_index
+
+
+SYLLABLES = "ka ri to ne mu sa lo pe vi da ren tor mal qui ban sel dor fin gra lu".split()
+VOCABULARY = 20000
+# Word frequencies follow Zipf's law like real text (a few words everywhere, most rare)
+ZIPF = [1 / rank for rank in range(1, VOCABULARY + 1)]
+
+ONLINE_TOPICS = ["Python (programming language)", "Freelancer", "Machine learning", "Telegram (software)", "Groq"]
+
+PAGE = """  <page>
+    <title>{title}</title>
+    <ns>0</ns>
+    <id>{id}</id>{redirect}
+    <revision>
+      <text xml:space="preserve">{text}</text>
+    </revision>
+  </page>
+"""
+
+
+def make_vocabulary(rng):
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def article(rng, title, vocabulary, weights):
+    words = lambda n: " ".join(rng.choices(vocabulary, cum_weights=weights, k=n))
+    link = lambda: f"[[{words(2)}|{words(1)}]]"
+    lead = (
+        f"{{{{Infobox {words(1)}\n| name = {title}\n| image = {{{{lang|en|{words(2)}}}}}\n}}}}\n"
+        f"'''{title}''' is a {words(3)} {link()} of the {words(2)}.<ref name=\"a\">{{{{cite web|url=https://example.org}}}}</ref> "
+        f"It is known for {words(6)} and {link()}. {words(12).capitalize()}.\n\n"
+        f"{words(20).capitalize()} {link()}, {words(10)}.<!-- hidden note -->"
+    )
+    rest = "\n".join(f"\n== {words(2).title()} ==\n{words(60)}" for _ in range(3))
+    return lead + "\n" + rest
+
+
+def write_dump(path, pages, seed=0):
+    """
+    Synthetic dump, written as a stream. Returns the titles of the
+    articles and the redirects (alias -> title).
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    weights = list(itertools.accumulate(ZIPF))
+    titles, aliases = [], {}
+    with bz2.open(path, "wt", encoding="utf-8") as dump:
+        dump.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">\n')
+        for i in range(pages):
+            # Titles use the rarer words, like real article titles
+            title = f"{' '.join(rng.choices(vocabulary[100:], k=2)).title()} {i}"
+            titles.append(title)
+            text = article(rng, title, vocabulary, weights)
+            dump.write(PAGE.format(title=escape(title), id=i, redirect="", text=escape(text)))
+            if i % 10 == 0:
+                alias = f"{title} (alias)"
+                aliases[alias] = title
+                dump.write(PAGE.format(
+                    title=escape(alias), id=f"r{i}", redirect=f'\n    <redirect title="{escape(title)}" />',
+                    text=escape(f"#REDIRECT [[{title}]]"),
+                ))
+        dump.write("</mediawiki>\n")
+    return titles, aliases
+
+
+def timed(fn, queries):
+    timings, found = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        result = fn(query)
+        timings.append(time.perf_counter() - start)
+        found += bool(result)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.95) - 1] * 1000, found
+
+
+def report(name, p50, p95, found, total):
+    print(f"{name:<24}{p50:9.2f}ms{p95:9.2f}ms{found:>8}/{total}")
+
+
+def bench(pages, lookups, dump_path, online, seed):
+    directory = tempfile.mkdtemp(prefix="scribe_wiki_")
+    titles, aliases = [], {}
+    if dump_path is None:
+        dump_path = os.path.join(directory, "synthetic-pages-articles.xml.bz2")
+        start = time.perf_counter()
+        titles, aliases = write_dump(dump_path, pages, seed)
+        print(f"wrote {pages} articles ({os.path.getsize(dump_path) / 1e6:.1f} MB bz2) in {time.perf_counter() - start:.1f}s")
+
+    index_path = os.path.join(directory, "wiki_index.db")
+    stats = build_index(dump_path, index_path, progress_every=0)
+    print(f"indexed {stats['pages']} articles + {stats['redirects']} redirects in {stats['seconds']}s "
+          f"({stats['pages'] / stats['seconds']:.0f} articles/s), peak memory {stats['peak_rss_mb']} MB, "
+          f"index {os.path.getsize(index_path) / 1e6:.1f} MB\n")
+
+    index = WikiIndex(index_path)
+    rng = random.Random(seed + 1)
+    if not titles:
+        titles = [row[0] for row in index._conn.execute("SELECT title FROM pages LIMIT 10000")]
+        aliases = dict(index._conn.execute("SELECT key, target FROM redirects LIMIT 10000"))
+    sample = rng.sample(titles, min(lookups, len(titles)))
+    queries = {
+        "exact title": [title.lower() for title in sample],
+        "redirect": rng.sample(sorted(aliases), min(lookups, len(aliases))),
+        # Topic words without the exact title, like "python programming language"
+        "free text": [" ".join(title.split()[:2]) for title in sample],
+        "miss": [f"zzqx unknownword {'x' * (i % 7 + 1)}" for i in range(len(sample))],
+    }
+
+    print(f"{'lookup':<24}{'p50':>11}{'p95':>11}{'found':>13}")
+    for name, batch in queries.items():
+        report(f"offline {name}", *timed(index.lookup, batch), len(batch))
+
+    if online:
+        from phi.tools.wikipedia import WikipediaTools
+
+        tool = WikipediaTools()
+
+        def online_lookup(query):
+            try:
+                return tool.search_wikipedia(query)
+            except Exception:
+                return None
+
+        p50, p95, found = timed(online_lookup, ONLINE_TOPICS)
+        report("online (phi)", p50, p95, found, len(ONLINE_TOPICS))
+        if not found:
+            print("(every online lookup failed: no network?)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100000, help="articles in the synthetic dump")
+    parser.add_argument("--lookups", type=int, default=500, help="lookups per kind")
+    parser.add_argument("--dump", help="index this dump instead of a synthetic one")
+    parser.add_argument("--online", action="store_true", help="also time the online tool (network)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    bench(args.pages, args.lookups, args.dump, args.online, args.seed)
@@ -0,0 +1,294 @@
+
+"""
+Local stand-ins for Groq, the search tools and Telegram.
+
+They let the benchmarks run the real Scribe pipeline (agents, tool
+calls, parsing, formatting, bot handler) on a machine without network:
+
+- StubGroq answers like the Groq API after a configurable delay, with a
+  canned JSON response (and optionally a tool call first).
+- StubGoogleSearch / StubDuckDuckGo / StubWikipedia have the same
+  function names as the phi tools and return canned results.
+- FakeUpdate / FakeMessage mimic what msg_handler uses from telegram.
+"""
+
+
+import json, time, uuid
+from typing import Any, List
+
+from phi.model.groq.groq import Groq
+from phi.model.message import Message
+from phi.tools import Toolkit
+from groq.types.chat import ChatCompletion, ChatCompletionChunk
+
+
+# ===============================================
+#               Canned content
+# ===============================================
+
+def canned_response(items=5):
+    """
+    A valid response in the prompt's JSON schema, `items` entries per list.
+    """
+    def entries(label):
+        return [f"{label} {i}: some realistic sentence about the topic of the notes." for i in range(items)]
+
+    return {
+        "Ideas": entries("Idea"),
+        "Assumptions": entries("Assumption"),
+        "Assumption Checks": entries("Your assumption was"),
+        "Questions": entries("Question"),
+        "Verified Answers": entries("Answer"),
+        "Resources": [f"https://example.com/resource/{i}" for i in range(items)],
+        "Summary": entries("Summary"),
+        "Recommendations": entries("Recommendation"),
+        "Title": "Benchmark Brainstorm",
+        "Tools": ["google_search"],
+    }
+
+
+def canned_answer():
+    """
+    A valid answer to one verification prompt (verification.py).
+    """
+    return {
+        "Answer": "Yes, this assumption is correct. Some realistic sentence explaining why.",
+        "Resources": ["https://example.com/resource/0"],
+        "Tools": ["google_search"],
+    }
+
+
+def make_notes(size, seed=0):
+    """
+    Brainstorm-like notes of about `size` characters. The seed makes
+    them unique so the response cache doesn't answer instead of the agent.
+    """
+    paragraph = (
+        "I want to be an AI agents dev, does it worth it? How about income of this field. "
+        "If I want to work as freelancer what platform fits best for this job.\n\n"
+    )
+    header = f"Notes #{seed} ({uuid.uuid4().hex[:8]})\n\n"
+    repeats = max(1, (size - len(header)) // len(paragraph) + 1)
+    return (header + paragraph * repeats)[:max(size, len(header) + 40)]
+
+
+# ===============================================
+#                 Stub model
+# ===============================================
+
+class StubGroq(Groq):
+    """
+    Behaves like phi's Groq model but never touches the network.
+
+    latency: seconds per model call
+    tool_rounds: how many tool calls the model asks for before answering
+    items: entries per list in the canned answer
+    """
+
+    latency: float = 0.2
+    tool_rounds: int = 0
+    items: int = 5
+
+    def _tool_results_seen(self, messages):
+        return sum(1 for m in messages if m.role == "tool")
+
+    def _completion(self, messages):
+        time.sleep(self.latency)
+        message = {"role": "assistant", "content": None}
+        if self.functions and self.tool_choice != "none" and self._tool_results_seen(messages) < self.tool_rounds:
+            name = "google_search" if "google_search" in self.functions else next(iter(self.functions))
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:8]}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps({"query": "ai agent developer salary"})},
+            }]
+            finish_reason = "tool_calls"
+        else:
+            asked = "".join(m.get_content_string() or "" for m in messages if m.role == "user")
+            answer = canned_answer() if '"Answer": "string"' in asked else canned_response(self.items)
+            message["content"] = json.dumps(answer)
+            finish_reason = "stop"
+        prompt_tokens = sum(len(m.get_content_string() or "") for m in messages) // 4
+        return ChatCompletion.model_validate({
+            "id": f"stub-{uuid.uuid4().hex[:8]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.id,
+            "choices": [{"index": 0, "finish_reason": finish_reason, "message": message}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 500, "total_tokens": prompt_tokens + 500},
+        })
+
+    def invoke(self, messages: List[Message]) -> Any:
+        return self._completion(messages)
+
+    async def ainvoke(self, messages: List[Message]) -> Any:
+        return self._completion(messages)
+
+    def invoke_stream(self, messages: List[Message]) -> Any:
+        # Streaming answers directly (no tool call), spread over `latency`
+        text = json.dumps(canned_response(self.items))
+        pieces = [text[i:i + 40] for i in range(0, len(text), 40)]
+        for piece in pieces:
+            time.sleep(self.latency / len(pieces))
+            yield ChatCompletionChunk.model_validate({
+                "id": "stub-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": self.id,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            })
+
+
+# ===============================================
+#                 Stub tools
+# ===============================================
+
+class StubToolkit(Toolkit):
+    latency = 0.05
+
+    def _result(self, query):
+        time.sleep(self.latency)
+        return json.dumps([
+            {"title": f"Result {i} for {query}", "url": f"https://example.com/{i}", "description": "Canned result."}
+            for i in range(3)
+        ])
+
+
+class StubGoogleSearch(StubToolkit):
+    def __init__(self):
+        super().__init__(name="googlesearch")
+        self.register(self.google_search)
+
+    def google_search(self, query: str, max_results: int = 5, language: str = "en") -> str:
+        """Use this function to search Google for a specified query.
+
+        Args:
+            query (str): The query to search for.
+            max_results (int, optional): The maximum number of results to return. Default is 5.
+            language (str, optional): The language of the search results. Default is "en".
+        """
+        return self._result(query)
+
+
+class StubDuckDuckGo(StubToolkit):
+    def __init__(self):
+        super().__init__(name="duckduckgo")
+        self.register(self.duckduckgo_search)
+        self.register(self.duckduckgo_news)
+
+    def duckduckgo_search(self, query: str, max_results: int = 5) -> str:
+        """Use this function to search DuckDuckGo for a query.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+        """
+        return self._result(query)
+
+    def duckduckgo_news(self, query: str, max_results: int = 5) -> str:
+        """Use this function to get the latest news from DuckDuckGo.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+        """
+        return self._result(query)
+
+
+class StubWikipedia(StubToolkit):
+    def __init__(self):
+        super().__init__(name="wikipedia_tools")
+        self.register(self.search_wikipedia)
+
+    def search_wikipedia(self, query: str) -> str:
+        """Searches Wikipedia for a query.
+
+        :param query: The query to search for.
+        :return: Relevant documents from wikipedia.
+        """
+        time.sleep(self.latency)
+        return json.dumps({"name": query, "content": f"Canned summary about {query}."})
+
+
+# ===============================================
+#              Installing the stubs
+# ===============================================
+
+def install_stubs(llm_latency=0.2, tool_latency=0.05, tool_rounds=1, items=5):
+    """
+    Point Scribe (core.py, shared by main and ScribBot) at the stubs:
+    the model factory returns StubGroq, the tools are the stub toolkits,
+    and the agent pools are emptied so no agent with a real model is reused.
+    """
+    import core
+
+    StubToolkit.latency = tool_latency
+
+    def stub_model(config, model_id=None):
+        return StubGroq(
+            id=model_id or config["model"][1],
+            latency=llm_latency,
+            tool_rounds=tool_rounds,
+            items=items,
+        )
+
+    core.groq_model = stub_model
+    core.AGENT_SCRIBE_CONFIG["tools"] = [StubGoogleSearch, StubDuckDuckGo, StubWikipedia]
+    for pool in (core.agent_pool, core.followup_pool, core.verifier_pool, core.lean_pool):
+        pool.reset()
+
+
+# ===============================================
+#              Fake telegram objects
+# ===============================================
+
+class FakeMessage:
+    """
+    The parts of telegram.Message that the bot uses.
+    done_at is set when the final answer is shown.
+    """
+
+    def __init__(self, text="", chat_id=1):
+        self.text = text
+        self.chat_id = chat_id
+        self.replies = []
+        self.edits = 0
+        self.done_at = None
+        self.parent = None
+
+    async def reply_text(self, text, parse_mode=None, **kwargs):
+        reply = FakeMessage(text, self.chat_id)
+        reply.parent = self
+        self.replies.append(reply)
+        if not text.startswith("Received"):
+            self.done_at = time.perf_counter()
+            if self.parent is not None:
+                # Next part of a long answer (reply to the "processing" message)
+                self.parent.done_at = self.done_at
+        return reply
+
+    async def reply_document(self, document, filename=None, **kwargs):
+        reply = FakeMessage(filename or "", self.chat_id)
+        reply.document = document.read()
+        self.replies.append(reply)
+        self.parent.done_at = time.perf_counter()
+        return reply
+
+    async def edit_text(self, text, parse_mode=None, **kwargs):
+        self.text = text
+        self.edits += 1
+        if not text.rstrip().endswith("_still working..._"):
+            self.parent.done_at = time.perf_counter()
+        return self
+
+
+class FakeChat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class FakeUpdate:
+    def __init__(self, text, chat_id=1):
+        self.message = FakeMessage(text, chat_id)
+        self.effective_chat = FakeChat(chat_id)
+        self.effective_message = self.message
@@ -0,0 +1,172 @@
+
+"""
+Persistent cache for Scribe results.
+
+Running the agent is the slow and expensive part (LLM + web search).
+When the same notes come in again (user re-sends a message, CLI is
+re-run on an unchanged file) we can reuse the parsed JSON from the
+previous run and go straight to formatting.
+
+The cache is a small SQLite file so it survives restarts and can be
+shared between the local agent and the bot.
+- Entries expire after a TTL.
+- When the cache is full the least recently used entries are removed.
+"""
+
+
+import abc, hashlib, json, os, sqlite3, threading, time
+
+
+CACHE_PATH = os.getenv("SCRIBE_CACHE_PATH", "scribe_cache.db")
+CACHE_TTL = float(os.getenv("SCRIBE_CACHE_TTL", str(24 * 60 * 60)))  # seconds
+CACHE_MAX_ENTRIES = int(os.getenv("SCRIBE_CACHE_MAX_ENTRIES", "1000"))
+
+
+# ===============================================
+#                 Pure Utilities
+# ===============================================
+
+def normalize_notes(text: str):
+    """
+    Normalize notes so tiny formatting differences (extra spaces,
+    blank lines) don't produce a different cache key.
+    """
+    lines = [" ".join(line.split()) for line in text.strip().splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def make_cache_key(notes: str, prompt_version: str):
+    """
+    Content-addressed key: same notes + same prompt => same key.
+
+    The model is left out on purpose: the router (model_router.py) picks
+    one per request, so the model that will answer isn't known before the
+    lookup, and a result is reused whichever configured model wrote it.
+    """
+    raw = f"{prompt_version}\n{normalize_notes(notes)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ===============================================
+#                 SQLite Store
+# ===============================================
+
+class SQLiteStore(abc.ABC):
+    """
+    Base of the SQLite-backed stores (this cache, similarity.py,
+    history.py, wiki_index.py).
+
+    Safe to use from several threads: one connection guarded by a lock
+    (self._lock). The file is opened on first use, not when the store is
+    created, and subclasses create their tables in _create_tables(conn).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _conn(self):
+        """
+        The SQLite connection, opened (and the tables created) on first use.
+        """
+        if self._connection is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                self._create_tables(conn)
+            self._connection = conn
+        return self._connection
+
+    @abc.abstractmethod
+    def _create_tables(self, conn):
+        ...
+
+
+# ===============================================
+#                 SQLite Cache
+# ===============================================
+
+class SQLiteCache(SQLiteStore):
+    """
+    Key/value store (values are JSON) with TTL and LRU eviction.
+    """
+
+    def __init__(self, path=CACHE_PATH, table="responses", ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        super().__init__(path)
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def _create_tables(self, conn):
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_last_used ON {self.table} (last_used)"
+        )
+
+    def get(self, key):
+        """
+        Return the cached value or None if missing/expired.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value. ttl overrides the default TTL for this entry.
+        """
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            self._evict(now)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _evict(self, now):
+        """
+        Drop expired entries, then the least recently used ones
+        if we are still above max_entries. Caller holds the lock.
+        """
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        extra = count - self.max_entries
+        if extra > 0:
+            self._conn.execute(
+                f"""DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY last_used ASC LIMIT ?
+                )""",
+                (extra,),
+            )
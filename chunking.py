@@ -0,0 +1,247 @@
+
+"""
+Map-reduce processing for large notes.
+
+A long brainstorm doesn't fit well in a single prompt (context limits,
+slow and expensive). Instead:
+
+1. Split: cut the notes on headings / paragraphs into chunks that fit
+   a token budget.
+2. Map: every chunk is sent to the agent (in parallel) which returns
+   partial Ideas, Assumptions, Questions, ...
+3. Merge: partial lists are joined and duplicates removed (locally, no LLM).
+4. Reduce: one last short call writes Summary, Recommendations and Title
+   from the merged result.
+
+The final result has the same JSON schema as a normal run, so
+create_markdown() works on it unchanged.
+"""
+
+
+import contextvars, json, os, re
+from concurrent.futures import ThreadPoolExecutor
+from rate_limit import estimate_tokens
+
+
+# Notes bigger than this (estimated tokens) are processed in chunks
+CHUNK_TOKENS = int(os.getenv("SCRIBE_CHUNK_TOKENS", "3000"))
+CHUNK_WORKERS = int(os.getenv("SCRIBE_CHUNK_WORKERS", "4"))
+
+# Keys produced by the map step (one chunk) and by the reduce step
+MAP_KEYS = ["Ideas", "Assumptions", "Assumption Checks", "Questions", "Verified Answers", "Resources", "Tools"]
+REDUCE_KEYS = ["Summary", "Recommendations", "Title"]
+
+HEADING = re.compile(r"^\s*(#{1,6}\s|[A-Z][A-Z0-9 ]{3,}:?\s*$|=+|-{3,})")
+
+
+# ===============================================
+#                 Pure Utilities
+# ===============================================
+
+def needs_chunking(text: str, max_tokens=CHUNK_TOKENS):
+    return estimate_tokens(text) > max_tokens
+
+
+def split_blocks(text: str):
+    """
+    Split notes into blocks: paragraphs (blank line separated), and a
+    heading always starts a new block.
+    """
+    blocks, current = [], []
+    for line in text.splitlines():
+        if not line.strip():
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            continue
+        if HEADING.match(line) and current:
+            blocks.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def _split_oversized(block: str, max_tokens: int):
+    """
+    A single paragraph bigger than the budget: split on lines,
+    then sentences, then as a last resort on raw characters.
+    """
+    max_chars = max(1, (max_tokens - 1) * 4)
+    pieces = block.splitlines() if "\n" in block else re.split(r"(?<=[.!?])\s+", block)
+    parts, current = [], ""
+    for piece in pieces:
+        while len(piece) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(piece[:max_chars])
+            piece = piece[max_chars:]
+        if current and len(current) + len(piece) + 1 > max_chars:
+            parts.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_notes(text: str, max_tokens=CHUNK_TOKENS):
+    """
+    Split notes into chunks of at most max_tokens (estimated), cutting
+    on heading/paragraph boundaries whenever possible.
+    """
+    chunks, current = [], ""
+    for block in split_blocks(text):
+        if estimate_tokens(block) > max_tokens:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_split_oversized(block, max_tokens))
+            continue
+        candidate = f"{current}\n\n{block}" if current else block
+        if current and estimate_tokens(candidate) > max_tokens:
+            chunks.append(current)
+            current = block
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _dedupe_key(item):
+    return re.sub(r"[^\w]+", " ", str(item).casefold()).strip()
+
+
+def merge_partials(partials):
+    """
+    Join the lists of every chunk result and drop duplicates
+    (case and punctuation insensitive). Order is kept.
+    """
+    merged = {key: [] for key in MAP_KEYS}
+    seen = {key: set() for key in MAP_KEYS}
+    for partial in partials:
+        for key in MAP_KEYS:
+            for item in partial.get(key) or []:
+                dedupe_key = _dedupe_key(item)
+                if dedupe_key and dedupe_key not in seen[key]:
+                    seen[key].add(dedupe_key)
+                    merged[key].append(item)
+    return merged
+
+
+def combine_results(merged, reduced):
+    """
+    Merged map results + reduce result -> the normal full JSON schema.
+    """
+    result = dict(merged)
+    result["Summary"] = reduced.get("Summary", [])
+    result["Recommendations"] = reduced.get("Recommendations", [])
+    result["Title"] = reduced.get("Title", "Brainstorm")
+    return result
+
+
+# ===============================================
+#            Prompts (map and reduce)
+# ===============================================
+
+def build_map_prompt(chunk: str, index: int, total: int):
+    return f"""
+You are an expert brainstorm helper assistant.
+
+You receive PART {index} of {total} of a long brainstorm. Other parts are
+processed separately, so only work with the content of this part.
+
+Use tools ONLY when external knowledge is required to verify facts or
+answer questions. Do NOT search unnecessarily.
+
+For this part:
+1. Organize the content into clear ideas without changing the meaning.
+2. Identify assumptions (explicit or implicit). For each one write a check:
+   "Your assumption was: <assumption>" followed by
+   "Yes, this assumption is correct." OR
+   "No, this assumption is incorrect. The correct information is: <correction>"
+3. Identify questions (explicit or implied) and answer them in a clear
+   question → answer style.
+4. Add only trustworthy resources that add new value.
+
+IMPORTANT RULES:
+- Do NOT invent facts or questions.
+- Do NOT over-correct grammar or rewrite the user's ideas.
+
+OUTPUT FORMAT (MANDATORY):
+- Return ONE valid JSON object, no markdown, no text outside JSON.
+
+JSON SCHEMA (STRICT):
+
+  "Ideas": ["string"],
+  "Assumptions": ["string"],
+  "Assumption Checks": ["string"],
+  "Questions": ["string"],
+  "Verified Answers": ["string"],
+  "Resources": ["string"],
+  "Tools": ["string"]
+
+
+Brainstorm part {index}/{total}:
+\"\"\"{chunk}\"\"\"
+"""
+
+
+def build_reduce_prompt(merged):
+    return f"""
+You are an expert brainstorm helper assistant.
+
+A long brainstorm was already analyzed part by part. Below are the
+combined results (ideas, checked assumptions, answered questions).
+Do NOT use tools.
+
+Write:
+- "Summary": what the user should now understand, based on the verified
+  answers and assumption checks (NOT a recap of the raw notes).
+- "Recommendations": practical, realistic next steps.
+- "Title": a short, clear title for the main topic.
+
+OUTPUT FORMAT (MANDATORY):
+- Return ONE valid JSON object, no markdown, no text outside JSON.
+
+JSON SCHEMA (STRICT):
+
+  "Summary": ["string"],
+  "Recommendations": ["string"],
+  "Title": "string"
+
+
+Combined analysis:
+{json.dumps(merged, ensure_ascii=False, indent=1)}
+"""
+
+
+# ===============================================
+#            Map-Reduce (sync version)
+# ===============================================
+
+def map_reduce_notes(text, run_prompt, run_plain, workers=CHUNK_WORKERS, max_tokens=CHUNK_TOKENS):
+    """
+    Process large notes chunk by chunk.
+
+    run_prompt(prompt, keys) -> parsed JSON dict with those keys (map step,
+    with tools). It is called from several threads at once, so every call
+    takes its own agent (core.run_prompt: one from the agent pool).
+    run_plain(prompt, keys): the same on an agent without tools (reduce step).
+    """
+    chunks = split_notes(text, max_tokens)
+    total = len(chunks)
+    print(f"Large notes: processing {total} chunks with {workers} workers...")
+
+    prompts = [build_map_prompt(chunk, i + 1, total) for i, chunk in enumerate(chunks)]
+    # Each chunk runs in the caller's context (keeps the metrics trace id)
+    contexts = [contextvars.copy_context() for _ in prompts]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        partials = list(pool.map(lambda ctx, prompt: ctx.run(run_prompt, prompt, MAP_KEYS), contexts, prompts))
+
+    merged = merge_partials(partials)
+    reduced = run_plain(build_reduce_prompt(merged), REDUCE_KEYS)
+    return combine_results(merged, reduced)
@@ -0,0 +1,720 @@
+
+"""
+Shared core of Scribe: everything main.py (notes files) and ScribBot.py
+(telegram) both need, so the hot path exists once.
+
+- prompt and instructions,
+- the agent configuration, model router, agent pools, response cache
+  and near-duplicate cache,
+- one agent run with model failover and retries (or streamed), JSON parsing,
+- the analysis pipeline (analyze_notes): cache, near duplicates, then
+  map-reduce, parallel verification or a single run,
+- the markdown layout of the result files.
+
+Everything here is blocking: the bot runs analyze_notes in a worker thread.
+
+Importing this module is cheap and has no side effects: phi, groq,
+httpx and the search tools are imported when the first agent is built,
+the cache file is opened on first use and .env is loaded by the entry
+points. See benchmarks/bench_startup.py.
+"""
+
+
+import datetime, importlib, os, time
+from cache import SQLiteCache, make_cache_key
+from similarity import SimilarityIndex, SIMILAR_CACHE, SIMILAR_REUSE
+from history import ChatHistory
+from tool_cache import cached_tool
+from json_repair import tolerant_loads, complete_response, SCHEMA_KEYS
+from stream_parser import IncrementalSectionParser
+from model_router import ModelRouter
+from rate_limit import decorrelated_jitter, retry_after_seconds, estimate_tokens
+from agent_pool import AgentPool, AGENT_POOL_SIZE, shared_http_client
+from chunking import needs_chunking, map_reduce_notes
+from verification import PARALLEL_VERIFY, VERIFY_KEYS, VERIFY_TOOL_CALLS, VERIFY_WORKERS, verify_notes
+from incremental import analyze_incremental
+from tool_classifier import CLASSIFIER_MODEL, TOOLS, LEAN, classify_notes, route_timer
+from singleflight import SingleFlight
+from metrics import span, timed, count, observe, record_run_tokens, TOKEN_BUCKETS
+
+
+# ===============================================
+#                 Pure Utilities
+# ===============================================
+
+@timed("parse_response_content")
+def parse_response_content(response: str):
+    """
+    Get the agent response and parse it to a valid JSON.
+    Fences, prose around the object, trailing commas and truncated
+    output are repaired (see json_repair.py).
+    """
+    return tolerant_loads(response)
+
+
+
+def extract_and_format(parsed_resopnse,cat_name):
+    """
+    Extract the values of each key in the response
+    """
+    content = ""
+    for elem in parsed_resopnse[cat_name]:
+        content += f"- {elem}\n"
+    return content 
+
+
+# ===============================================
+#            Prompt and Instructions 
+# ===============================================
+# Notes: 
+# The more precise prompt is, the better result you get.
+# Instructions: Who the agent is and how it should behave
+# Prompt: What the agent should do right now
+
+# Static part of every request. The agent's instructions (system
+# message) and the prompt prefix never change between calls and the notes
+# always come last, so providers that cache prompt prefixes (Groq) only
+# process the notes of each request. The two don't repeat each other:
+# INSTRUCTIONS hold the agent-wide rules (role, tools, resources), the
+# prefix the task and the output schema.
+
+INSTRUCTIONS = [
+    "You are an expert brainstorm helper agent. You help the user clarify and structure their raw brainstorm notes.",
+    "Use Google Search, DuckDuckGo or Wikipedia ONLY when external knowledge is required to verify facts, "
+    "check assumptions or provide reliable resources. Do NOT use tools unnecessarily or by default.",
+    "Keep answers realistic, grounded and concise. Do NOT invent facts or questions.",
+    """Resources rule (STRICT):
+- Only resources that add NEW value beyond common knowledge, preferably official and well-established ones.
+- No generic sites by default. If no high-quality resource is clearly useful, return an empty list.
+- Links in the user's notes are "user-saved links": include one only if it is relevant, trustworthy and still useful.""",
+    """Tool selection rules:
+- Use Google Search first then DuckDuckGo if needed for specific, up-to-date, or complex queries (like salaries, visa requirements, local regulations).
+- Use Wikipedia only for general knowledge, definitions, or historical/contextual info.
+- If Wikipedia returns PageError, do not retry infinitely; move on to search engines.""",
+]
+
+
+# The lean agent has no tools, so the tool rules are left out
+LEAN_INSTRUCTIONS = [
+    instruction for instruction in INSTRUCTIONS
+    if "tool" not in instruction.lower() and "search" not in instruction.lower()
+]
+
+
+OUTPUT_RULES = """If the input is meaningless, empty, or non-textual, return ONLY:
+  "error": "Invalid or insufficient content"
+
+OUTPUT FORMAT (MANDATORY): ONE valid JSON object, no markdown, no text
+outside JSON, starting with '{' and ending with '}'.
+
+JSON SCHEMA (STRICT):
+
+  "Ideas": ["string"],
+  "Assumptions": ["string"],
+  "Assumption Checks": ["string"],
+  "Questions": ["string"],
+  "Verified Answers": ["string"],
+  "Resources": ["string"],
+  "Summary": ["string"],
+  "Recommendations": ["string"],
+  "Title": "string",
+  "Tools": ["string"]
+"""
+
+
+PROMPT_PREFIX = """
+The user provides raw brainstorm notes as plain text. They may be messy,
+informal or incomplete and mix ideas, assumptions, questions and
+spelling mistakes.
+
+Your responsibilities:
+
+1. Organize the content into clear ideas without changing the meaning.
+2. Correct obvious spelling mistakes ONLY when the meaning is clear.
+   Do NOT over-correct grammar or rewrite the user's ideas.
+3. Identify assumptions made by the user (explicit or implicit). For each one:
+   - State it as "Your assumption was: <assumption>"
+   - Verify it using reliable sources when needed.
+   - Respond with "Yes, this assumption is correct." OR
+     "No, this assumption is incorrect. The correct information is: <correction>"
+4. Identify questions in the notes (explicit or implied). Use tools if
+   answering requires external knowledge. Present answers in a clear
+   question → answer style.
+5. Resources related to the topic (official websites, trusted articles,
+   books, videos, communities), following the resources rule.
+6. Summary: short and in simple language. It reflects the final
+   understanding after verification ("What should the user now
+   understand?"), NOT a recap of the user's notes.
+7. Recommendations: practical, realistic steps to help the user move forward.
+8. Title: short and clear, reflecting the main topic.
+
+""" + OUTPUT_RULES
+
+
+LEAN_PROMPT_PREFIX = """
+The user provides raw, possibly messy brainstorm notes. Work only from
+the notes and from general knowledge you are sure about.
+
+1. Organize the content into clear ideas without changing the meaning
+   (fix obvious spelling mistakes only).
+2. List the assumptions (explicit or implicit). Check each one:
+   "Your assumption was: <assumption>" followed by
+   "Yes, this assumption is correct." OR
+   "No, this assumption is incorrect. The correct information is: <correction>"
+3. List the questions (explicit or implied) and answer them in a clear
+   question → answer style.
+4. Resources: only well-established ones that add value, else an empty list.
+5. Summary: what the user should now understand after your analysis
+   (NOT a recap of the notes). Recommendations: practical next steps.
+   Title: short and clear.
+
+""" + OUTPUT_RULES
+
+
+COMPACT_NOTES = os.getenv("SCRIBE_COMPACT_NOTES", "1") == "1"
+MIN_DEDUP_LINE = 12   # shorter lines ("Pros:", "- yes") may repeat on purpose
+
+
+def compact_notes(notes: str):
+    """
+    Notes as they are put in the prompt: spaces collapsed, at most one
+    blank line between paragraphs, lines repeated word for word dropped.
+    """
+    lines, seen, blank = [], set(), False
+    for line in notes.strip().splitlines():
+        line = " ".join(line.split())
+        if not line:
+            blank = bool(lines)
+            continue
+        key = line.casefold()
+        if len(line) >= MIN_DEDUP_LINE:
+            if key in seen:
+                continue
+            seen.add(key)
+        if blank:
+            lines.append("")
+            blank = False
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def history_block(history):
+    """
+    Summary of the chat's previous results (see history.py), between the
+    static prefix and the notes.
+    """
+    if not history:
+        return ""
+    return f"""
+Earlier in this chat you already analyzed and verified these results
+(newest first). The new message may be a follow-up to them: build on them,
+do NOT search again for what is already here, only for what is new.
+\"\"\"{history}\"\"\"
+"""
+
+
+def notes_block(notes, source):
+    """
+    The only part of the prompt that changes between requests.
+    """
+    if COMPACT_NOTES:
+        notes = compact_notes(notes)
+    return f"""
+User brainstorm {source} content:
+\"\"\"{notes}\"\"\"
+"""
+
+
+@timed("build_prompt")
+def build_prompt(notes, source="file", history=None):
+    """
+    source: "file" (main.py) or "message" (the bot), only used to
+    tell the model where the notes come from.
+    history: summary of the chat's previous results (follow-ups).
+    """
+    return PROMPT_PREFIX + history_block(history) + notes_block(notes, source)
+
+
+@timed("build_prompt")
+def build_lean_prompt(notes, source="file", history=None):
+    """
+    Shorter prompt for notes that need no search (lean agent, no tools).
+    """
+    return LEAN_PROMPT_PREFIX + history_block(history) + notes_block(notes, source)
+
+
+def prompt_report(notes, prompt, route=None):
+    """
+    Estimated input tokens of one request: the static part (instructions
+    + prompt prefix, cacheable by the provider) and the notes (with the
+    chat history of a follow-up), and how many tokens compact_notes()
+    saved. Tool definitions aren't counted.
+    """
+    lean = route == LEAN
+    instructions = LEAN_INSTRUCTIONS if lean else INSTRUCTIONS
+    prefix = LEAN_PROMPT_PREFIX if lean else PROMPT_PREFIX
+    static = estimate_tokens("\n".join(instructions)) + estimate_tokens(prefix)
+    notes_tokens = estimate_tokens(prompt[len(prefix):])
+    report = {
+        "static": static,
+        "notes": notes_tokens,
+        "total": static + notes_tokens,
+        "saved": max(0, estimate_tokens(notes) - estimate_tokens(compact_notes(notes))) if COMPACT_NOTES else 0,
+    }
+    for part in ("static", "notes"):
+        observe("scribe_prompt_tokens", report[part], TOKEN_BUCKETS, part=part)
+    return report
+
+
+def format_prompt_report(report):
+    return (
+        f"Prompt: ~{report['total']} tokens ({report['static']} static, cacheable; "
+        f"{report['notes']} notes, {report['saved']} saved by compaction)"
+    )
+
+
+# ===============================================
+#              Agent Configuration
+# ===============================================
+
+AGENT_SCRIBE_CONFIG = {
+    "name": "Scribe",
+    "model":[
+        "llama-3.3-70b-versatile",
+        "moonshotai/kimi-k2-instruct-0905",
+        "openai/gpt-oss-120b",
+    ],
+    # Tools as "module:Class" (imported when the first agent is built) or
+    # classes. Every agent gets its own instances (agents run in parallel).
+    # Search results are cached (see tool_cache.py) to save time and rate limits
+    "tools": [
+        "phi.tools.googlesearch:GoogleSearch",
+        "phi.tools.duckduckgo:DuckDuckGo",
+        # Offline index instead of the online API when there is one (see
+        # wiki_index.py, only imported by local_wikipedia when it's used)
+        "local_wikipedia:LocalWikipediaTools" if os.getenv("SCRIBE_WIKI_INDEX") else "phi.tools.wikipedia:WikipediaTools",
+    ],
+    "instructions": INSTRUCTIONS,
+}
+
+
+def load_tool(tool):
+    """
+    "module:Class" -> the class (a class is returned as it is).
+    """
+    if not isinstance(tool, str):
+        return tool
+    module_name, _, class_name = tool.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+# kimi-k2 (model[1]) stays the first choice, the others are fallbacks.
+# The router moves traffic away from a model that is slow or failing.
+model_router = ModelRouter(
+    [AGENT_SCRIBE_CONFIG["model"][1]]
+    + [m for i, m in enumerate(AGENT_SCRIBE_CONFIG["model"]) if i != 1]
+)
+
+
+def groq_model(config, model_id=None):
+    """
+    Groq model whose client is built once and uses the shared
+    keep-alive connection pool (no new TLS handshake per message).
+    """
+    from limited_groq import LimitedGroq
+
+    model = LimitedGroq(id=model_id or config["model"][1], http_client=shared_http_client())
+    model.client = model.get_client()
+    return model
+
+
+def agent_scribe(config, model_id=None):
+    from phi.agent.agent import Agent
+
+    return Agent(
+        name=config["name"],
+        model=groq_model(config, model_id),
+        tools=[cached_tool(load_tool(tool)()) for tool in config["tools"]],
+        instructions=config["instructions"],
+        show_tool_calls=False,
+        markdown=False,
+
+    )
+
+# Bump this whenever PROMPT/INSTRUCTIONS change so old cached
+# results are not reused for the new prompt.
+PROMPT_VERSION = "2"
+
+response_cache = SQLiteCache()
+# Results of almost the same notes (see similarity.py)
+similar_cache = SimilarityIndex()
+# Previous results of every chat, for follow-ups (see history.py)
+chat_history = ChatHistory()
+
+
+def agent_followup(config, model_id=None):
+    """
+    Small agent without tools, used to ask only for the keys
+    that were missing in a response (cheap compared to a full run).
+    """
+    from phi.agent.agent import Agent
+
+    return Agent(
+        name=config["name"],
+        model=groq_model(config, model_id),
+        show_tool_calls=False,
+        markdown=False,
+    )
+
+
+def agent_lean(config, model_id=None):
+    """
+    Agent for notes that need no search (tool_classifier.py): no tool
+    definitions in the request, shorter instructions.
+    """
+    from phi.agent.agent import Agent
+
+    return Agent(
+        name=config["name"],
+        model=groq_model(config, model_id),
+        instructions=LEAN_INSTRUCTIONS,
+        show_tool_calls=False,
+        markdown=False,
+    )
+
+
+def agent_verifier(config, model_id=None):
+    """
+    Agent that checks one assumption or answers one question
+    (verification.py): same tools, at most VERIFY_TOOL_CALLS per run.
+    """
+    scribe = agent_scribe(config, model_id)
+    scribe.tool_call_limit = VERIFY_TOOL_CALLS
+    return scribe
+
+
+# Agents are reused between runs instead of being built per message
+# (see agent_pool.py). Each one is reset after every run.
+# Nothing is built until the first run (or prewarm).
+agent_pool = AgentPool(lambda model_id: agent_scribe(AGENT_SCRIBE_CONFIG, model_id), size=AGENT_POOL_SIZE)
+followup_pool = AgentPool(lambda model_id: agent_followup(AGENT_SCRIBE_CONFIG, model_id), size=AGENT_POOL_SIZE)
+verifier_pool = AgentPool(lambda model_id: agent_verifier(AGENT_SCRIBE_CONFIG, model_id), size=VERIFY_WORKERS)
+lean_pool = AgentPool(lambda model_id: agent_lean(AGENT_SCRIBE_CONFIG, model_id), size=AGENT_POOL_SIZE)
+
+
+# ===============================================
+#                 Agent Runs
+# ===============================================
+
+def run_agent(model_id, prompt, pool=None):
+    """
+    One run on a pooled agent for this model (agent_pool by default).
+    """
+    with (pool or agent_pool).agent(model_id) as scribe:
+        response = scribe.run(prompt)
+    record_run_tokens(response, model=model_id)
+    return response
+
+
+def run_followup(prompt):
+    with followup_pool.agent(model_router.pick()) as followup:
+        return followup.run(prompt).content
+
+
+def run_routed(prompt, model_id, tried, pool=None):
+    """
+    One attempt on `model_id` (picked from the models not in `tried`; with
+    hedging the router may also start a backup). Returns (used_model, response).
+    """
+    return model_router.run(lambda model: run_agent(model, prompt, pool), exclude=tried, primary=model_id)
+
+
+def attempt_failed(model_id, attempt, error, tried, sleep, delay):
+    """
+    Bookkeeping after a failed attempt. Returns (next sleep, seconds to wait).
+    Jittered backoff so parallel runs don't retry in lockstep,
+    but never sooner than the provider asked (Retry-After).
+    """
+    # The router reports which models failed (a hedged backup too)
+    failed = getattr(error, "failed_models", None) or [model_id]
+    for model in failed:
+        tried.add(model)
+        count("scribe_agent_retries_total", model=model)
+    print(f"Attempt {attempt} ({', '.join(failed)}) failed: {error}")
+    sleep = decorrelated_jitter(sleep, base=delay)
+    return sleep, max(sleep, retry_after_seconds(error) or 0)
+
+
+def safe_agent_run(prompt, retries=3, delay=0.5, pool=None):
+
+    """ Slow down retries of external API/tools if first 
+        try failed, to avoid rate-limiting, temp-ban or IP block.
+
+        Every attempt goes to the best model right now (model_router),
+        a model that failed is not retried while another one is left.
+    """
+
+    tried = set()
+    sleep = delay
+    for i in range(retries):
+        model_id = model_router.pick(exclude=tried)
+        try:
+            with span("agent_attempt", model=model_id, attempt=i + 1) as attempt:
+                used_model, response = run_routed(prompt, model_id, tried, pool)
+                attempt["used_model"] = used_model
+            return response
+        except Exception as e:
+            sleep, wait = attempt_failed(model_id, i + 1, e, tried, sleep, delay)
+            time.sleep(wait)
+    raise RuntimeError("All retries failed.")
+
+
+def run_prompt(prompt, keys=SCHEMA_KEYS, pool=None):
+    """
+    One agent run: prompt -> parsed JSON response.
+    Safe to call from several threads (pooled agents).
+    Missing keys are asked for separately instead of re-running everything.
+    """
+    response = safe_agent_run(prompt, pool=pool)
+    response_content = response.content
+    parsed_response = parse_response_content(response_content)
+    return complete_response(parsed_response, prompt, run_followup, keys)
+
+
+def stream_prompt(prompt, on_sections, pool=None):
+    """
+    One streamed agent run (no retries, the caller falls back to
+    run_prompt): prompt -> parsed JSON response. on_sections(sections) is
+    called every time a top-level JSON section is complete.
+    """
+    model_id = model_router.pick()
+    parser = IncrementalSectionParser()
+    parts = []
+    start = time.perf_counter()
+    try:
+        with span("agent_attempt", model=model_id, attempt=1, mode="stream"):
+            with (pool or agent_pool).agent(model_id) as scribe:
+                for chunk in scribe.run(prompt, stream=True):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        if parser.feed(chunk.content):
+                            on_sections(parser.sections)
+                record_run_tokens(scribe.run_response, model=model_id)
+    except Exception as e:
+        model_router.record_error(model_id, e)
+        raise
+    model_router.record_success(model_id, time.perf_counter() - start)
+    parsed_response = parse_response_content("".join(parts))
+    return complete_response(parsed_response, prompt, run_followup)
+
+
+def run_plain(prompt, keys):
+    """
+    run_prompt on an agent without tools (extract / summary steps).
+    """
+    return run_prompt(prompt, keys, followup_pool)
+
+
+def run_verification(prompt):
+    """
+    One assumption or question, on a verifier agent (small tool budget).
+    """
+    return run_prompt(prompt, VERIFY_KEYS, verifier_pool)
+
+
+def ask_classifier(prompt):
+    """
+    The cheap model of the tool classifier: prompt -> raw text.
+    """
+    with followup_pool.agent(CLASSIFIER_MODEL) as classifier:
+        return classifier.run(prompt).content
+
+
+def choose_route(notes):
+    """
+    "tools" or "lean" for these notes (see tool_classifier.py).
+    """
+    return classify_notes(notes, ask=ask_classifier)
+
+
+def route_prompt(notes, route, source="file", history=None):
+    """
+    (prompt, agent pool) for this route.
+    """
+    if route == LEAN:
+        return build_lean_prompt(notes, source, history), lean_pool
+    return build_prompt(notes, source, history), agent_pool
+
+
+def similar_scope(chat_id=None):
+    """
+    Near duplicates are only reused for the same prompt (like the response
+    cache key, whichever model answered) and, in the bot, within the same
+    chat: another chat's result holds items from notes this chat never wrote.
+    """
+    scope = PROMPT_VERSION
+    return scope if chat_id is None else f"{scope}:chat:{chat_id}"
+
+
+def find_similar(notes, chat_id=None):
+    """
+    The most similar notes analyzed before (in this chat), as
+    {"key", "similarity", "notes", "result"}, or None.
+    """
+    if not SIMILAR_CACHE:
+        return None
+    with span("similar_lookup") as lookup:
+        match = similar_cache.lookup(notes, similar_scope(chat_id))
+        lookup.update(similarity=round(match["similarity"], 3) if match else None)
+    count("scribe_cache_lookups_total", cache="similar", result="hit" if match is not None else "miss")
+    return match
+
+
+def remember_similar(key, notes, result, chat_id=None):
+    if SIMILAR_CACHE:
+        # Keys are unique in the index: the same notes in two chats are two entries
+        key = key if chat_id is None else f"{key}:chat:{chat_id}"
+        similar_cache.add(key, notes, result, similar_scope(chat_id))
+
+
+# ===============================================
+#              Analysis Pipeline
+# ===============================================
+# The same for both entry points: main.py (source="file") and
+# ScribBot.py (source="message", in a worker thread).
+
+in_flight = SingleFlight()
+
+
+def analyze_notes(notes, source="file", history=None, chat_id=None, on_sections=None):
+    """
+    Notes -> parsed JSON response: from the response cache, from almost
+    the same notes (in the bot: of the same chat), or from the agent.
+    Identical notes analyzed at the same time (a batch, a message
+    forwarded to several chats, a double-send) share one run.
+
+    history: summary of the chat's previous results for a follow-up
+    (see history.py). on_sections(sections): shows the sections of a
+    single run while they are streamed (the bot).
+    """
+    # A follow-up's answer depends on the previous results too
+    cache_key = make_cache_key(notes if history is None else f"{history}\n\n{notes}", PROMPT_VERSION)
+    parsed_response = response_cache.get(cache_key)
+    count("scribe_cache_lookups_total", cache="response", result="hit" if parsed_response is not None else "miss")
+    if parsed_response is not None:
+        print("Same notes were processed before, using cached result.")
+        return parsed_response
+    if history is None:
+        parsed_response = reuse_similar(notes, cache_key, chat_id)
+        if parsed_response is not None:
+            return parsed_response
+
+    def analyze():
+        parsed_response = analyze_fresh(notes, source, history, on_sections)
+        if "error" not in parsed_response:
+            response_cache.set(cache_key, parsed_response)
+            if history is None:
+                remember_similar(cache_key, notes, parsed_response, chat_id)
+        return parsed_response
+
+    # Only the first caller's on_sections is shown, the others wait
+    return in_flight.do(cache_key, analyze)
+
+
+def reuse_similar(notes, cache_key, chat_id=None):
+    """
+    Almost the same notes analyzed before (see similarity.py): their
+    result, or a run on what changed (see incremental.py). None when the
+    notes need a full analysis.
+    """
+    similar = find_similar(notes, chat_id)
+    if similar is None:
+        return None
+    if similar["similarity"] >= SIMILAR_REUSE:
+        print(f"Almost the same notes were processed before ({similar['similarity']:.0%} similar), using that result.")
+        parsed_response = similar["result"]
+    else:
+        print(f"Similar notes were processed before ({similar['similarity']:.0%} similar), analyzing what differs.")
+        # "full": nothing to reuse, analyzed like new notes by the caller
+        parsed_response, mode = analyze_incremental(notes, similar, run_prompt, lambda notes: None)
+        count("scribe_similar_runs_total", mode=mode)
+        if parsed_response is None or "error" in parsed_response:
+            return parsed_response
+    remember_similar(cache_key, notes, parsed_response, chat_id)
+    if chat_id is None:
+        # Not in the bot: the response cache is shared by all chats
+        response_cache.set(cache_key, parsed_response)
+    return parsed_response
+
+
+def analyze_fresh(notes, source="file", history=None, on_sections=None):
+    """
+    Notes nothing can be reused for -> full analysis: map-reduce for
+    large notes, else one analysis (a follow-up is always one run with
+    the previous results in the prompt, nothing is verified again).
+    """
+    if history is not None:
+        count("scribe_followups_total")
+    elif needs_chunking(notes):
+        return map_reduce_notes(notes, run_prompt, run_plain)
+    return analyze_single(notes, source, history, on_sections)
+
+
+def analyze_single(notes, source="file", history=None, on_sections=None):
+    """
+    Notes that fit in one run. Notes that need no search go to the lean
+    agent (no tools, see tool_classifier.py), the others are verified in
+    parallel when that is on (see verification.py).
+    """
+    route = choose_route(notes)
+    with route_timer(route):
+        if route == TOOLS and PARALLEL_VERIFY and history is None:
+            return verify_notes(notes, run_plain, run_verification)
+        prompt, pool = route_prompt(notes, route, source, history)
+        print(format_prompt_report(prompt_report(notes, prompt, route)))
+        if on_sections is not None:
+            try:
+                return stream_prompt(prompt, on_sections, pool)
+            except Exception as e:
+                print(f"Streaming run failed, retrying without streaming: {e}")
+        return run_prompt(prompt, pool=pool)
+
+
+# ===============================================
+#           Layout (formatting output) 
+# ===============================================
+
+# The bot's replies are rendered by telegram_reply.py (MarkdownV2,
+# split into messages); it sends this markdown when a reply is too long.
+
+@timed("create_markdown")
+def create_markdown(parsed_response):
+    """
+    Format the response into a markdown (the .md file written by main.py)
+    """
+    title = parsed_response["Title"]
+    created = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
+    ideas = extract_and_format(parsed_response, "Ideas")
+    assumptions = extract_and_format(parsed_response, "Assumptions")
+    assumptions_checks = extract_and_format(parsed_response, "Assumption Checks")
+    questions = extract_and_format(parsed_response, "Questions")
+    verified_answers = extract_and_format(parsed_response, "Verified Answers")
+    resources = extract_and_format(parsed_response, "Resources")
+    recommendations = extract_and_format(parsed_response, "Recommendations")
+    summary = parsed_response['Summary']
+
+
+    result = f"""
+
+#{title}\n
+###{created}\n
+##Ideas\n{ideas}\n\n
+##Assumptions\n{assumptions}\n
+##Checked Assumptions\n{assumptions_checks}\n\n
+##Questions Found\n{questions}\n\n
+##Questions Answered\n{verified_answers}\n\n
+##Resources\n{resources}\n\n
+##Recommendations\n{recommendations}\n\n
+##Summary\n{summary}\n
+    """
+    return result
@@ -0,0 +1,207 @@
+
+"""
+Per-chat history: follow-up messages reuse the previous results.
+
+Every Telegram message used to be analyzed on its own. A follow-up like
+"what about Germany specifically?" had no context, so the user pasted the
+whole brainstorm again and the agent verified everything again. Now every
+finished analysis is stored per chat, and a short message that comes soon
+after gets a compact summary of the previous results in its prompt
+(core.build_prompt(history=...)) instead of the full previous text:
+
+- what is kept: the notes, the parsed result, and the tool findings
+  (checked assumptions, answered questions, resources).
+- summary: title, summary and findings of the last HISTORY_TURNS results,
+  newest first, every line clipped, at most HISTORY_SUMMARY_CHARS.
+- follow-up: the chat has a result from the last FOLLOWUP_WINDOW seconds
+  and the message is shorter than FOLLOWUP_MAX_CHARS. Long notes are a
+  new brainstorm and start without history.
+- retention: results expire after HISTORY_TTL, a chat keeps its last
+  HISTORY_MAX_TURNS, stored notes are cut at HISTORY_MAX_NOTES_CHARS.
+
+Same SQLite file as the caches (cache.py), indexed by chat id, so the
+history survives restarts and is shared by all worker processes.
+"""
+
+
+import json, os, time
+from cache import CACHE_PATH, SQLiteStore
+
+
+HISTORY = os.getenv("SCRIBE_HISTORY", "1") == "1"
+HISTORY_TTL = float(os.getenv("SCRIBE_HISTORY_TTL", str(7 * 24 * 60 * 60)))       # seconds
+HISTORY_MAX_TURNS = int(os.getenv("SCRIBE_HISTORY_MAX_TURNS", "20"))               # per chat
+HISTORY_MAX_NOTES_CHARS = int(os.getenv("SCRIBE_HISTORY_MAX_NOTES_CHARS", "20000"))
+HISTORY_TURNS = int(os.getenv("SCRIBE_HISTORY_TURNS", "3"))                        # results in the summary
+HISTORY_SUMMARY_CHARS = int(os.getenv("SCRIBE_HISTORY_SUMMARY_CHARS", "1500"))
+FOLLOWUP_WINDOW = float(os.getenv("SCRIBE_FOLLOWUP_WINDOW", str(60 * 60)))        # seconds
+FOLLOWUP_MAX_CHARS = int(os.getenv("SCRIBE_FOLLOWUP_MAX_CHARS", "400"))
+
+# Result keys with what the tools found, and their label in the summary
+FINDINGS = [
+    ("Assumption Checks", "Checked"),
+    ("Verified Answers", "Answered"),
+    ("Resources", "Sources"),
+]
+ITEM_CHARS = 200    # one finding in the summary
+ITEMS_PER_KEY = 3
+
+
+# ===============================================
+#                 Pure Utilities
+# ===============================================
+
+def clip(text, limit=ITEM_CHARS):
+    if isinstance(text, list):
+        text = " ".join(map(str, text))
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def findings(result):
+    """
+    The parts of a result that came from the tools: {key: [items]}.
+    """
+    found = {}
+    for key, _ in FINDINGS:
+        items = result.get(key) or []
+        if isinstance(items, str):
+            items = [items]
+        if items:
+            found[key] = items
+    return found
+
+
+def summarize_turns(turns, max_chars=HISTORY_SUMMARY_CHARS):
+    """
+    Previous results (newest first) -> compact text for the prompt. Whole
+    results are added while they fit, a too long first one is cut.
+    """
+    blocks = []
+    for turn in turns:
+        result = turn["result"]
+        lines = [f"- \"{clip(result.get('Title', 'Brainstorm'), 80)}\": {clip(result.get('Summary', ''), 300)}"]
+        for key, label in FINDINGS:
+            items = turn["findings"].get(key, [])[:ITEMS_PER_KEY]
+            lines += [f"  {label}: {clip(item)}" for item in items]
+        block = "\n".join(lines)
+        if sum(len(b) + 1 for b in blocks) + len(block) > max_chars:
+            if not blocks:
+                blocks.append(block[:max_chars])
+            break
+        blocks.append(block)
+    return "\n".join(blocks)
+
+
+# ===============================================
+#                 SQLite History
+# ===============================================
+
+class ChatHistory(SQLiteStore):
+    """
+    Finished analyses per chat.
+    """
+
+    def __init__(self, path=CACHE_PATH, table="history", ttl=HISTORY_TTL, max_turns=HISTORY_MAX_TURNS):
+        super().__init__(path)
+        self.table = table
+        self.ttl = ttl
+        self.max_turns = max_turns
+
+    def _create_tables(self, conn):
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                id INTEGER PRIMARY KEY,
+                chat_id INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                notes TEXT NOT NULL,
+                result TEXT NOT NULL,
+                findings TEXT NOT NULL
+            )"""
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_chat ON {self.table} (chat_id, id)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_created ON {self.table} (created_at)")
+
+    def add(self, chat_id, notes, result):
+        """
+        Store a finished analysis, then apply the retention limits.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO {self.table} (chat_id, created_at, notes, result, findings) VALUES (?, ?, ?, ?, ?)",
+                (chat_id, now, notes[:HISTORY_MAX_NOTES_CHARS], json.dumps(result), json.dumps(findings(result))),
+            )
+            self._evict(chat_id, now)
+
+    def recent(self, chat_id, limit=HISTORY_TURNS, since=None):
+        """
+        The chat's last `limit` results, newest first, as
+        {"created_at", "notes", "result", "findings"}. since: only results
+        created after this time.
+        """
+        oldest = max(time.time() - self.ttl, since or 0)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT created_at, notes, result, findings FROM {self.table}
+                    WHERE chat_id = ? AND created_at >= ? ORDER BY id DESC LIMIT ?""",
+                (chat_id, oldest, limit),
+            ).fetchall()
+        return [
+            {"created_at": created_at, "notes": notes, "result": json.loads(result), "findings": json.loads(found)}
+            for created_at, notes, result, found in rows
+        ]
+
+    def forget(self, chat_id):
+        """
+        Drop the chat's history. Returns how many results were removed.
+        """
+        with self._lock, self._conn:
+            return self._conn.execute(f"DELETE FROM {self.table} WHERE chat_id = ?", (chat_id,)).rowcount
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _evict(self, chat_id, now):
+        """
+        Drop expired results (all chats) and the chat's results beyond
+        max_turns. Caller holds the lock.
+        """
+        self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            f"""DELETE FROM {self.table} WHERE chat_id = ? AND id NOT IN (
+                SELECT id FROM {self.table} WHERE chat_id = ? ORDER BY id DESC LIMIT ?
+            )""",
+            (chat_id, chat_id, self.max_turns),
+        )
+
+
+# ===============================================
+#                 Follow-ups
+# ===============================================
+
+def is_followup(notes, turns, now=None):
+    """
+    A short message soon after a result of the same chat.
+    """
+    if not turns or len(notes.strip()) >= FOLLOWUP_MAX_CHARS:
+        return False
+    return (now or time.time()) - turns[0]["created_at"] <= FOLLOWUP_WINDOW
+
+
+def chat_context(history, chat_id, notes):
+    """
+    Summary of the chat's previous results for a follow-up, or None when
+    the notes are analyzed on their own.
+    """
+    if not HISTORY:
+        return None
+    turns = history.recent(chat_id, since=time.time() - FOLLOWUP_WINDOW)
+    if not is_followup(notes, turns):
+        return None
+    return summarize_turns(turns)
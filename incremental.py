@@ -0,0 +1,273 @@
+"""
+Incremental re-analysis of a notes file that changed.
+
+Re-running the whole brainstorm after editing one paragraph costs as
+much as the first run. Instead, the last processed version is kept next
+to the output (.scribe/<notes file>.json) together with its result:
+
+1. Diff: the notes are split into blocks (paragraphs / headings, like
+   chunking.py) and compared with the blocks of the last version.
+2. Delta: only the changed blocks go to the agent: the new text, the
+   old text of the edited or deleted paragraphs, and the previous result
+   with its items numbered. The agent returns the items for the new
+   text, the numbers of the previous items that no longer hold
+   ("Outdated", e.g. "salary is 50k" after it was changed to "80k") and
+   a rewritten Summary / Recommendations.
+3. Merge: the outdated items are taken out, the new ones are added to
+   the previous lists (duplicates dropped) and the markdown file is
+   written again.
+
+So the cost follows the size of the edit, not of the notes. When more
+than half of the notes changed, the notes are analyzed from scratch
+(same when there is no previous state).
+"""
+
+
+import hashlib, json, os, re
+from cache import normalize_notes
+from chunking import MAP_KEYS, split_blocks, merge_partials
+
+
+STATE_DIR = ".scribe"
+STATE_VERSION = 1
+
+# Above this share of changed blocks a full analysis is cheaper and cleaner
+MAX_DELTA_RATIO = 0.5
+
+# Keys the delta step returns: new items + the rewritten summary.
+# "Outdated" (numbers of previous items to drop) is optional: an answer
+# without it just drops nothing.
+DELTA_KEYS = MAP_KEYS + ["Summary", "Recommendations"]
+OUTDATED_KEY = "Outdated"
+
+
+# ===============================================
+#                 Pure Utilities
+# ===============================================
+
+def block_hash(block: str):
+    return hashlib.sha1(normalize_notes(block).encode("utf-8")).hexdigest()
+
+
+def diff_blocks(old_text, new_text):
+    """
+    Compare two versions of the notes block by block.
+    Returns (added_blocks, removed_blocks): blocks of the new version
+    that weren't in the old one, and blocks of the old version that are
+    gone (both in order). An edited paragraph is removed + added.
+    """
+    new_hashes = {}
+    for block in split_blocks(new_text):
+        h = block_hash(block)
+        new_hashes[h] = new_hashes.get(h, 0) + 1
+
+    removed, old_hashes = [], {}
+    for block in split_blocks(old_text or ""):
+        h = block_hash(block)
+        if new_hashes.get(h):
+            new_hashes[h] -= 1
+            old_hashes[h] = old_hashes.get(h, 0) + 1
+        else:
+            removed.append(block)
+
+    added = []
+    for block in split_blocks(new_text):
+        h = block_hash(block)
+        if old_hashes.get(h):
+            old_hashes[h] -= 1
+        else:
+            added.append(block)
+    return added, removed
+
+
+def numbered_items(previous):
+    """
+    Items of a previous result as [(number, key, item)], numbered from 1
+    across all lists. The delta prompt and merge_delta use the same
+    numbers.
+    """
+    numbered = []
+    for key in MAP_KEYS:
+        for item in previous.get(key) or []:
+            numbered.append((len(numbered) + 1, key, item))
+    return numbered
+
+
+def outdated_numbers(delta):
+    """
+    Item numbers in the delta's "Outdated" list ("3", 3 or "#3" all work).
+    """
+    numbers = set()
+    for value in delta.get(OUTDATED_KEY) or []:
+        digits = re.search(r"\d+", str(value))
+        if digits:
+            numbers.add(int(digits.group()))
+    return numbers
+
+
+def merge_delta(previous, delta):
+    """
+    Previous full result + delta result -> new full result.
+    """
+    outdated = outdated_numbers(delta)
+    kept = {key: [] for key in MAP_KEYS}
+    for number, key, item in numbered_items(previous):
+        if number not in outdated:
+            kept[key].append(item)
+    result = merge_partials([kept, delta])
+    result["Summary"] = delta.get("Summary") or previous.get("Summary", [])
+    result["Recommendations"] = delta.get("Recommendations") or previous.get("Recommendations", [])
+    result["Title"] = previous.get("Title", "Brainstorm")
+    return result
+
+
+def build_delta_prompt(previous, added_text: str, removed_text: str):
+    known = {key: [] for key in MAP_KEYS}
+    for number, key, item in numbered_items(previous):
+        known[key].append(f"[{number}] {item}")
+    for key in ("Summary", "Recommendations", "Title"):
+        known[key] = previous.get(key, [])
+    return f"""
+You are an expert brainstorm helper assistant.
+
+The user already brainstormed on this topic and it was analyzed before
+(previous analysis below, every item has a number in brackets). Then the
+user edited the notes: some paragraphs were removed or replaced (old
+text below) and some were added or rewritten (new text below).
+
+Use tools ONLY when external knowledge is required to verify facts or
+answer questions. Do NOT search unnecessarily.
+
+1. List in "Outdated" the numbers of the previous items that came from
+   the old text and no longer match the notes (changed or deleted).
+   Items that still hold stay, don't list them.
+2. For the NEW text only:
+   - Organize the content into clear ideas without changing the meaning.
+   - Identify assumptions (explicit or implicit). For each one write a check:
+     "Your assumption was: <assumption>" followed by
+     "Yes, this assumption is correct." OR
+     "No, this assumption is incorrect. The correct information is: <correction>"
+   - Identify questions (explicit or implied) and answer them in a clear
+     question → answer style.
+   - Add only trustworthy resources that add new value.
+
+Do NOT repeat previous items that are not outdated, and don't write
+their numbers in the new items.
+
+Then rewrite "Summary" and "Recommendations" for the WHOLE brainstorm
+(previous analysis without the outdated items + new text).
+
+OUTPUT FORMAT (MANDATORY):
+- Return ONE valid JSON object, no markdown, no text outside JSON.
+
+JSON SCHEMA (STRICT):
+
+  "Outdated": ["number"],
+  "Ideas": ["string"],
+  "Assumptions": ["string"],
+  "Assumption Checks": ["string"],
+  "Questions": ["string"],
+  "Verified Answers": ["string"],
+  "Resources": ["string"],
+  "Tools": ["string"],
+  "Summary": ["string"],
+  "Recommendations": ["string"]
+
+
+Previous analysis:
+{json.dumps(known, ensure_ascii=False, indent=1)}
+
+Old text (removed or replaced):
+\"\"\"{removed_text or "(nothing)"}\"\"\"
+
+New text:
+\"\"\"{added_text or "(nothing)"}\"\"\"
+"""
+
+
+# ===============================================
+#            State next to the output
+# ===============================================
+
+def state_path(output_path, notes_path):
+    """
+    One state file per notes file: a/notes.txt and b/notes.txt saved to
+    the same output must not share one.
+    """
+    path_hash = hashlib.sha1(os.path.abspath(notes_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(output_path, STATE_DIR, f"{os.path.basename(notes_path)}.{path_hash}.json")
+
+
+def load_state(output_path, notes_path):
+    """
+    Last processed version of this notes file, or None.
+    """
+    try:
+        with open(state_path(output_path, notes_path)) as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if state.get("version") != STATE_VERSION or state.get("notes_path") != os.path.abspath(notes_path):
+        return None
+    return state
+
+
+def save_state(output_path, notes_path, notes, result, saved_path):
+    path = state_path(output_path, notes_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    state = {
+        "version": STATE_VERSION,
+        "notes_path": os.path.abspath(notes_path),
+        "notes": notes,
+        "result": result,
+        "saved_path": saved_path,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# ===============================================
+#            Incremental analysis
+# ===============================================
+
+def plan_delta(state, notes):
+    """
+    What to do with these notes given a previous version and its result
+    (state = {"notes": ..., "result": ...}): (mode, added_blocks,
+    removed_blocks) where mode is "unchanged", "delta" or "full".
+    """
+    if state is None or "error" in (state.get("result") or {"error": ""}):
+        return "full", None, None
+
+    added, removed = diff_blocks(state["notes"], notes)
+    if not added and not removed:
+        return "unchanged", [], []
+    # Most of the notes changed: a fresh analysis is as cheap and cleaner
+    if len(added) > len(split_blocks(notes)) * MAX_DELTA_RATIO:
+        return "full", None, None
+    if len(removed) > len(split_blocks(state["notes"])) * MAX_DELTA_RATIO:
+        return "full", None, None
+    return "delta", added, removed
+
+
+def analyze_incremental(notes, state, run_prompt, analyze_full):
+    """
+    notes + last state -> (result, mode)
+
+    run_prompt(prompt, keys) -> parsed JSON dict (one agent run)
+    analyze_full(notes) -> full result (used when a delta isn't possible)
+    mode is "unchanged", "delta" or "full".
+    """
+    mode, added, removed = plan_delta(state, notes)
+    if mode == "full":
+        return analyze_full(notes), "full"
+    if mode == "unchanged":
+        return state["result"], "unchanged"
+
+    prompt = build_delta_prompt(state["result"], "\n\n".join(added), "\n\n".join(removed))
+    delta = run_prompt(prompt, DELTA_KEYS)
+    if "error" in delta:
+        return delta, "delta"
+    return merge_delta(state["result"], delta), "delta"
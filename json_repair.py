@@ -0,0 +1,261 @@
+
+"""
+Tolerant parsing and repair of the agent's JSON answer.
+
+The model is asked for ONE clean JSON object, but sometimes it:
+- wraps it in ```json fences or adds a sentence before/after it,
+- leaves trailing commas,
+- gets cut off (truncated output),
+- forgets a key or returns a string where a list is expected.
+
+Re-running the whole agent (LLM + all the searches) for that is a waste.
+This module fixes what can be fixed locally, and when only some keys
+are missing or broken it asks the model for just those keys
+(a small follow-up request without tools).
+
+REPAIR_COUNTERS counts how often each repair path is used.
+"""
+
+
+import json, re, threading
+from collections import Counter
+
+
+# The ten keys of the strict schema in the prompt.
+# "Title" is a string, everything else is a list of strings.
+SCHEMA_KEYS = [
+    "Ideas",
+    "Assumptions",
+    "Assumption Checks",
+    "Questions",
+    "Verified Answers",
+    "Resources",
+    "Summary",
+    "Recommendations",
+    "Title",
+    "Tools",
+]
+STRING_KEYS = {"Title", "Answer"}
+
+REPAIR_COUNTERS = Counter()
+_counters_lock = threading.Lock()
+
+FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*(?:```|$)", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _count(name):
+    with _counters_lock:
+        REPAIR_COUNTERS[name] += 1
+
+
+def repair_stats():
+    """
+    How often each repair path fired, e.g. {"clean": 10, "fences": 2, "followup": 1}
+    """
+    with _counters_lock:
+        return dict(REPAIR_COUNTERS)
+
+
+# ===============================================
+#              Tolerant JSON parsing
+# ===============================================
+
+def _close_truncated(text: str):
+    """
+    Make a cut-off JSON object loadable: drop the unfinished last
+    key/value and close every open string, list and object.
+    """
+    stack = []
+    in_string = escape = False
+    last_complete = 0   # position after the last complete value at object/list level
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            last_complete = i + 1
+        elif char == ",":
+            last_complete = i
+
+    if not stack:
+        return text
+
+    # Cut back to the last complete element, then close what is still open.
+    cut = text[:last_complete] if last_complete else text
+    cut = cut.rstrip().rstrip(",")
+    stack = []
+    in_string = escape = False
+    for char in cut:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        cut += '"'
+    cut = TRAILING_COMMA.sub(r"\1", cut.rstrip().rstrip(","))
+    return cut + "".join(reversed(stack))
+
+
+def tolerant_loads(response: str):
+    """
+    Parse the agent response into a dict, repairing common problems.
+    Raises ValueError when nothing usable can be found.
+    """
+    if not response or not response.strip():
+        raise ValueError("Agent returned empty response")
+
+    text = response.strip()
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            _count("clean")
+            return parsed
+        if isinstance(parsed, str):
+            # The whole object was returned as a JSON string
+            text = parsed.strip()
+    except json.JSONDecodeError:
+        pass
+
+    # Markdown fences
+    fenced = FENCE.search(text)
+    if fenced and fenced.group(1).strip():
+        text = fenced.group(1).strip()
+        _count("fences")
+
+    # Wrapping quotes
+    if len(text) > 1 and text[0] == text[-1] and text[0] in "'\"":
+        text = text[1:-1].strip()
+
+    # Prose around the object
+    start = text.find("{")
+    if start == -1:
+        _count("failed")
+        raise ValueError(f"Invalid JSON returned by agent: no JSON object found.\n\nRaw response:\n{response}")
+    end = text.rfind("}")
+    if start > 0 or (end != -1 and end < len(text) - 1):
+        _count("prose")
+    body = text[start:]
+    text = text[start:end + 1] if end > start else body
+
+    for name, candidate in (
+        ("extracted", text),
+        ("trailing_commas", TRAILING_COMMA.sub(r"\1", text)),
+        ("truncated", _close_truncated(TRAILING_COMMA.sub(r"\1", body))),
+    ):
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            if name != "extracted":
+                _count(name)
+            return parsed
+
+    _count("failed")
+    raise ValueError(f"Invalid JSON returned by agent.\n\nRaw response:\n{response}")
+
+
+# ===============================================
+#              Schema validation
+# ===============================================
+
+def validate_schema(parsed: dict, keys=SCHEMA_KEYS):
+    """
+    Check the parsed response against the schema.
+    Small type problems are fixed in place (a string instead of a list,
+    a list instead of the title string).
+
+    Returns the list of keys that are still missing or unusable.
+    """
+    problems = []
+    for key in keys:
+        value = parsed.get(key)
+        if key in STRING_KEYS:
+            if isinstance(value, list) and value and all(isinstance(v, str) for v in value):
+                parsed[key] = " ".join(value)
+                _count("coerced")
+            elif not isinstance(value, str) or not value.strip():
+                problems.append(key)
+        else:
+            if isinstance(value, str):
+                parsed[key] = [value] if value.strip() else []
+                _count("coerced")
+            elif value is None and key in parsed:
+                parsed[key] = []
+                _count("coerced")
+            elif not isinstance(value, list):
+                problems.append(key)
+    return problems
+
+
+def build_followup_prompt(original_prompt: str, partial: dict, keys):
+    schema = ",\n".join(
+        f'  "{key}": {"string" if key in STRING_KEYS else "[string]"}' for key in keys
+    )
+    return f"""
+Your previous answer to the task below was incomplete.
+Return ONLY the missing keys, consistent with the answer you already gave.
+Do NOT use tools. Return ONE valid JSON object, no text outside JSON.
+
+JSON SCHEMA (STRICT):
+{schema}
+
+
+Answer you already gave:
+{json.dumps(partial, ensure_ascii=False)}
+
+
+Original task:
+{original_prompt}
+"""
+
+
+def complete_response(parsed: dict, original_prompt: str, run_followup, keys=SCHEMA_KEYS):
+    """
+    Validate the parsed response and, if some keys are missing/broken,
+    ask for just those keys with run_followup(prompt) -> raw text.
+
+    An {"error": ...} response (invalid input) is returned as is.
+    """
+    if "error" in parsed:
+        return parsed
+
+    problems = validate_schema(parsed, keys)
+    if not problems:
+        return parsed
+
+    _count("followup")
+    print(f"Response is missing {problems}, asking for those keys only.")
+    partial = {key: value for key, value in parsed.items() if key not in problems}
+    extra = tolerant_loads(run_followup(build_followup_prompt(original_prompt, partial, problems)))
+    for key in problems:
+        if key in extra:
+            parsed[key] = extra[key]
+
+    still_missing = validate_schema(parsed, keys)
+    if still_missing:
+        _count("failed")
+        raise ValueError(f"Agent response is missing keys after repair: {still_missing}")
+    return parsed
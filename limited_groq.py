@@ -0,0 +1,66 @@
+
+"""
+phi's Groq model behind the shared "groq" rate limiter (rate_limit.py).
+
+Imported only when the first agent is built: phi and groq are slow to
+import, and most entry points (--help, the bot's front process) never
+need them.
+"""
+
+
+from typing import Any, List
+from phi.model.groq.groq import Groq
+from phi.model.message import Message
+from rate_limit import limiter_for, estimate_message_tokens
+
+
+class LimitedGroq(Groq):
+    """
+    phi's Groq model, but every request to the API first waits for the
+    shared "groq" budget, and 429s block the provider for Retry-After.
+
+    The SDK's own retries are turned off: it would retry 429s on its
+    own schedule, bypassing the limiter. safe_agent_run retries instead.
+    """
+
+    def get_client_params(self):
+        client_params = super().get_client_params()
+        client_params["max_retries"] = 0
+        return client_params
+
+    def invoke(self, messages: List[Message]) -> Any:
+        limiter = limiter_for("groq")
+        limiter.acquire(estimate_message_tokens(messages))
+        try:
+            return super().invoke(messages)
+        except Exception as e:
+            limiter.report_error(e)
+            raise
+
+    async def ainvoke(self, messages: List[Message]) -> Any:
+        limiter = limiter_for("groq")
+        await limiter.aacquire(estimate_message_tokens(messages))
+        try:
+            return await super().ainvoke(messages)
+        except Exception as e:
+            limiter.report_error(e)
+            raise
+
+    def invoke_stream(self, messages: List[Message]) -> Any:
+        limiter = limiter_for("groq")
+        limiter.acquire(estimate_message_tokens(messages))
+        try:
+            yield from super().invoke_stream(messages)
+        except Exception as e:
+            limiter.report_error(e)
+            raise
+
+    async def ainvoke_stream(self, messages: List[Message]) -> Any:
+        limiter = limiter_for("groq")
+        await limiter.aacquire(estimate_message_tokens(messages))
+        try:
+            async for chunk in super().ainvoke_stream(messages):
+                yield chunk
+        except Exception as e:
+            limiter.report_error(e)
+            raise
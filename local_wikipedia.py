@@ -0,0 +1,54 @@
+
+"""
+Wikipedia tool for the agent backed by the offline index (wiki_index.py).
+
+Same function name, arguments and answer format as phi's WikipediaTools
+(search_wikipedia(query) -> JSON document), so the model sees the same
+tool, but the answer comes from SQLite in a few milliseconds. A page that
+isn't in the index is reported as not found (no retries, no network),
+or looked up online with SCRIBE_WIKI_FALLBACK=1.
+"""
+
+
+import json
+from phi.document import Document
+from phi.tools import Toolkit
+from metrics import span, count
+from wiki_index import WikiIndex, WIKI_INDEX_PATH, WIKI_FALLBACK
+
+
+# One index (one connection) for every agent
+wiki_index = WikiIndex(WIKI_INDEX_PATH)
+
+
+class LocalWikipediaTools(Toolkit):
+    # Answers are local: not cached or rate limited by tool_cache.py
+    local = True
+
+    def __init__(self, index=None, fallback=WIKI_FALLBACK):
+        super().__init__(name="wikipedia_tools")
+        self.index = index or wiki_index
+        self.online = None
+        if fallback:
+            from phi.tools.wikipedia import WikipediaTools
+            from tool_cache import cached_tool
+
+            self.online = cached_tool(WikipediaTools()).functions["search_wikipedia"].entrypoint
+        self.register(self.search_wikipedia)
+
+    def search_wikipedia(self, query: str) -> str:
+        """Searches Wikipedia for a query.
+
+        :param query: The query to search for.
+        :return: Relevant documents from wikipedia.
+        """
+        with span("tool_call", tool="search_wikipedia", cached=False, source="offline") as call:
+            page = self.index.lookup(query)
+            call["found"] = page is not None
+        count("scribe_offline_wiki_lookups_total", result="hit" if page is not None else "miss")
+        if page is None:
+            if self.online is not None:
+                return self.online(query=query)
+            return f"No Wikipedia article found for '{query}'. Do not retry, use another tool if needed."
+        title, summary = page
+        return json.dumps(Document(name=title, content=summary).to_dict())
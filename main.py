@@ -21,74 +21,29 @@ This project was for learning purpose, of course it has mistakes. This is how we
 """
 
 
-from phi.agent.agent import Agent
-from phi.model.groq.groq import Groq
-from phi.tools.duckduckgo import DuckDuckGo
-from phi.tools.googlesearch import GoogleSearch
-from phi.tools.wikipedia import WikipediaTools
-from dotenv import load_dotenv
-import datetime, time
-import sys, json, os
-
-
-load_dotenv()
+if __name__ == "__main__":
+    # Settings are read from the environment when the modules below are
+    # imported, so .env is loaded first. Importing this file (tests,
+    # benchmarks, worker processes) doesn't touch the environment.
+    from dotenv import load_dotenv
+    load_dotenv()
 
 
-now = datetime.datetime.now()
-datetime_creation = now.strftime('%Y-%m-%d %H:%M')
+from tool_cache import tool_cache_stats
+from json_repair import repair_stats
+from core import agent_pool, model_router, run_prompt, analyze_notes, create_markdown
+from tool_classifier import route_stats
+from incremental import analyze_incremental, load_state, save_state
+from metrics import timed, trace, start_metrics_server
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
+import sys, json, os, glob, argparse
 
 
 NOTES_FILE_PATH = "/home/ozirx/OZiRX/Tech/PRJs/Scribe/thinking.txt"
 OUTPUT_FILE_PATH = "/home/ozirx/OZiRX/Tech/PRJs/Scribe"
 
 
-# ===============================================
-#                 Pure Utilities
-# ===============================================
-
-def parse_response_content(response: str):
-    """
-    Get the agent response and parse it to a valid JSON 
-    """
-    if not response or not response.strip():
-        raise ValueError("Agent returned empty response")
-
-    response = response.strip()
-
-    # Remove markdown fences if present
-    if response.startswith("```"):
-        response = response.strip("`")
-        response = response.replace("json", "", 1).strip()
-
-    # Remove wrapping quotes 
-    if (
-        (response.startswith("'") and response.endswith("'")) or
-        (response.startswith('"') and response.endswith('"'))
-    ):
-        response = response[1:-1].strip()
-
-    try:
-        return json.loads(response)
-    except json.JSONDecodeError as e:
-        raise ValueError(
-            f"Invalid JSON returned by agent:\n{e}\n\nRaw response:\n{response}"
-        )
-
-
-
-def extract_and_format(parsed_resopnse,cat_name):
-    """
-    Extract the values of each key in the response
-    """
-    content = ""
-    for elem in parsed_resopnse[cat_name]:
-        content += f"- {elem}\n"
-    return content 
-
-
-
-
-
 # ===============================================
 #            Side-effect Utilities
 # ===============================================
@@ -96,6 +51,7 @@ def extract_and_format(parsed_resopnse,cat_name):
 # beyond returning a value.
 
 
+@timed("load_file_content")
 def load_file_content(file_path):
     
     """Load file content and make sure it is not empty"""
@@ -103,20 +59,21 @@ def load_file_content(file_path):
     try:
         with open(file_path, "r") as f:
             content = f.read().strip()
-            if len(content) < 20:
-                print(f"The file doesn't have enough content({len(content)} chars). Please add more notes.")
-                sys.exit(1)
-            return content
-
     except FileNotFoundError:
-        print(f"No notes found. Please create '{file_path}' with some content.")
+        raise FileNotFoundError(f"No notes found. Please create '{file_path}' with some content.")
     except Exception as e:
         raise RuntimeError(f"Unexpected error {e}") from e
 
+    if len(content) < 20:
+        raise ValueError(f"The file doesn't have enough content({len(content)} chars). Please add more notes.")
+    return content
 
+
+@timed("save_content")
 def save_content(file_path:str, file_name:str, content:str):
     """
     Save formatted response to the file. Create it if not exist.
+    Returns the full path of the saved file (None if saving failed).
     """
     proper_name = file_name.replace(" ","_")
     full_path = os.path.join(file_path,f"{proper_name}.md")
@@ -129,220 +86,231 @@ def save_content(file_path:str, file_name:str, content:str):
         with open(f"{full_path}", "w") as f:
             f.write(content)
         print(f"file saved at {full_path}")
+        return full_path
     except Exception as e:
         print(f"Failed to save file. Reason:\n {e}")
 
 
-def safe_agent_run(agent,prompt, retries=3, delay=0.5):
+# ===============================================
+#           Processing Pipeline
+# ===============================================
+# The analysis itself is core.analyze_notes (shared with the bot)
 
-    """ Slow down retries of external API/tools if first 
-        try failed, to avoid rate-limiting, temp-ban or IP block.
+def process_notes_file(notes_path, output_path, file_prefix="", cancelled=None):
     """
+    Load one notes file, analyze it and save the markdown result.
+    Returns the path of the saved file.
 
-    for i in range(retries):
-        try:
-            response = agent.run(prompt)
-            return response
-        except Exception as e:
-            print(f"Attempt {i+1} failed: {e}")
-            time.sleep(delay * (2 ** i))  # Exponential backoff
-    raise RuntimeError("All retries failed.")
+    cancelled: optional function, if it returns True after the agent
+    finished the result is dropped (used by batch mode timeouts).
+    """
+    with trace("notes_file", path=notes_path):
+        file_content = load_file_content(notes_path)
+        parsed_response = analyze_notes(file_content)
+        if cancelled is not None and cancelled():
+            return None
+        if "error" in parsed_response:
+            raise ValueError(parsed_response["error"])
+        file_name = file_prefix + parsed_response["Title"]
+        markdown_content = create_markdown(parsed_response)
+        saved_path = save_content(output_path,file_name,markdown_content)
+        if saved_path is None:
+            raise RuntimeError("Failed to save the result")
+        return saved_path
 
 
 # ===============================================
-#            Prompt and Instructions 
+#           Batch Mode (many notes files)
 # ===============================================
-# Notes: 
-# The more precise prompt is, the better result you get.
-# Instructions: Who the agent is and how it should behave
-# Prompt: What the agent should do right now
-
-file_content = load_file_content(NOTES_FILE_PATH)
-
-
-PROMPT = f"""
-You are an expert brainstorm helper assistant.
-
-You have access to the following tools:
-["Google Search", "Wikipedia", "DuckDuckGo"]
-
-Use tools ONLY when external knowledge is required to verify facts,
-check assumptions, or provide reliable resources.
-Do NOT search unnecessarily.
-
-The user provides raw brainstorm notes as plain text.
-The notes may be messy, informal, incomplete, or contain assumptions,
-questions, spelling mistakes, and mixed ideas.
-
-Your responsibilities:
-
-1. Organize the content into clear ideas without changing the meaning.
-2. Correct obvious spelling mistakes ONLY when the meaning is clear.
-3. Identify assumptions made by the user (explicit or implicit).
-4. For each assumption:
-   - State it clearly using this format:
-     "Your assumption was: <assumption>"
-   - Verify it using reliable sources when needed.
-   - Respond with:
-     - "Yes, this assumption is correct."
-     - OR "No, this assumption is incorrect. The correct information is: <correction>"
-5. Identify questions in the notes (explicit or implied).
-   - If answering requires external knowledge, use tools.
-   - Present answers in a clear question → answer style.
-6. Extract and provide helpful resources related to the topic.
-   Resources may include:
-     - Official websites
-     - Trusted articles
-     - Books
-     - Videos
-     - Communities
-   Prefer official and well-established sources.
-7. Write a short, clear summary of the topic in simple language.
-8. Provide practical, realistic recommendations to help the user move forward.
-9. Generate a short, clear title that reflects the main topic.
-
-IMPORTANT RULES:
-- Do NOT invent facts or questions.
-- Do NOT over-correct grammar or rewrite the user's ideas.
-- Do NOT include unverified or low-quality resources.
-- Keep answers realistic and grounded.
-- Maintain a consistent response structure.
-
-Resources rule:
-- Do NOT blindly reuse links found in the user's notes.
-- If links appear in the notes, treat them as "user-saved links".
-- Only include a link in "Resources" if it is relevant, trustworthy,
-  and adds value beyond what the user already provided.
-- Prefer adding NEW, high-quality resources when possible.
-- If no better resources exist, you may include selected user links,
-  but only after evaluation.
-
-Summary rule:
-- The Summary MUST reflect the final understanding after analysis.
-- It should be based on the verified answers and assumption checks,
-  NOT a recap of the user's original notes.
-- The summary should answer: "What should the user now understand?"
-
-CLARIFICATIONS:
-- "Resources" must be curated by you. Do NOT automatically reuse links
-  found in the user's notes unless they are evaluated and still useful.
-- The "Summary" must summarize the conclusions and insights you produced
-  after verification, not the user's raw brainstorm.
-
-INVALID INPUT:
-- If the input is meaningless, empty, or non-textual, return ONLY:
-
-
-  "error": "Invalid or insufficient content"
-
-
-OUTPUT FORMAT (MANDATORY):
-- Return ONE valid JSON object.
-- No markdown.
-- No explanations.
-- No text outside JSON.
-- Output MUST start with '{' and end with '}'.
-
-JSON SCHEMA (STRICT):
-
-  "Ideas": ["string"],
-  "Assumptions": ["string"],
-  "Assumption Checks": ["string"],
-  "Questions": ["string"],
-  "Verified Answers": ["string"],
-  "Resources": ["string"],
-  "Summary": ["string"],
-  "Recommendations": ["string"],
-  "Title": "string",
-  "Tools": ["string"]
-
-
-User brainstorm file content:
-\"\"\"{file_content}\"\"\"
-"""
 
+BATCH_WORKERS = int(os.getenv("SCRIBE_BATCH_WORKERS", "4"))
+BATCH_TIMEOUT = float(os.getenv("SCRIBE_BATCH_TIMEOUT", "300"))  # seconds per file
 
-INSTRUCTIONS = [
-    "You are an expert brainstorm helper agent.",
-    "Your primary role is to help the user clarify and structure their raw brainstorm notes.",
-    "You may use Google Search, DuckDuckGo, and Wikipedia ONLY when external knowledge is required.",
-    "Do NOT use tools unnecessarily or by default.",
-    "Keep answers realistic, grounded, and concise.",
-   """Resources rule (STRICT):
-- Only include resources if they add NEW value beyond common knowledge.
-- If no high-quality external resource is clearly useful, return an empty list.
-- Do NOT include generic sites by default.
-""",
-"""
-Tool selection rules:
-- Use Google Search first then DuckDuckGo if needed for specific, up-to-date, or complex queries (like salaries, visa requirements, local regulations).
-- Use Wikipedia only for general knowledge, definitions, or historical/contextual info.
-- If Wikipedia returns PageError, do not retry infinitely; move on to search engines.
-"""
-]
 
+def collect_notes_files(patterns):
+    """
+    Turn a list of files, directories and glob patterns into
+    a sorted list of notes files (no duplicates).
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*.txt"))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        found.update(os.path.abspath(m) for m in matches if os.path.isfile(m))
+    return sorted(found)
 
-# ===============================================
-#              Agent Configuration
-# ===============================================
 
-AGENT_SCRIBE_CONFIG = {
-    "name": "Scribe",
-    "model":[
-        "llama-3.3-70b-versatile",
-        "moonshotai/kimi-k2-instruct-0905",
-        "openai/gpt-oss-120b",
-    ],
-    "tools": [GoogleSearch(), DuckDuckGo(), WikipediaTools()],
-    "instructions": INSTRUCTIONS,
-}
-
-
-def agent_scribe(config):
-    return Agent(
-        name=config["name"],
-        model=Groq(id=config["model"][1]),
-        tools=config["tools"],
-        instructions=config["instructions"],
-        show_tool_calls=False,
-        markdown=False,
-
-    )
+def run_batch(notes_files, output_path, workers=BATCH_WORKERS, timeout=BATCH_TIMEOUT):
+    """
+    Process many notes files at the same time on a bounded thread pool.
+
+    Each file gets its own agent. A file that runs longer than `timeout`
+    seconds is reported as failed and its late result is not saved
+    (a running thread can't be killed, it is just abandoned: the caller
+    exits with os._exit, see batch_main).
+
+    Returns {"succeeded": {path: saved_path}, "failed": {path: reason},
+    "timed_out": [paths], "wall_time": seconds}
+    """
+    start = time.perf_counter()
+    started_at = {}
+    timed_out = set()
+    succeeded, failed = {}, {}
+
+    def job(notes_path):
+        started_at[notes_path] = time.perf_counter()
+        # Prefix with the notes file name so two notes with the same
+        # title don't overwrite each other's result.
+        prefix = os.path.splitext(os.path.basename(notes_path))[0] + "_"
+        return process_notes_file(
+            notes_path, output_path, prefix, cancelled=lambda: notes_path in timed_out
+        )
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = {pool.submit(job, path): path for path in notes_files}
+    pending = set(futures)
+
+    while pending:
+        done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        for future in done:
+            path = futures[future]
+            if path in timed_out:
+                continue
+            try:
+                succeeded[path] = future.result()
+            except Exception as e:
+                failed[path] = str(e) or type(e).__name__
+
+        now = time.perf_counter()
+        for future in list(pending):
+            path = futures[future]
+            if path in started_at and now - started_at[path] > timeout:
+                timed_out.add(path)
+                failed[path] = f"Timed out after {timeout:g}s"
+                pending.discard(future)
+
+    pool.shutdown(wait=False, cancel_futures=True)
+    return {
+        "succeeded": succeeded, "failed": failed, "timed_out": sorted(timed_out),
+        "wall_time": time.perf_counter() - start,
+    }
+
+
+def print_batch_report(report):
+    succeeded, failed = report["succeeded"], report["failed"]
+    print("\n========== Batch report ==========")
+    print(f"Files: {len(succeeded) + len(failed)} | OK: {len(succeeded)} | Failed: {len(failed)}")
+    print(f"Wall time: {report['wall_time']:.1f}s")
+    for path, reason in sorted(failed.items()):
+        print(f"  FAILED {path}: {reason}")
+    print(f"Tool cache: {tool_cache_stats()}")
+    print(f"JSON repairs: {repair_stats()}")
+    print(f"Models: {json.dumps(model_router.stats(), indent=1)}")
+    print(f"Tool routes: {route_stats()}")
+
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(description="Run Scribe on many notes files at once.")
+    parser.add_argument("paths", nargs="+", help="Notes files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE_PATH, help="Where to save the .md results")
+    parser.add_argument("-w", "--workers", type=int, default=BATCH_WORKERS, help="How many files to process in parallel")
+    parser.add_argument("-t", "--timeout", type=float, default=BATCH_TIMEOUT, help="Max seconds per file")
+    args = parser.parse_args(argv)
+
+    # Enough pooled agents for every worker
+    agent_pool.size = max(agent_pool.size, args.workers)
+
+    notes_files = collect_notes_files(args.paths)
+    if not notes_files:
+        print("No notes files found.")
+        sys.exit(1)
+
+    print(f"Processing {len(notes_files)} files with {args.workers} workers...")
+    report = run_batch(notes_files, args.output, workers=args.workers, timeout=args.timeout)
+    print_batch_report(report)
+    if report["timed_out"]:
+        # sys.exit would wait for the abandoned threads (the interpreter
+        # joins pool threads at exit), i.e. for the hung file after all
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(1)
+    if report["failed"]:
+        sys.exit(1)
+
 
 # ===============================================
-#           Layout (formatting output) 
+#      Watch Mode (re-analyze notes on change)
 # ===============================================
 
-def create_markdown(parsed_response):
+WATCH_INTERVAL = float(os.getenv("SCRIBE_WATCH_INTERVAL", "1"))   # seconds between checks
+WATCH_SETTLE = 0.5   # seconds a file must stay unchanged before it is read
+
+
+def process_notes_incremental(notes_path, output_path):
     """
-    Format the response into a markdown for telegram
+    Analyze only what changed since the last run of this file (see
+    incremental.py) and rewrite its markdown result.
+    Returns (saved path, mode) where mode is "unchanged", "delta" or "full".
     """
-    title = parsed_response["Title"]
-    ideas = extract_and_format(parsed_response, "Ideas")
-    assumptions = extract_and_format(parsed_response, "Assumptions")
-    assumptions_checks = extract_and_format(parsed_response, "Assumption Checks")
-    questions = extract_and_format(parsed_response, "Questions")
-    verified_answers = extract_and_format(parsed_response, "Verified Answers")
-    resources = extract_and_format(parsed_response, "Resources")
-    recommendations = extract_and_format(parsed_response, "Recommendations")
-    summary = parsed_response['Summary']
-
-
-    result = f"""
-
-#{title}\n
-###{datetime_creation}\n
-##Ideas\n{ideas}\n\n
-##Assumptions\n{assumptions}\n
-##Checked Assumptions\n{assumptions_checks}\n\n
-##Questions Found\n{questions}\n\n
-##Questions Answered\n{verified_answers}\n\n
-##Resources\n{resources}\n\n
-##Recommendations\n{recommendations}\n\n
-##Summary\n{summary}\n
+    with trace("notes_file", path=notes_path) as run:
+        file_content = load_file_content(notes_path)
+        state = load_state(output_path, notes_path)
+        parsed_response, mode = analyze_incremental(file_content, state, run_prompt, analyze_notes)
+        run["incremental"] = mode
+        if mode == "unchanged":
+            return state["saved_path"], mode
+        if "error" in parsed_response:
+            raise ValueError(parsed_response["error"])
+        markdown_content = create_markdown(parsed_response)
+        saved_path = save_content(output_path, parsed_response["Title"], markdown_content)
+        if saved_path is None:
+            raise RuntimeError("Failed to save the result")
+        save_state(output_path, notes_path, file_content, parsed_response, saved_path)
+        return saved_path, mode
+
+
+def watch(patterns, output_path, interval=WATCH_INTERVAL):
     """
-    return result
-
+    Check the notes files every `interval` seconds and re-analyze the
+    ones that changed. Runs until Ctrl+C.
+    """
+    seen = {}   # path -> (mtime, size) of the last processed version
+    print(f"Watching {', '.join(patterns)} (Ctrl+C to stop)")
+    while True:
+        for path in collect_notes_files(patterns):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            # Skip files that are still being written
+            if seen.get(path) == signature or time.time() - stat.st_mtime < WATCH_SETTLE:
+                continue
+            seen[path] = signature
+
+            start = time.perf_counter()
+            try:
+                saved_path, mode = process_notes_incremental(path, output_path)
+            except (FileNotFoundError, ValueError, RuntimeError) as e:
+                print(f"{path}: {e}")
+                continue
+            if mode != "unchanged":
+                print(f"{path}: {mode} analysis in {time.perf_counter() - start:.1f}s -> {saved_path}")
+        time.sleep(interval)
+
+
+def watch_main(argv):
+    parser = argparse.ArgumentParser(description="Re-analyze notes files whenever they change.")
+    parser.add_argument("paths", nargs="*", default=[NOTES_FILE_PATH], help="Notes files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE_PATH, help="Where to save the .md results")
+    parser.add_argument("-i", "--interval", type=float, default=WATCH_INTERVAL, help="Seconds between checks")
+    args = parser.parse_args(argv)
+    try:
+        watch(args.paths, args.output, args.interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
 
 
 # ===============================================
@@ -350,16 +318,28 @@ def create_markdown(parsed_response):
 # ===============================================
 
 def main():
-    scribe = agent_scribe(AGENT_SCRIBE_CONFIG)
-    response = safe_agent_run(scribe,PROMPT)
-    response_content = response.content
-    parsed_response = parse_response_content(response_content)
-    file_name = parsed_response["Title"]
-    markdown_content = create_markdown(parsed_response)
-    save_content(OUTPUT_FILE_PATH,file_name,markdown_content)
+    try:
+        process_notes_file(NOTES_FILE_PATH, OUTPUT_FILE_PATH)
+    except (FileNotFoundError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+    print(f"Tool cache: {tool_cache_stats()}")
+    print(f"JSON repairs: {repair_stats()}")
+    print(f"Models: {json.dumps(model_router.stats(), indent=1)}")
+    print(f"Tool routes: {route_stats()}")
+
 
 if __name__ == "__main__":
-    main()
+    # python main.py                     -> process NOTES_FILE_PATH
+    # python main.py notes/ "more/*.txt" -> batch mode
+    # python main.py --watch [paths]     -> re-analyze files when they change
+    start_metrics_server()
+    if sys.argv[1:2] == ["--watch"]:
+        watch_main(sys.argv[2:])
+    elif len(sys.argv) > 1:
+        batch_main(sys.argv[1:])
+    else:
+        main()
 
 
 
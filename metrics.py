@@ -0,0 +1,298 @@
+
+"""
+Per-stage timing and counters for the Scribe pipeline.
+
+When a reply is slow we want to know where the time went: loading the
+notes, building the prompt, the model (per attempt), a tool call,
+parsing, formatting, saving or sending it to telegram.
+
+- span("stage", label=...) times a block. Every span is recorded in a
+  histogram (scribe_stage_seconds) and, if SCRIBE_METRICS_LOG is set,
+  written as one JSON line to that file for offline analysis.
+- timed("stage") does the same for a whole function (sync or async).
+- count() / observe() record counters (tokens, retries, cache hits)
+  and histograms.
+- trace() groups all spans of one request under the same trace id.
+- SCRIBE_METRICS_PORT starts a small HTTP server with the numbers in
+  Prometheus text format on /metrics.
+
+Nothing here talks to the network unless the port is set.
+"""
+
+
+import contextlib, contextvars, functools, inspect, json, os, threading, time, uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+METRICS_LOG = os.getenv("SCRIBE_METRICS_LOG", "")     # JSON lines file, empty = off
+METRICS_PORT = os.getenv("SCRIBE_METRICS_PORT", "")   # e.g. 9108, empty = off
+
+# Histogram buckets (seconds for stage durations)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+_trace_id = contextvars.ContextVar("scribe_trace_id", default=None)
+
+
+# ===============================================
+#                 Registry
+# ===============================================
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry:
+    """
+    Counters and histograms by (name, labels). Thread-safe.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1, **labels):
+        with self._lock:
+            self.counters[(name, _label_key(labels))] += value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def snapshot(self):
+        """
+        Plain dict of everything, e.g. for /stats or tests.
+        """
+        with self._lock:
+            return {
+                "counters": {_series(name, labels): value for (name, labels), value in self.counters.items()},
+                "histograms": {
+                    _series(name, labels): {"count": h.total, "sum": round(h.sum, 6)}
+                    for (name, labels), h in self.histograms.items()
+                },
+            }
+
+    def counter_values(self, name):
+        """
+        [(labels dict, value)] of one counter.
+        """
+        with self._lock:
+            return [(dict(labels), value) for (series_name, labels), value in self.counters.items() if series_name == name]
+
+    def histogram_totals(self, name):
+        """
+        [(labels dict, count, sum)] of one histogram.
+        """
+        with self._lock:
+            return [
+                (dict(labels), h.total, h.sum)
+                for (series_name, labels), h in self.histograms.items() if series_name == name
+            ]
+
+    def render_prometheus(self):
+        """
+        Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (series_name, labels), value in sorted(self.counters.items()):
+                    if series_name == name:
+                        lines.append(f"{_series(name, labels)} {value:g}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series_name, labels), h in sorted(self.histograms.items()):
+                    if series_name != name:
+                        continue
+                    for bound, bucket_count in zip(h.buckets, h.counts):
+                        lines.append(f"{_series(name + '_bucket', labels + (('le', f'{bound:g}'),))} {bucket_count}")
+                    lines.append(f"{_series(name + '_bucket', labels + (('le', '+Inf'),))} {h.total}")
+                    lines.append(f"{_series(name + '_sum', labels)} {h.sum:g}")
+                    lines.append(f"{_series(name + '_count', labels)} {h.total}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return f"{name}{{{inner}}}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def count(name, value=1, **labels):
+    registry.count(name, value, **labels)
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    registry.observe(name, value, buckets, **labels)
+
+
+# ===============================================
+#                 JSON lines
+# ===============================================
+
+_log_lock = threading.Lock()
+
+
+def write_event(event):
+    """
+    Append one event to SCRIBE_METRICS_LOG (if set).
+    """
+    if not METRICS_LOG:
+        return
+    line = json.dumps(event, default=str)
+    with _log_lock:
+        with open(METRICS_LOG, "a") as f:
+            f.write(line + "\n")
+
+
+# ===============================================
+#                 Spans
+# ===============================================
+
+@contextlib.contextmanager
+def trace(kind="request", **fields):
+    """
+    Everything recorded inside belongs to one request (same trace id).
+    The context is copied into asyncio.to_thread workers, so spans in
+    agent threads are part of the trace too.
+    """
+    token = _trace_id.set(uuid.uuid4().hex[:12])
+    try:
+        with span(kind, **fields) as extra:
+            yield extra
+    finally:
+        _trace_id.reset(token)
+
+
+@contextlib.contextmanager
+def span(stage, **fields):
+    """
+    Time a block of work. Extra fields are written to the JSON line;
+    the short ones (model, tool, cached, ...) become Prometheus labels.
+    Yields a dict: values put in it are written to the JSON line too.
+    """
+    extra = {}
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield extra
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        labels = {k: v for k, v in fields.items() if k in LABEL_FIELDS}
+        observe("scribe_stage_seconds", duration, stage=stage, **labels)
+        if status == "error":
+            count("scribe_stage_errors_total", stage=stage, **labels)
+        write_event({
+            "ts": time.time(),
+            "trace": _trace_id.get(),
+            "stage": stage,
+            "duration_ms": round(duration * 1000, 3),
+            "status": status,
+            **fields,
+            **extra,
+        })
+
+
+# Span fields that are also Prometheus labels (keep them low-cardinality)
+LABEL_FIELDS = {"model", "tool", "cached", "mode"}
+
+
+def timed(stage):
+    """
+    Decorator form of span() for a whole function, sync or async.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_run_tokens(response, model=None):
+    """
+    Token usage of one agent run (phi RunResponse.metrics).
+    """
+    run_metrics = getattr(response, "metrics", None) or {}
+    for direction in ("input_tokens", "output_tokens"):
+        total = sum(v for v in run_metrics.get(direction, []) if isinstance(v, (int, float)))
+        if total:
+            count("scribe_tokens_total", total, direction=direction.split("_")[0], model=model)
+            observe(f"scribe_run_{direction}", total, TOKEN_BUCKETS, model=model)
+    return run_metrics
+
+
+# ===============================================
+#                 HTTP endpoint
+# ===============================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """
+    Serve /metrics in a background thread. Does nothing if no port is
+    given and SCRIBE_METRICS_PORT is empty. Returns the server (or None).
+    """
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="scribe-metrics").start()
+    print(f"Metrics on http://{host}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,241 @@
+
+"""
+Latency-aware router over the configured Groq models.
+
+AGENT_SCRIBE_CONFIG["model"] lists several models. Instead of always
+using the same one, the router keeps rolling stats per model
+(latency, errors, 429 rate limits) and picks the best healthy model
+for every request.
+
+- Failover: when a run fails, the next attempt goes to another model
+  instead of retrying the same one.
+- Rate limits: a model that returned 429 is put on cooldown
+  (Retry-After is respected when the provider sends it).
+- Recovery: when a cooldown is over the model starts with a clean error
+  window and gets traffic again. A model that hasn't run for
+  `probe_after` seconds counts as fast again, so the next request probes
+  it and its stale numbers are replaced.
+- Hedging (optional): if the chosen model hasn't answered after
+  `hedge_after` seconds, a second model is started and the first
+  valid answer wins.
+"""
+
+
+import os, statistics, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from rate_limit import is_rate_limit, retry_after_seconds
+
+
+ROUTER_WINDOW = int(os.getenv("SCRIBE_ROUTER_WINDOW", "20"))         # last N runs per model
+ROUTER_COOLDOWN = float(os.getenv("SCRIBE_ROUTER_COOLDOWN", "30"))   # seconds after a 429/error burst
+ROUTER_MAX_ERROR_RATE = float(os.getenv("SCRIBE_ROUTER_MAX_ERROR_RATE", "0.5"))
+ROUTER_PROBE_AFTER = float(os.getenv("SCRIBE_ROUTER_PROBE_AFTER", "300"))  # seconds without a run
+# Seconds before a second model is started. Empty = hedging off.
+HEDGE_AFTER = float(os.getenv("SCRIBE_HEDGE_AFTER")) if os.getenv("SCRIBE_HEDGE_AFTER") else None
+
+
+# ===============================================
+#                 Model Router
+# ===============================================
+
+class ModelStats:
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)   # seconds, successful runs only
+        self.outcomes = deque(maxlen=window)    # True = success, False = error
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.cooldown_until = 0.0
+        self.last_run = 0.0
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def recover(self, now):
+        """
+        A cooldown that is over ends with a clean error window: the errors
+        that caused it would otherwise keep the model unhealthy (and unused)
+        for good. One more failure puts it back on cooldown.
+        """
+        if self.cooldown_until and self.cooldown_until <= now:
+            self.cooldown_until = 0.0
+            self.outcomes.clear()
+
+    def is_stale(self, now, max_age):
+        return self.requests > 0 and now - self.last_run > max_age
+
+    def p50(self):
+        return statistics.median(self.latencies) if self.latencies else None
+
+    def p95(self):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class ModelRouter:
+    """
+    Picks a model per request and records how each model behaves.
+
+        router = ModelRouter(["model-a", "model-b"])
+        model_id, result = router.run(lambda model_id: call(model_id))
+
+    A failed run's error has the models that failed in error.failed_models.
+    """
+
+    def __init__(
+        self,
+        models,
+        window=ROUTER_WINDOW,
+        cooldown=ROUTER_COOLDOWN,
+        max_error_rate=ROUTER_MAX_ERROR_RATE,
+        hedge_after=HEDGE_AFTER,
+        probe_after=ROUTER_PROBE_AFTER,
+    ):
+        self.models = list(models)   # in order of preference
+        self.cooldown = cooldown
+        self.max_error_rate = max_error_rate
+        self.hedge_after = hedge_after
+        self.probe_after = probe_after
+        self._stats = {model: ModelStats(window) for model in self.models}
+        self._lock = threading.Lock()
+
+    def is_healthy(self, model):
+        """
+        Caller holds the lock (a cooldown that is over is ended here).
+        """
+        stats = self._stats[model]
+        now = time.time()
+        stats.recover(now)
+        return stats.cooldown_until <= now and stats.error_rate() < self.max_error_rate
+
+    def latency(self, model):
+        """
+        Median latency used for ranking. A model without data, or whose
+        data is older than probe_after, counts as fast, so it gets tried.
+        """
+        stats = self._stats[model]
+        if stats.is_stale(time.time(), self.probe_after):
+            return 0.0
+        return stats.p50() or 0.0
+
+    def ranked(self, exclude=()):
+        """
+        Models from best to worst: healthy first, then by median latency.
+        """
+        with self._lock:
+            candidates = [m for m in self.models if m not in exclude] or list(self.models)
+            return sorted(
+                candidates,
+                key=lambda m: (not self.is_healthy(m), self.latency(m), self.models.index(m)),
+            )
+
+    def pick(self, exclude=()):
+        return self.ranked(exclude)[0]
+
+    def _record(self, model):
+        """
+        Stats of `model` for a finished run. Numbers from before a long
+        pause are dropped, this run replaces them. Caller holds the lock.
+        """
+        stats = self._stats[model]
+        now = time.time()
+        if stats.is_stale(now, self.probe_after):
+            stats.latencies.clear()
+            stats.outcomes.clear()
+        stats.requests += 1
+        stats.last_run = now
+        return stats
+
+    def record_success(self, model, latency):
+        with self._lock:
+            stats = self._record(model)
+            stats.latencies.append(latency)
+            stats.outcomes.append(True)
+
+    def record_error(self, model, error):
+        with self._lock:
+            stats = self._record(model)
+            stats.errors += 1
+            stats.outcomes.append(False)
+            if is_rate_limit(error):
+                stats.rate_limited += 1
+                wait_for = retry_after_seconds(error) or self.cooldown
+                stats.cooldown_until = max(stats.cooldown_until, time.time() + wait_for)
+            elif stats.error_rate() >= self.max_error_rate:
+                stats.cooldown_until = max(stats.cooldown_until, time.time() + self.cooldown)
+
+    def _timed_call(self, run_on_model, model):
+        start = time.perf_counter()
+        try:
+            result = run_on_model(model)
+        except Exception as e:
+            self.record_error(model, e)
+            raise
+        self.record_success(model, time.perf_counter() - start)
+        return result
+
+    def run(self, run_on_model, exclude=(), primary=None):
+        """
+        One attempt: run_on_model(model_id) on `primary` (default: the
+        best model not in exclude). With hedging on, a backup model is
+        started if the first one is slow; the first successful result wins.
+
+        Returns (model_id, result). Raises the error if every started
+        model failed, with the models that failed in error.failed_models.
+        """
+        ranked = self.ranked(exclude)
+        primary = primary or ranked[0]
+        others = [m for m in ranked if m != primary]
+        if self.hedge_after is None or not others:
+            try:
+                return primary, self._timed_call(run_on_model, primary)
+            except Exception as e:
+                e.failed_models = [primary]
+                raise
+
+        backup = others[0]
+        pool = ThreadPoolExecutor(max_workers=2)
+        futures = {pool.submit(self._timed_call, run_on_model, primary): primary}
+        try:
+            done, _ = wait(futures, timeout=self.hedge_after)
+            if not done:
+                print(f"{primary} is slow, hedging with {backup}")
+                futures[pool.submit(self._timed_call, run_on_model, backup)] = backup
+
+            pending = set(futures)
+            error, failed = None, []
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return futures[future], future.result()
+                    error = future.exception()
+                    failed.append(futures[future])
+            error.failed_models = failed
+            raise error
+        finally:
+            # Don't wait for the slower model, its result is just ignored
+            pool.shutdown(wait=False)
+
+    def stats(self):
+        """
+        Per-model numbers for monitoring.
+        """
+        with self._lock:
+            report = {}
+            for model, stats in self._stats.items():
+                report[model] = {
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "rate_limited": stats.rate_limited,
+                    "error_rate": round(stats.error_rate(), 3),
+                    "p50_latency": stats.p50(),
+                    "p95_latency": stats.p95(),
+                    "healthy": self.is_healthy(model),
+                }
+            return report
@@ -0,0 +1,194 @@
+
+"""
+Client-side rate limiting for Groq and the search tools.
+
+Bursts of bot traffic used to hit Groq and the search engines all at
+once, get 429s, and then every failed call retried on the same fixed
+schedule (and failed again together).
+
+Here every provider gets a token bucket:
+- requests per minute, and for Groq also tokens per minute,
+- a call that is over budget WAITS for its turn instead of failing,
+- a 429 blocks the provider until Retry-After (or a default pause),
+- retries use decorrelated jitter so they don't line up.
+
+acquire() is for threads (the CLI, and agent runs in worker threads),
+aacquire() is for async code (it sleeps without blocking the event loop).
+
+The Groq model that goes through the "groq" limiter is in limited_groq.py
+(kept apart so this module doesn't import phi).
+"""
+
+
+import asyncio, os, random, threading, time
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+# Budgets per provider. 0 = no limit.
+PROVIDER_LIMITS = {
+    "groq": {"rpm": _env_float("SCRIBE_GROQ_RPM", 30), "tpm": _env_float("SCRIBE_GROQ_TPM", 0)},
+    "google": {"rpm": _env_float("SCRIBE_GOOGLE_RPM", 10), "tpm": 0},
+    "duckduckgo": {"rpm": _env_float("SCRIBE_DUCKDUCKGO_RPM", 20), "tpm": 0},
+    "wikipedia": {"rpm": _env_float("SCRIBE_WIKIPEDIA_RPM", 60), "tpm": 0},
+    # Bot API: about 30 messages per second over all chats
+    "telegram": {"rpm": _env_float("SCRIBE_TELEGRAM_RPM", 1500), "tpm": 0},
+}
+DEFAULT_BLOCK = 20.0  # seconds to pause a provider after a 429 without Retry-After
+
+# Tool function -> provider
+TOOL_PROVIDERS = {
+    "google_search": "google",
+    "duckduckgo_search": "duckduckgo",
+    "duckduckgo_news": "duckduckgo",
+    "search_wikipedia": "wikipedia",
+}
+
+
+# ===============================================
+#                 Pure Utilities
+# ===============================================
+
+def is_rate_limit(error):
+    """
+    True if the error is a 429 / rate limit from the provider.
+    """
+    if getattr(error, "status_code", None) == 429:
+        return True
+    text = str(error).lower()
+    return "429" in text or "rate limit" in text or "ratelimit" in text or "rate_limit" in text
+
+
+def retry_after_seconds(error):
+    """
+    Read the Retry-After header from a provider error, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def decorrelated_jitter(previous, base=0.5, cap=30.0):
+    """
+    Next backoff delay ("decorrelated jitter"): random between base and
+    3x the previous delay, never above cap. Start with previous=base.
+    """
+    return min(cap, random.uniform(base, max(base, previous * 3)))
+
+
+def estimate_tokens(text: str):
+    """
+    Rough token count of a text (~4 chars per token for English). Good
+    enough for budgeting, no tokenizer needed. Used by chunking.py too.
+    """
+    return len(text or "") // 4 + 1
+
+
+def estimate_message_tokens(messages):
+    """
+    Rough token count of the messages sent to the model (~4 chars/token).
+    """
+    chars = 0
+    for message in messages:
+        content = message.get_content_string() if hasattr(message, "get_content_string") else str(message)
+        chars += len(content or "")
+    return chars // 4 + 1
+
+
+# ===============================================
+#                 Token Buckets
+# ===============================================
+
+class TokenBucket:
+    """
+    `rate_per_minute` units per minute, bursts up to one minute's worth.
+
+    reserve() takes the units right away (the balance may go negative)
+    and returns how long the caller must wait. Callers are therefore
+    served in the order they asked, like a queue.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+
+    def reserve(self, amount, now):
+        if self.capacity <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+
+class ProviderLimiter:
+    """
+    Requests/minute + tokens/minute budget for one provider,
+    plus a "blocked until" time set after a 429.
+    """
+
+    def __init__(self, name, rpm=0, tpm=0):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.requests.reserve(1, now), self.tokens.reserve(tokens, now))
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self, tokens=0):
+        """
+        Block the current thread until the call is allowed.
+        Returns the seconds waited.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens=0):
+        """
+        Same as acquire() for async code.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def block(self, seconds=None):
+        """
+        Provider said 429: nobody calls it again before `seconds` pass.
+        """
+        with self._lock:
+            until = time.monotonic() + (seconds if seconds is not None else DEFAULT_BLOCK)
+            self.blocked_until = max(self.blocked_until, until)
+
+    def report_error(self, error):
+        if is_rate_limit(error):
+            self.block(retry_after_seconds(error))
+
+
+# One shared limiter per provider for the whole process
+limiters = {name: ProviderLimiter(name, **limits) for name, limits in PROVIDER_LIMITS.items()}
+
+
+def limiter_for(provider):
+    if provider not in limiters:
+        limiters[provider] = ProviderLimiter(provider)
+    return limiters[provider]
+
+
+def limiter_for_tool(tool_name):
+    return limiter_for(TOOL_PROVIDERS.get(tool_name, tool_name))
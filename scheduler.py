@@ -0,0 +1,183 @@
+
+"""
+Fair per-chat job queue for the bot.
+
+Without it every message went straight to the agent: one user pasting
+twenty long notes could take every agent slot, and nothing limited how
+much work was waiting.
+
+ChatScheduler sits between the telegram handler and the agent:
+- at most `max_in_flight` jobs run at once, the rest wait in a queue,
+- every chat has its own bounded queue (`per_chat`), and the total
+  number of waiting jobs is bounded too (`max_queued`). A job that
+  doesn't fit is rejected right away (QueueFull),
+- chats take turns: the chat served least recently goes next, and
+  chats that have nothing running are served first, so a chat with a
+  long backlog can't block new users,
+- cancel(chat_id) drops the chat's waiting jobs and stops its running ones.
+"""
+
+
+import asyncio, itertools, os
+from collections import deque
+
+
+MAX_IN_FLIGHT = int(os.getenv("SCRIBE_MAX_IN_FLIGHT", os.getenv("SCRIBE_MAX_CONCURRENT_RUNS", "4")))
+CHAT_QUEUE_SIZE = int(os.getenv("SCRIBE_CHAT_QUEUE_SIZE", "5"))     # waiting jobs per chat
+MAX_QUEUED = int(os.getenv("SCRIBE_MAX_QUEUED", "100"))             # waiting jobs in total
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, chat_id, make_coroutine):
+        self.id = job_id
+        self.chat_id = chat_id
+        self.make_coroutine = make_coroutine
+        self.task = None
+        self.cancelled = False
+        self.done = asyncio.get_running_loop().create_future()
+
+    async def wait(self):
+        """
+        Result of the job. Raises asyncio.CancelledError if it was cancelled.
+        """
+        return await self.done
+
+
+class ChatScheduler:
+    """
+        scheduler = ChatScheduler()
+        job = scheduler.submit(chat_id, lambda: handle(update))   # may raise QueueFull
+        position = scheduler.position(job)                        # 0 = running
+        await job.wait()
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, per_chat=CHAT_QUEUE_SIZE, max_queued=MAX_QUEUED):
+        self.max_in_flight = max_in_flight
+        self.per_chat = per_chat
+        self.max_queued = max_queued
+        self._queues = {}              # chat_id -> deque of waiting jobs
+        self._running = {}             # chat_id -> set of running jobs
+        self._served = {}              # chat_id -> tick of its last started job
+        self._ids = itertools.count(1)
+        self._ticks = itertools.count(1)
+
+    # ---------- state ----------
+
+    def queued(self, chat_id=None):
+        if chat_id is not None:
+            return len(self._queues.get(chat_id, ()))
+        return sum(len(q) for q in self._queues.values())
+
+    def running(self, chat_id=None):
+        if chat_id is not None:
+            return len(self._running.get(chat_id, ()))
+        return sum(len(jobs) for jobs in self._running.values())
+
+    def stats(self):
+        return {"running": self.running(), "queued": self.queued(), "chats_waiting": len(self._queues)}
+
+    # ---------- submit / cancel ----------
+
+    def submit(self, chat_id, make_coroutine):
+        """
+        Queue a job for this chat. make_coroutine() is called when the
+        job's turn comes. Raises QueueFull if the chat's queue or the
+        global queue has no room.
+        """
+        if self.queued(chat_id) >= self.per_chat:
+            raise QueueFull(f"chat {chat_id} already has {self.per_chat} notes waiting")
+        if self.queued() >= self.max_queued:
+            raise QueueFull("too many notes waiting")
+
+        job = Job(next(self._ids), chat_id, make_coroutine)
+        self._queues.setdefault(chat_id, deque()).append(job)
+        self._dispatch()
+        return job
+
+    def cancel(self, chat_id):
+        """
+        Drop every waiting job of the chat and stop its running jobs.
+        Returns how many jobs were cancelled.
+        """
+        cancelled = 0
+        for job in self._queues.pop(chat_id, ()):
+            job.cancelled = True
+            job.done.cancel()
+            cancelled += 1
+        for job in list(self._running.get(chat_id, ())):
+            job.cancelled = True
+            job.task.cancel()
+            cancelled += 1
+        return cancelled
+
+    # ---------- scheduling ----------
+
+    @staticmethod
+    def _turn_order(chat_ids, busy, served):
+        """
+        Chats with nothing running first, then least recently served.
+        """
+        return min(chat_ids, key=lambda chat_id: (chat_id in busy, served.get(chat_id, 0)), default=None)
+
+    def _dispatch(self):
+        while self.running() < self.max_in_flight:
+            busy = {chat_id for chat_id, jobs in self._running.items() if jobs}
+            chat_id = self._turn_order(self._queues, busy, self._served)
+            if chat_id is None:
+                return
+            waiting = self._queues[chat_id]
+            job = waiting.popleft()
+            if not waiting:
+                del self._queues[chat_id]
+            self._start(job)
+
+    def _start(self, job):
+        self._served[job.chat_id] = next(self._ticks)
+        self._running.setdefault(job.chat_id, set()).add(job)
+        job.task = asyncio.ensure_future(job.make_coroutine())
+        job.task.add_done_callback(lambda task: self._finished(job, task))
+
+    def _finished(self, job, task):
+        jobs = self._running.get(job.chat_id)
+        if jobs is not None:
+            jobs.discard(job)
+            if not jobs:
+                del self._running[job.chat_id]
+        if job.chat_id not in self._running and job.chat_id not in self._queues:
+            self._served.pop(job.chat_id, None)
+        if not job.done.done():
+            if task.cancelled():
+                job.done.cancel()
+            elif task.exception() is not None:
+                job.done.set_exception(task.exception())
+            else:
+                job.done.set_result(task.result())
+        self._dispatch()
+
+    def position(self, job):
+        """
+        Place of a waiting job in line (1 = next), 0 if it is running,
+        None if it is finished or cancelled. Simulates the turn order.
+        """
+        if job.task is not None or job.done.done():
+            return 0 if job.task is not None and not job.task.done() else None
+        queues = {chat_id: deque(q) for chat_id, q in self._queues.items()}
+        busy = {chat_id for chat_id, jobs in self._running.items() if jobs}
+        served = dict(self._served)
+        ticks = itertools.count(next(self._ticks))
+        place = 0
+        while queues:
+            chat_id = self._turn_order(queues, busy, served)
+            waiting = queues[chat_id]
+            place += 1
+            if waiting.popleft() is job:
+                return place
+            if not waiting:
+                del queues[chat_id]
+            busy.add(chat_id)
+            served[chat_id] = next(ticks)
+        return None
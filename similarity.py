@@ -0,0 +1,237 @@
+
+"""
+Near-duplicate cache: reuse the analysis of notes that are almost the same.
+
+The response cache (cache.py) only helps when the notes are identical
+after normalization. Notes that come back with a typo fixed, a sentence
+added or a paragraph moved miss it and cost a full agent run again.
+Every analyzed note is also indexed here by content:
+
+1. Signature: the notes are normalized and cut into overlapping
+   5-character shingles; a MinHash signature (NUM_PERM minimums) is an
+   estimate of the Jaccard similarity between two shingle sets.
+2. LSH: the signature is split into BANDS bands. Notes that share at
+   least one band are candidates, so a lookup reads a handful of rows
+   instead of comparing against every stored note.
+3. Check: the best candidates are compared exactly (shingle Jaccard on
+   the stored notes) and the most similar one is returned.
+
+Above SIMILAR_REUSE the cached result is returned as is. Above
+SIMILAR_DELTA it is the "previous version" of an incremental run
+(incremental.py): only the added blocks go to the agent.
+
+Everything is pure Python + SQLite (same file as the response cache), so
+the index survives restarts and is shared between the CLI and the bot.
+Entries expire after CACHE_TTL and the least recently used ones are
+dropped above SIMILAR_MAX_ENTRIES.
+"""
+
+
+import json, os, random, time, zlib
+from array import array
+from cache import CACHE_PATH, CACHE_TTL, SQLiteStore, normalize_notes
+
+
+SIMILAR_CACHE = os.getenv("SCRIBE_SIMILAR_CACHE", "1") == "1"
+SIMILAR_REUSE = float(os.getenv("SCRIBE_SIMILAR_REUSE", "0.95"))     # return the cached result
+SIMILAR_DELTA = float(os.getenv("SCRIBE_SIMILAR_DELTA", "0.6"))      # delta run on the cached result
+SIMILAR_MAX_ENTRIES = int(os.getenv("SCRIBE_SIMILAR_MAX_ENTRIES", "10000"))
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+MAX_CANDIDATES = 5   # candidates compared exactly per lookup
+
+# Fixed seed: signatures must be the same in every process and after restarts
+_MASKS = random.Random(20240501).sample(range(1, 2**32), NUM_PERM)
+
+
+# ===============================================
+#                 Pure Utilities
+# ===============================================
+
+def shingles(text: str):
+    """
+    Set of hashed SHINGLE_SIZE-character shingles of the normalized notes
+    (crc32, stable across processes unlike hash()).
+    """
+    text = normalize_notes(text).casefold()
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + SHINGLE_SIZE].encode("utf-8")) for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(hashes):
+    """
+    MinHash signature: for every mask the smallest shingle hash XOR mask.
+    """
+    return [min(map(mask.__xor__, hashes)) for mask in _MASKS]
+
+
+def band_keys(signature):
+    """
+    One integer per band (band number in the high bits, so equal rows in
+    different bands don't collide).
+    """
+    return [
+        (band << 32) | zlib.crc32(array("I", signature[band * ROWS:(band + 1) * ROWS]).tobytes())
+        for band in range(BANDS)
+    ]
+
+
+def estimate_similarity(a, b):
+    """
+    Share of equal signature positions ~ Jaccard similarity.
+    """
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def jaccard(a: set, b: set):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+# ===============================================
+#                 SQLite Index
+# ===============================================
+
+class SimilarityIndex(SQLiteStore):
+    """
+    MinHash/LSH index of analyzed notes and their results, with TTL and
+    LRU eviction (like SQLiteCache).
+
+    Two tables: the entries (signature, notes, result) and the LSH bands
+    (band key -> entry id), so lookups stay fast at 100k entries
+    without keeping anything in memory.
+    """
+
+    def __init__(self, path=CACHE_PATH, table="similar", ttl=CACHE_TTL, max_entries=SIMILAR_MAX_ENTRIES):
+        super().__init__(path)
+        self.table = table
+        self.bands = f"{table}_bands"
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def _create_tables(self, conn):
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                scope TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                notes TEXT NOT NULL,
+                result TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_last_used ON {self.table} (last_used)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires_at ON {self.table} (expires_at)")
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {self.bands} (
+                band INTEGER NOT NULL,
+                id INTEGER NOT NULL,
+                PRIMARY KEY (band, id)
+            ) WITHOUT ROWID"""
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.bands}_id ON {self.bands} (id)")
+
+    def add(self, key, notes, result, scope=""):
+        """
+        Index analyzed notes and their result (replaces an entry with the same key).
+        """
+        self.add_many([(key, notes, result)], scope)
+
+    def add_many(self, entries, scope=""):
+        """
+        Index several (key, notes, result) entries in one transaction.
+        An entry may carry a precomputed signature as a 4th item.
+        """
+        prepared = []
+        for entry in entries:
+            key, notes, result = entry[:3]
+            signature = entry[3] if len(entry) > 3 else minhash(shingles(notes))
+            prepared.append((key, array("I", signature).tobytes(), notes, json.dumps(result), band_keys(signature)))
+
+        now = time.time()
+        with self._lock, self._conn:
+            for key, blob, notes, result, bands in prepared:
+                self._conn.execute(
+                    f"DELETE FROM {self.bands} WHERE id IN (SELECT id FROM {self.table} WHERE key = ?)", (key,)
+                )
+                entry_id = self._conn.execute(
+                    f"""INSERT OR REPLACE INTO {self.table}
+                        (key, scope, signature, notes, result, expires_at, last_used)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (key, scope, blob, notes, result, now + self.ttl, now),
+                ).lastrowid
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO {self.bands} (band, id) VALUES (?, ?)", [(band, entry_id) for band in bands]
+                )
+            self._evict(now)
+
+    def lookup(self, notes, scope="", threshold=SIMILAR_DELTA):
+        """
+        Most similar indexed notes (same scope, not expired) with a
+        similarity of at least threshold:
+        {"key", "similarity", "notes", "result"} or None.
+        """
+        hashes = shingles(notes)
+        signature = minhash(hashes)
+        bands = band_keys(signature)
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT key, signature FROM {self.table} WHERE id IN (
+                        SELECT id FROM {self.bands} WHERE band IN ({",".join("?" * len(bands))})
+                    ) AND scope = ? AND expires_at >= ?""",
+                (*bands, scope, now),
+            ).fetchall()
+
+        # Cheap estimate first, exact Jaccard only for the best few
+        candidates = []
+        for key, blob in rows:
+            estimate = estimate_similarity(signature, array("I", blob))
+            candidates.append((estimate, key))
+        candidates.sort(reverse=True)
+
+        best = None
+        for _, key in candidates[:MAX_CANDIDATES]:
+            with self._lock:
+                row = self._conn.execute(f"SELECT notes, result FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                continue
+            similarity = jaccard(hashes, shingles(row[0]))
+            if similarity >= threshold and (best is None or similarity > best["similarity"]):
+                best = {"key": key, "similarity": similarity, "notes": row[0], "result": json.loads(row[1])}
+
+        if best is not None:
+            with self._lock, self._conn:
+                self._conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, best["key"]))
+        return best
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.execute(f"DELETE FROM {self.bands}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _evict(self, now):
+        """
+        Drop expired entries, then the least recently used ones
+        if we are still above max_entries. Caller holds the lock.
+        """
+        expired = f"SELECT id FROM {self.table} WHERE expires_at < ?"
+        self._conn.execute(f"DELETE FROM {self.bands} WHERE id IN ({expired})", (now,))
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        extra = count - self.max_entries
+        if extra > 0:
+            oldest = f"SELECT id FROM {self.table} ORDER BY last_used ASC LIMIT ?"
+            self._conn.execute(f"DELETE FROM {self.bands} WHERE id IN ({oldest})", (extra,))
+            self._conn.execute(f"DELETE FROM {self.table} WHERE id IN ({oldest})", (extra,))
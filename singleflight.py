@@ -0,0 +1,54 @@
+
+"""
+Single-flight: identical requests in flight share one run.
+
+When the same notes arrive twice at the same moment (a message forwarded
+into several chats, a double-send, the same file twice in a batch), only
+the first request runs the agent. The others wait for that run and get
+the same result, or the same error.
+
+The key is the normalized-notes cache key (cache.make_cache_key), so
+requests that would hit the same cache entry are coalesced. Callers are
+threads: the local agent's batch workers and the bot's worker threads
+(both run core.analyze_notes).
+"""
+
+
+import threading
+from concurrent.futures import Future
+from metrics import count
+
+
+class SingleFlight:
+    """
+        flights = SingleFlight()
+        result = flights.do(key, lambda: expensive(notes))
+    """
+
+    def __init__(self):
+        self._calls = {}    # key -> Future of the running call
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            count("scribe_coalesced_total", mode="thread")
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,113 @@
+
+"""
+Incremental JSON parser for streamed agent output.
+
+When the model streams its answer we receive the JSON object piece by
+piece. Instead of waiting for the whole object, this parser watches the
+top-level keys and reports each section ("Ideas", "Assumptions", ...)
+as soon as its value is complete, so it can be shown to the user early.
+
+Text before the first '{' (markdown fences, prose) is ignored.
+"""
+
+
+import json
+
+
+class IncrementalSectionParser:
+    """
+    Feed text chunks, get back completed top-level (key, value) pairs.
+
+        parser = IncrementalSectionParser()
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self.sections = {}      # every completed section so far
+        self.done = False       # True once the closing '}' was seen
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._token = []        # chars of the current key or value
+        self._key = None        # key whose value we are reading
+        self._expect = "key"    # "key" -> ":" -> "value"
+
+    def feed(self, text: str):
+        completed = []
+        for char in text:
+            if self.done:
+                break
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            pair = self._consume(char)
+            if pair is not None:
+                completed.append(pair)
+        return completed
+
+    def _consume(self, char):
+        # Inside a string: only watch for its end.
+        if self._in_string:
+            self._token.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+            return None
+
+        if char == '"':
+            self._in_string = True
+            self._token.append(char)
+            return None
+
+        # Characters that belong to a nested value
+        if self._depth > 1:
+            self._token.append(char)
+            if char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+            return None
+
+        # Top level of the object (depth == 1)
+        if char in "{[":
+            self._depth += 1
+            self._token.append(char)
+            return None
+        if char == ":" and self._expect == "key":
+            self._key = self._parse_token()
+            self._expect = "value"
+            return None
+        if char in ",}":
+            pair = None
+            if self._expect == "value" and self._key is not None:
+                value = self._parse_token()
+                if value is not None or "".join(self._token).strip() == "null":
+                    self.sections[self._key] = value
+                    pair = (self._key, value)
+            self._key = None
+            self._expect = "key"
+            if char == "}":
+                self._depth = 0
+                self.done = True
+            return pair
+
+        self._token.append(char)
+        return None
+
+    def _parse_token(self):
+        raw = "".join(self._token).strip()
+        self._token = []
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return None
@@ -0,0 +1,232 @@
+
+"""
+Telegram replies of any length.
+
+A Telegram message holds at most 4096 characters. An analysis with long
+answers and many resources went out as one message, failed, and the
+user got "Something went wrong" after the whole agent run. Instead:
+
+1. Render: the result is written as MarkdownV2 with every special
+   character escaped (Telegram can't reject the formatting), together
+   with a plain-text copy of every line.
+2. Split: whole sections are packed into chunks under CHUNK_CHARS. A
+   section that doesn't fit goes on in the next chunk (heading repeated,
+   split between items); a single item longer than a chunk is cut.
+3. Send: chunks go out in order, the first one replaces the "processing"
+   message, with SEND_INTERVAL between messages of one chat and a global
+   budget shared by all chats (rate_limit.py, "telegram"). Flood limits
+   (RetryAfter) pause the budget and the chunk is sent again.
+4. Fallbacks: a chunk Telegram still refuses is sent as plain text. A
+   result longer than MAX_CHUNKS messages, or one that can't be sent in
+   chunks, is uploaded as a .md document with the summary in the chat.
+"""
+
+
+import asyncio, datetime, io, os, re
+from telegram.error import BadRequest, RetryAfter
+from rate_limit import limiter_for
+from metrics import span, count
+
+
+TELEGRAM_LIMIT = 4096
+CHUNK_CHARS = min(int(os.getenv("SCRIBE_TELEGRAM_CHUNK_CHARS", "4000")), TELEGRAM_LIMIT)
+MAX_CHUNKS = int(os.getenv("SCRIBE_TELEGRAM_MAX_CHUNKS", "4"))                 # more = send a .md document
+SEND_INTERVAL = float(os.getenv("SCRIBE_TELEGRAM_SEND_INTERVAL", "1.0"))      # seconds between messages of one reply
+SEND_RETRIES = 3
+HEADING_ROOM = 64   # a "(continued)" heading + newline always fits next to a cut item
+
+# Result keys and their headings, in reply order
+SECTIONS = [
+    ("Ideas", "Ideas"),
+    ("Assumptions", "Assumptions"),
+    ("Assumption Checks", "Checked Assumptions"),
+    ("Questions", "Questions Found"),
+    ("Verified Answers", "Questions Answered"),
+    ("Resources", "Resources"),
+    ("Recommendations", "Recommendations"),
+    ("Summary", "Summary"),
+]
+
+DOCUMENT_NOTE = "The full analysis is too long for a message, it is attached as a file."
+
+_SPECIAL = re.compile(r"([_*\[\]()~`>#+\-=|{}.!\\])")
+
+
+# ===============================================
+#                 Rendering
+# ===============================================
+# A line is a (markdown, plain) pair: the MarkdownV2 text and the same
+# text without formatting (used when Telegram refuses the markdown).
+
+def escape_markdown_v2(text):
+    return _SPECIAL.sub(r"\\\1", str(text))
+
+
+def heading(label, continued=False):
+    label = f"{label} (continued)" if continued else label
+    return f"*{escape_markdown_v2(label)}*", label
+
+
+def item_line(item):
+    return f"\\- {escape_markdown_v2(item)}", f"- {item}"
+
+
+def render_sections(parsed_response, keys=None):
+    """
+    Result -> [(label, [lines])]: the title block first, then one entry
+    per section (keys: only these result keys).
+    """
+    title = parsed_response.get("Title", "Brainstorm")
+    created = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    sections = [(None, [
+        (f"*{escape_markdown_v2(title)}*", title),
+        (f"_{escape_markdown_v2(created)}_", created),
+    ])]
+    for key, label in SECTIONS:
+        if keys is not None and key not in keys:
+            continue
+        items = parsed_response.get(key) or []
+        if isinstance(items, str):
+            items = [items]
+        sections.append((label, [item_line(item) for item in items]))
+    return sections
+
+
+def cut_line(line, limit):
+    """
+    Cut an item longer than a chunk. The plain text is cut and escaped
+    again, so no escape sequence is broken (escaping at most doubles it).
+    """
+    plain = line[1]
+    step = max(1, (limit - HEADING_ROOM) // 2)
+    return [(escape_markdown_v2(plain[i:i + step]), plain[i:i + step]) for i in range(0, len(plain), step)]
+
+
+def split_reply(sections, limit=CHUNK_CHARS):
+    """
+    Sections -> [(markdown, plain)] chunks, every markdown one at most
+    `limit` characters. Chunks end at section boundaries when possible.
+    """
+    chunks, markdown, plain = [], [], []
+    size = 0
+
+    def flush():
+        nonlocal markdown, plain, size
+        if markdown:
+            chunks.append(("\n".join(markdown).strip(), "\n".join(plain).strip()))
+        markdown, plain, size = [], [], 0
+
+    def add(line):
+        nonlocal size
+        markdown.append(line[0])
+        plain.append(line[1])
+        size += len(line[0]) + 1
+
+    for label, lines in sections:
+        block = ([heading(label)] if label else []) + lines + [("", "")]
+        block_size = sum(len(line[0]) + 1 for line in block)
+        if size + block_size <= limit:
+            for line in block:
+                add(line)
+            continue
+        # Doesn't fit: start it in a new chunk, and split it if needed
+        if size and block_size <= limit:
+            flush()
+            for line in block:
+                add(line)
+            continue
+        for i, line in enumerate(block):
+            for part in (cut_line(line, limit) if len(line[0]) + 1 > limit - HEADING_ROOM else [line]):
+                if size + len(part[0]) + 1 > limit:
+                    flush()
+                    if label and i > 0:
+                        add(heading(label, continued=True))
+                add(part)
+    flush()
+    return chunks
+
+
+def document_name(parsed_response):
+    title = re.sub(r"[^\w\- ]", "", str(parsed_response.get("Title", ""))).strip()
+    return (title.replace(" ", "_") or "Scribe") + ".md"
+
+
+# ===============================================
+#                 Sending
+# ===============================================
+
+def retry_after(error):
+    seconds = error.retry_after
+    return seconds.total_seconds() if isinstance(seconds, datetime.timedelta) else float(seconds)
+
+
+async def send_chunk(send, chunk):
+    """
+    send(text, parse_mode=None) is reply_text or edit_text. MarkdownV2
+    first, plain text if Telegram refuses it. Flood limits are waited out.
+    """
+    markdown, plain = chunk
+    limiter = limiter_for("telegram")
+    for attempt in range(SEND_RETRIES):
+        await limiter.aacquire()
+        try:
+            try:
+                return await send(markdown, parse_mode="MarkdownV2")
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    return None
+                print(f"Telegram refused the markdown, sending plain text: {e}")
+                count("scribe_reply_fallbacks_total", kind="plain_text")
+                return await send(plain)
+        except RetryAfter as e:
+            if attempt == SEND_RETRIES - 1:
+                raise
+            limiter.block(retry_after(e))
+            count("scribe_reply_fallbacks_total", kind="retry_after")
+
+
+async def send_chunks(message, chunks):
+    """
+    First chunk replaces `message` (the "processing" message), the
+    others are replies to it, in order.
+    """
+    for i, chunk in enumerate(chunks):
+        if i:
+            await asyncio.sleep(SEND_INTERVAL)
+        with span("reply_text", chars=len(chunk[0]), chunk=i + 1, chunks=len(chunks)):
+            await send_chunk(message.edit_text if i == 0 else message.reply_text, chunk)
+
+
+async def send_document(message, parsed_response, document_text):
+    """
+    Summary in the chat + the whole result as a .md file.
+    """
+    sections = render_sections(parsed_response, keys=["Summary"])
+    sections.append((None, [(escape_markdown_v2(DOCUMENT_NOTE), DOCUMENT_NOTE)]))
+    chunks = split_reply(sections)
+    await send_chunks(message, chunks[:1])
+    await asyncio.sleep(SEND_INTERVAL)
+    await limiter_for("telegram").aacquire()
+    with span("reply_document", chars=len(document_text)):
+        await message.reply_document(
+            document=io.BytesIO(document_text.encode("utf-8")), filename=document_name(parsed_response)
+        )
+
+
+async def deliver(message, parsed_response, document_text):
+    """
+    Send a finished analysis, replacing `message`. document_text is the
+    whole result as a markdown file (used for very long results or when
+    sending chunks fails). Returns "chunks" or "document".
+    """
+    chunks = split_reply(render_sections(parsed_response))
+    if len(chunks) <= MAX_CHUNKS:
+        try:
+            await send_chunks(message, chunks)
+            count("scribe_replies_total", kind="chunks")
+            return "chunks"
+        except Exception as e:
+            print(f"Sending the reply in {len(chunks)} messages failed, sending a file instead: {e}")
+    await send_document(message, parsed_response, document_text)
+    count("scribe_replies_total", kind="document")
+    return "document"
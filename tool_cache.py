@@ -0,0 +1,152 @@
+
+"""
+Cache layer for the search tools (Google, DuckDuckGo, Wikipedia).
+
+The agent often searches the same things again and again (salaries,
+visa rules, ...). Every search costs time and eats search rate limits,
+so results are cached per tool + normalized query.
+
+- Each tool has its own TTL (news gets stale faster than Wikipedia).
+- Wikipedia "PageError" is cached too (negative caching), so the agent
+  doesn't hit the network again for a page that doesn't exist.
+- Hits and misses are counted per tool.
+
+The store is the same SQLite file as the response cache, so the local
+agent and the bot share it. Cache misses go through the provider's
+rate limiter (rate_limit.py).
+"""
+
+
+import functools, json, threading
+from collections import Counter
+from cache import SQLiteCache, CACHE_PATH
+from rate_limit import limiter_for_tool
+from metrics import span, count
+
+
+# Time to live (seconds) per tool function
+TOOL_TTLS = {
+    "google_search": 6 * 60 * 60,
+    "duckduckgo_search": 6 * 60 * 60,
+    "duckduckgo_news": 30 * 60,
+    "search_wikipedia": 7 * 24 * 60 * 60,
+}
+DEFAULT_TOOL_TTL = 60 * 60
+NEGATIVE_TTL = 60 * 60
+
+
+tool_store = SQLiteCache(path=CACHE_PATH, table="tool_results", ttl=DEFAULT_TOOL_TTL, max_entries=5000)
+
+_stats_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+# ===============================================
+#                 Pure Utilities
+# ===============================================
+
+def normalize_query(query: str):
+    """
+    "  Python   Salary " and "python salary" are the same search.
+    """
+    return " ".join(str(query).lower().split())
+
+
+def make_tool_key(tool_name: str, arguments: dict):
+    """
+    Key = tool name + normalized query + the other arguments (sorted).
+    """
+    args = dict(arguments)
+    query = normalize_query(args.pop("query", ""))
+    extra = json.dumps(args, sort_keys=True, default=str)
+    return f"{tool_name}|{query}|{extra}"
+
+
+def tool_cache_stats():
+    """
+    Hit/miss counters per tool, e.g. {"google_search": {"hits": 3, "misses": 1}}
+    """
+    with _stats_lock:
+        names = set(_hits) | set(_misses)
+        return {name: {"hits": _hits[name], "misses": _misses[name]} for name in sorted(names)}
+
+
+# ===============================================
+#                 Tool Wrapper
+# ===============================================
+
+def _is_page_error(error):
+    """
+    Wikipedia "page doesn't exist". The wikipedia package is only
+    imported here, when a tool call already failed.
+    """
+    try:
+        from wikipedia.exceptions import PageError
+    except ImportError:
+        return False
+    return isinstance(error, PageError)
+
+
+def _count(counter, name):
+    with _stats_lock:
+        counter[name] += 1
+
+
+def _cached_entrypoint(tool_name, entrypoint, store, ttl):
+    """
+    Wrap one tool function. functools.wraps keeps the name, signature and
+    docstring, so phi builds the same tool schema for the model.
+    """
+
+    @functools.wraps(entrypoint)
+    def wrapper(*args, **kwargs):
+        key = make_tool_key(tool_name, kwargs) if not args else None
+        if key is not None:
+            cached = store.get(key)
+            if cached is not None:
+                _count(_hits, tool_name)
+                count("scribe_cache_lookups_total", cache="tool", result="hit", tool=tool_name)
+                with span("tool_call", tool=tool_name, cached=True):
+                    if "error" in cached:
+                        raise RuntimeError(cached["error"])
+                    return cached["result"]
+        _count(_misses, tool_name)
+        count("scribe_cache_lookups_total", cache="tool", result="miss", tool=tool_name)
+
+        with span("tool_call", tool=tool_name, cached=False) as call:
+            # Only real searches count against the provider's rate limit
+            limiter = limiter_for_tool(tool_name)
+            call["rate_limit_wait"] = round(limiter.acquire(), 3)
+            try:
+                result = entrypoint(*args, **kwargs)
+            except Exception as e:
+                limiter.report_error(e)
+                if key is not None and _is_page_error(e):
+                    store.set(key, {"error": f"Wikipedia PageError: {e}"}, ttl=NEGATIVE_TTL)
+                raise
+
+        if key is not None and isinstance(result, str):
+            store.set(key, {"result": result}, ttl=ttl)
+        return result
+
+    return wrapper
+
+
+def cached_tool(toolkit, store=None, ttls=None):
+    """
+    Make every function of a phi Toolkit go through the cache.
+    Returns the same toolkit so it can be used inline:
+
+        "tools": [cached_tool(GoogleSearch()), ...]
+    """
+    # Local tools (offline Wikipedia index) answer faster than the cache
+    if getattr(toolkit, "local", False):
+        return toolkit
+    store = store or tool_store
+    ttls = ttls or TOOL_TTLS
+    for name, function in toolkit.functions.items():
+        function.entrypoint = _cached_entrypoint(
+            name, function.entrypoint, store, ttls.get(name, DEFAULT_TOOL_TTL)
+        )
+    return toolkit
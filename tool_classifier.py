@@ -0,0 +1,151 @@
+
+"""
+Decide before the run whether the notes need the search tools.
+
+Every normal run goes to the agent with all three tools: their schemas
+are sent with every request (tokens) and the model sometimes searches
+for things it already knows. Many notes (plans, personal reflections,
+idea lists) need no external source at all. Before the run:
+
+1. Heuristics (local, instant): links, prices, salaries, laws, dates,
+   "latest"... mean tools; notes without any factual cue or claim mean
+   no tools. Everything else is uncertain.
+2. Cheap model (optional): uncertain notes are classified by a small
+   fast model (SCRIBE_CLASSIFIER_MODEL) that answers TOOLS or NO_TOOLS.
+3. Uncertain and no model: tools (the safe choice).
+
+Notes that need no tools go to the lean agent (no tool definitions,
+shorter prompt, see core.py). The decisions and the run time of each
+route are metrics (scribe_tool_routes_total, scribe_route_run_seconds),
+route_stats() sums them up so the two routes can be compared.
+
+SCRIBE_TOOL_ROUTER: "off" (always tools), "heuristic" (default) or
+"model" (heuristics + cheap model for uncertain notes).
+"""
+
+
+import contextlib, os, re, time
+from metrics import span, count, observe, registry
+
+
+TOOL_ROUTER = os.getenv("SCRIBE_TOOL_ROUTER", "heuristic")
+CLASSIFIER_MODEL = os.getenv("SCRIBE_CLASSIFIER_MODEL", "llama-3.1-8b-instant")
+CLASSIFIER_MAX_CHARS = 4000   # notes sent to the classifier model
+
+TOOLS, LEAN = "tools", "lean"
+
+# Cues that an external, up-to-date source is needed
+FACT_CUES = re.compile(
+    r"https?://|www\.|\d+\s*(%|\$|€|£|k\b|usd|eur|dollars?|euros?|percent)|[$€£]\s*\d|\b(19|20)\d{2}\b|"
+    r"\b(salary|salaries|income|price|prices|cost|costs|pay|paid|rates?|market|statistics?|stats|"
+    r"law|laws|legal|visa|regulations?|requirements?|tax|taxes|license|certifications?|"
+    r"latest|current|currently|today|recent|news|trend|trends|version|release|"
+    r"how much|how many|is it true|official)\b",
+    re.IGNORECASE,
+)
+# Claims and questions the model may have to check
+CLAIM_CUES = re.compile(
+    r"\?|\b(better|best|faster|slower|cheaper|worse|worst|more than|less than|always|never|"
+    r"everyone|nobody|most|all of|because|i think|i believe|i guess|probably|assume|assuming)\b",
+    re.IGNORECASE,
+)
+
+def route_stats():
+    """
+    Decisions and run time per route, e.g.
+    {"tools": {"chosen": 3, "runs": 3, "mean_seconds": 21.0}, "lean": {...},
+     "decided_by": {"heuristic": 4, "model": 1}}
+    """
+    decisions = registry.counter_values("scribe_tool_routes_total")
+    run_times = registry.histogram_totals("scribe_route_run_seconds")
+    stats = {}
+    for route in (TOOLS, LEAN):
+        runs = sum(total for labels, total, _ in run_times if labels.get("route") == route)
+        seconds = sum(seconds for labels, _, seconds in run_times if labels.get("route") == route)
+        stats[route] = {
+            "chosen": int(sum(value for labels, value in decisions if labels.get("route") == route)),
+            "runs": runs,
+            "mean_seconds": round(seconds / runs, 2) if runs else None,
+        }
+    decided_by = {}
+    for labels, value in decisions:
+        decided_by[labels["decided_by"]] = decided_by.get(labels["decided_by"], 0) + int(value)
+    stats["decided_by"] = decided_by
+    return stats
+
+
+# ===============================================
+#                 Classification
+# ===============================================
+
+def heuristic_route(notes: str):
+    """
+    TOOLS, LEAN or None (uncertain).
+    """
+    if FACT_CUES.search(notes):
+        return TOOLS
+    if not CLAIM_CUES.search(notes):
+        return LEAN
+    return None
+
+
+def build_classifier_prompt(notes: str):
+    return f"""
+Do these brainstorm notes contain facts, claims or questions that need an
+external, up-to-date source (a web search) to verify or answer well?
+General knowledge you are sure about does NOT need a search.
+
+Reply with exactly one word: TOOLS or NO_TOOLS.
+
+Notes:
+\"\"\"{notes[:CLASSIFIER_MAX_CHARS]}\"\"\"
+"""
+
+
+def model_route(notes: str, ask):
+    """
+    ask(prompt) -> raw text of the cheap model. Errors mean TOOLS.
+    """
+    try:
+        answer = ask(build_classifier_prompt(notes)) or ""
+    except Exception as e:
+        print(f"Tool classifier failed, using tools: {e}")
+        return TOOLS
+    return LEAN if "NO_TOOLS" in answer.upper().replace("-", "_").replace(" ", "_") else TOOLS
+
+
+def classify_notes(notes: str, ask=None, mode=None):
+    """
+    Notes -> TOOLS or LEAN. ask(prompt) -> text is the cheap model
+    (only used in "model" mode, for notes the heuristics can't decide).
+    """
+    mode = mode or TOOL_ROUTER
+    with span("classify_tools") as decision:
+        if mode == "off":
+            route, decided_by = TOOLS, "off"
+        else:
+            route, decided_by = heuristic_route(notes), "heuristic"
+            if route is None and mode == "model" and ask is not None:
+                route, decided_by = model_route(notes, ask), "model"
+            elif route is None:
+                route, decided_by = TOOLS, "default"
+        decision.update(route=route, decided_by=decided_by)
+    count("scribe_tool_routes_total", route=route, decided_by=decided_by)
+    return route
+
+
+def record_route_run(route, seconds):
+    """
+    Run time of one analysis on this route (for route_stats / metrics).
+    """
+    observe("scribe_route_run_seconds", seconds, route=route)
+
+
+@contextlib.contextmanager
+def route_timer(route):
+    """
+    Time one analysis on this route (failed runs are not recorded).
+    """
+    start = time.perf_counter()
+    yield
+    record_route_run(route, time.perf_counter() - start)
@@ -0,0 +1,227 @@
+
+"""
+Parallel verification of assumptions and questions.
+
+In a normal run one agent decides and executes every search for every
+assumption and question inside one long tool-calling loop: five
+assumptions mean five search rounds, one after the other. Instead:
+
+1. Extract: one call without tools lists Ideas, Assumptions, Questions
+   and a Title (cheap, nothing is verified yet).
+2. Verify: every assumption and question is checked by its own agent
+   run, all at the same time. Each run has a small tool budget
+   (VERIFY_TOOL_CALLS) and the stage has a deadline (VERIFY_TIMEOUT):
+   what isn't verified by then is reported as not verified.
+3. Assemble: the answers become "Assumption Checks" and "Verified
+   Answers", their sources become "Resources", and one last call
+   without tools writes Summary, Recommendations and Title (the reduce
+   step of chunking.py).
+
+The result has the normal JSON schema, so create_markdown() works on it
+unchanged. The stage costs more API calls (one per item + 2), so it is
+off unless SCRIBE_PARALLEL_VERIFY=1.
+"""
+
+
+import contextvars, os
+from concurrent.futures import ThreadPoolExecutor, wait
+from chunking import REDUCE_KEYS, build_reduce_prompt, merge_partials, combine_results
+from metrics import span, count
+
+
+PARALLEL_VERIFY = os.getenv("SCRIBE_PARALLEL_VERIFY", "0") == "1"
+VERIFY_WORKERS = int(os.getenv("SCRIBE_VERIFY_WORKERS", "4"))         # verifications at the same time
+VERIFY_TOOL_CALLS = int(os.getenv("SCRIBE_VERIFY_TOOL_CALLS", "2"))   # tool calls per verification
+VERIFY_TIMEOUT = float(os.getenv("SCRIBE_VERIFY_TIMEOUT", "60"))      # seconds for the whole stage
+VERIFY_MAX_ITEMS = int(os.getenv("SCRIBE_VERIFY_MAX_ITEMS", "12"))    # the rest is listed, not verified
+
+# Keys of the extract step and of one verification
+EXTRACT_KEYS = ["Ideas", "Assumptions", "Questions", "Title"]
+VERIFY_KEYS = ["Answer", "Resources", "Tools"]
+
+NOT_VERIFIED = "This could not be verified."
+
+
+# ===============================================
+#                 Prompts
+# ===============================================
+
+def build_extract_prompt(notes: str):
+    return f"""
+You are an expert brainstorm helper assistant.
+
+The user provides raw brainstorm notes as plain text. Do NOT use tools
+and do NOT answer or verify anything yet, only extract:
+
+- "Ideas": the content organized into clear ideas, without changing
+  the meaning (fix obvious spelling mistakes only).
+- "Assumptions": assumptions made by the user (explicit or implicit),
+  each one as a short, self-contained statement.
+- "Questions": questions in the notes (explicit or implied), each one
+  as a short, self-contained question.
+- "Title": a short, clear title that reflects the main topic.
+
+Do NOT invent facts or questions.
+
+INVALID INPUT:
+- If the input is meaningless, empty, or non-textual, return ONLY:
+
+  "error": "Invalid or insufficient content"
+
+OUTPUT FORMAT (MANDATORY):
+- Return ONE valid JSON object, no markdown, no text outside JSON.
+
+JSON SCHEMA (STRICT):
+
+  "Ideas": ["string"],
+  "Assumptions": ["string"],
+  "Questions": ["string"],
+  "Title": "string"
+
+
+User brainstorm content:
+\"\"\"{notes}\"\"\"
+"""
+
+
+def build_verify_prompt(kind: str, item: str, topic: str):
+    if kind == "assumption":
+        task = f"""Check this assumption the user made:
+"{item}"
+
+"Answer" MUST start with "Yes, this assumption is correct." OR
+"No, this assumption is incorrect. The correct information is: <correction>"
+followed by one or two sentences of explanation."""
+    else:
+        task = f"""Answer this question the user asked:
+"{item}"
+
+"Answer" is a clear, realistic answer in a few sentences."""
+
+    return f"""
+You are an expert fact checker helping with a brainstorm about "{topic}".
+
+{task}
+
+Use tools ONLY when external knowledge is required. You have at most
+{VERIFY_TOOL_CALLS} tool calls, then answer with what you know.
+Do NOT invent facts. Only list trustworthy sources you actually used
+in "Resources" (empty list if none).
+
+OUTPUT FORMAT (MANDATORY):
+- Return ONE valid JSON object, no markdown, no text outside JSON.
+
+JSON SCHEMA (STRICT):
+
+  "Answer": "string",
+  "Resources": ["string"],
+  "Tools": ["string"]
+"""
+
+
+# ===============================================
+#                 Assembling
+# ===============================================
+
+def verification_jobs(extracted):
+    """
+    (kind, item) for every assumption, then every question, at most
+    VERIFY_MAX_ITEMS in total.
+    """
+    jobs = [("assumption", item) for item in extracted.get("Assumptions") or []]
+    jobs += [("question", item) for item in extracted.get("Questions") or []]
+    return jobs[:VERIFY_MAX_ITEMS]
+
+
+def format_result(kind, item, result):
+    answer = result["Answer"] if result else NOT_VERIFIED
+    if kind == "assumption":
+        return f"Your assumption was: {item} {answer}"
+    return f"{item} → {answer}"
+
+
+def assemble(extracted, jobs, results):
+    """
+    Extracted lists + one result per job (None = not verified) ->
+    the map keys of the normal schema (chunking.MAP_KEYS).
+    """
+    checks = [format_result(kind, item, result) for (kind, item), result in zip(jobs, results) if kind == "assumption"]
+    answers = [format_result(kind, item, result) for (kind, item), result in zip(jobs, results) if kind == "question"]
+    partials = [{
+        "Ideas": extracted.get("Ideas", []),
+        "Assumptions": extracted.get("Assumptions", []),
+        "Questions": extracted.get("Questions", []),
+        "Assumption Checks": checks,
+        "Verified Answers": answers,
+    }]
+    # Sources and tools of every verification, duplicates dropped
+    partials += [{"Resources": r.get("Resources", []), "Tools": r.get("Tools", [])} for r in results if r]
+    return merge_partials(partials)
+
+
+def collect_results(jobs, futures):
+    """
+    One result per job from its future (thread) or task (asyncio),
+    once the deadline passed. Unfinished ones are cancelled if possible.
+    """
+    results = []
+    for (kind, item), future in zip(jobs, futures):
+        if not future.done() or future.cancelled():
+            future.cancel()
+            print(f"Verification timed out: {item}")
+            count("scribe_verifications_total", result="timeout")
+            results.append(None)
+        elif future.exception() is not None:
+            print(f"Verification failed: {item}: {future.exception()}")
+            count("scribe_verifications_total", result="error")
+            results.append(None)
+        else:
+            count("scribe_verifications_total", result="ok")
+            results.append(future.result())
+    return results
+
+
+# ===============================================
+#        Verification stage (sync version)
+# ===============================================
+
+def run_verifications(jobs, topic, verify, workers=VERIFY_WORKERS, timeout=VERIFY_TIMEOUT):
+    """
+    Verify every job at the same time. verify(prompt) -> dict with
+    VERIFY_KEYS, called from several threads at once.
+    Returns one result per job, None for failed or late ones (a late
+    run can't be stopped, its result is just ignored).
+    """
+    if not jobs:
+        return []
+
+    def verify_one(kind, item):
+        with span("verification", kind=kind):
+            return verify(build_verify_prompt(kind, item, topic))
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs))))
+    # Each verification runs in the caller's context (keeps the metrics trace id)
+    futures = [pool.submit(contextvars.copy_context().run, verify_one, kind, item) for kind, item in jobs]
+    wait(futures, timeout=timeout)
+    pool.shutdown(wait=False, cancel_futures=True)
+    return collect_results(jobs, futures)
+
+
+def verify_notes(notes, run_prompt, verify, workers=VERIFY_WORKERS, timeout=VERIFY_TIMEOUT):
+    """
+    Notes -> full result with every assumption and question verified
+    in parallel.
+
+    run_prompt(prompt, keys) -> parsed JSON dict (extract and summary,
+    no tools needed). verify(prompt) -> dict with VERIFY_KEYS.
+    """
+    extracted = run_prompt(build_extract_prompt(notes), EXTRACT_KEYS)
+    if "error" in extracted:
+        return extracted
+    jobs = verification_jobs(extracted)
+    print(f"Verifying {len(jobs)} assumptions/questions with {min(workers, len(jobs))} workers...")
+
+    results = run_verifications(jobs, extracted.get("Title", ""), verify, workers, timeout)
+    merged = assemble(extracted, jobs, results)
+    reduced = run_prompt(build_reduce_prompt(merged), REDUCE_KEYS)
+    return combine_results(merged, reduced)
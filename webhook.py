@@ -0,0 +1,192 @@
+
+"""
+Webhook server for the bot (alternative to polling).
+
+With polling, every bot process asks Telegram for new updates in a
+loop: updates arrive with a delay and only one process can poll a bot.
+With a webhook, Telegram POSTs every update to our URL, so several bot
+processes can run behind a load balancer.
+
+This is a small HTTP server on asyncio (no extra dependency):
+- POST <path>  one Telegram update (JSON), checked against the secret
+               token header, then handed to the telegram Application,
+- GET /healthz "ok" (for load balancers / process managers).
+
+It can be tested locally without Telegram by posting update JSON:
+
+    curl -X POST localhost:8443/telegram \\
+         -H "X-Telegram-Bot-Api-Secret-Token: $SCRIBE_WEBHOOK_SECRET" \\
+         -d '{"update_id": 1, "message": {...}}'
+"""
+
+
+import asyncio, hmac, json, os
+from telegram import Update
+
+
+WEBHOOK_HOST = os.getenv("SCRIBE_WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("SCRIBE_WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("SCRIBE_WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("SCRIBE_WEBHOOK_SECRET", "")
+# Public URL Telegram should call (e.g. https://bot.example.com/telegram).
+# Empty = the webhook is registered some other way.
+WEBHOOK_URL = os.getenv("SCRIBE_WEBHOOK_URL", "")
+
+MAX_BODY = 1024 * 1024   # bytes, Telegram updates are much smaller
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+# ===============================================
+#                 HTTP handling
+# ===============================================
+
+async def read_request(reader):
+    """
+    One HTTP/1.1 request -> (method, path, headers, body).
+    Returns None when the client closed the connection.
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ValueError("malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY:
+        raise OverflowError("body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path.split("?")[0], headers, body
+
+
+def write_response(writer, status, body=b"", keep_alive=True):
+    writer.write(
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        f"Content-Type: text/plain\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+    )
+
+
+class WebhookServer:
+    """
+    Receives updates over HTTP and puts them on app.update_queue.
+    The application must be built without an updater (see
+    ScribBot.build_application(webhook=True)).
+    """
+
+    def __init__(self, app, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.server = None
+        self.received = 0
+
+    async def handle_update(self, method, path, headers, body):
+        """
+        One request -> HTTP status code.
+        """
+        if path == "/healthz":
+            return 200
+        if path != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        # Constant time, so the response time doesn't tell how much of a guess was right
+        token = headers.get("x-telegram-bot-api-secret-token", "")
+        if self.secret and not hmac.compare_digest(token.encode("utf-8"), self.secret.encode("utf-8")):
+            return 403
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except Exception as e:
+            print(f"Bad update posted to the webhook: {e}")
+            return 400
+        self.received += 1
+        await self.app.update_queue.put(update)
+        return 200
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except OverflowError:
+                    write_response(writer, 413, keep_alive=False)
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    write_response(writer, 400, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status = await self.handle_update(method, path, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                write_response(writer, status, b"ok" if status == 200 else b"", keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"Webhook listening on http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+# ===============================================
+#                 Running the bot
+# ===============================================
+
+async def serve_webhook(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET, url=WEBHOOK_URL, stop_event=None):
+    """
+    Start the application and the webhook server, run until stop_event
+    is set (or forever), then shut everything down.
+    """
+    server = WebhookServer(app, host, port, path, secret)
+    async with app:
+        # Same hooks as app.run_polling() calls
+        if app.post_init:
+            await app.post_init(app)
+        if url:
+            await app.bot.set_webhook(url, secret_token=secret or None, allowed_updates=Update.ALL_TYPES)
+        await app.start()
+        await server.start()
+        try:
+            await (stop_event or asyncio.Event()).wait()
+        finally:
+            await server.stop()
+            await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+
+
+def run_webhook(app, **kwargs):
+    """
+    Blocking, like app.run_polling().
+    """
+    try:
+        asyncio.run(serve_webhook(app, **kwargs))
+    except KeyboardInterrupt:
+        pass
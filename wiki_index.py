@@ -0,0 +1,368 @@
+
+"""
+Offline Wikipedia: a local full-text index instead of the online API.
+
+Every Wikipedia lookup of the agent is a network round trip (and the
+instructions have to warn about PageError retry loops). Most of what the
+agent asks Wikipedia for is general knowledge that doesn't change, so
+it can come from a local SQLite FTS5 index built once from a dump:
+
+1. Ingest: a MediaWiki XML dump (pages-articles.xml[.bz2|.gz]) is read
+   as a stream (iterparse, every page is dropped once it's stored), so a
+   dump of many GB is indexed in bounded memory. JSON lines
+   ({"title", "text"}) and directories of .txt/.md files work too.
+2. Store: only the lead section of every article (plain text, markup
+   removed) + its title, and redirects.
+3. Lookup: exact title (or redirect) first, then a ranked full-text
+   search (bm25, matches in the title count more).
+
+local_wikipedia.py exposes it to the agent with the same
+search_wikipedia(query) interface as phi's WikipediaTools. It is used
+instead of the online tool when SCRIBE_WIKI_INDEX points to an index.
+
+    python wiki_index.py build enwiki-latest-pages-articles.xml.bz2
+    python wiki_index.py search "python programming language"
+"""
+
+
+import bz2, gzip, html, json, os, re, time
+from cache import SQLiteStore
+
+
+WIKI_INDEX_PATH = os.getenv("SCRIBE_WIKI_INDEX", "")              # empty = online Wikipedia
+WIKI_FALLBACK = os.getenv("SCRIBE_WIKI_FALLBACK", "0") == "1"      # online lookup when the index has nothing
+SUMMARY_CHARS = int(os.getenv("SCRIBE_WIKI_SUMMARY_CHARS", "1500"))
+
+MAX_LEAD_CHARS = 4000     # stored per article
+MAX_QUERY_WORDS = 12
+BATCH_PAGES = 2000        # pages per transaction while indexing
+
+
+# ===============================================
+#                 Pure Utilities
+# ===============================================
+
+def title_key(title: str):
+    """
+    "Python_(programming language)" and "python (Programming Language)"
+    are the same page.
+    """
+    return " ".join(title.replace("_", " ").split()).casefold()
+
+
+_BLOCKS = re.compile(r"\{\{|\}\}|\{\||\|\}")
+_COMMENTS = re.compile(r"<!--.*?-->", re.DOTALL)
+_REFS = re.compile(r"<ref[^>]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+_TAGS = re.compile(r"<[^>]+>")
+_FILE_LINKS = re.compile(r"\[\[(?:file|image|category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]", re.IGNORECASE)
+_LINKS = re.compile(r"\[\[(?:[^|\]]*\|)?([^\]]*)\]\]")
+_EXTERNAL_LINKS = re.compile(r"\[https?://\S+\s*([^\]]*)\]")
+_EMPHASIS = re.compile(r"'{2,}")
+_REDIRECT = re.compile(r"#redirect\s*\[\[([^\]|#]+)", re.IGNORECASE)
+
+
+def strip_blocks(text: str):
+    """
+    Drop templates {{...}} and tables {|...|}, nested ones too.
+    """
+    parts, depth, last = [], 0, 0
+    for match in _BLOCKS.finditer(text):
+        if match.group() in ("{{", "{|"):
+            if depth == 0:
+                parts.append(text[last:match.start()])
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                last = match.end()
+    if depth == 0:
+        parts.append(text[last:])
+    return "".join(parts)
+
+
+def wikitext_to_text(wikitext: str):
+    """
+    Lead section of an article (before the first heading) as plain text.
+    """
+    lead = re.split(r"\n=+[^=\n]+=+\s*\n", "\n" + wikitext, maxsplit=1)[0]
+    text = _COMMENTS.sub("", lead)
+    text = _REFS.sub("", text)
+    text = strip_blocks(text)
+    text = _FILE_LINKS.sub("", text)
+    text = _LINKS.sub(r"\1", text)
+    text = _EXTERNAL_LINKS.sub(r"\1", text)
+    text = _TAGS.sub("", text)
+    text = _EMPHASIS.sub("", text)
+    text = html.unescape(text)
+    paragraphs = (" ".join(p.split()) for p in text.split("\n\n"))
+    return "\n\n".join(p for p in paragraphs if p)[:MAX_LEAD_CHARS]
+
+
+def trim_summary(text: str, limit=SUMMARY_CHARS):
+    """
+    At most limit characters, cut at the end of a sentence when possible.
+    """
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    end = cut.rfind(". ")
+    return cut[:end + 1] if end > limit // 2 else cut
+
+
+def fts_query(query: str, operator=" "):
+    """
+    Free text -> FTS5 query of quoted words (no FTS syntax errors from
+    user text). " " means all words, " OR " any of them.
+    """
+    words = re.findall(r"\w+", query.casefold())[:MAX_QUERY_WORDS]
+    return operator.join(f'"{word}"' for word in words)
+
+
+# ===============================================
+#           Streaming readers (ingestion)
+# ===============================================
+# Every reader yields (title, text, redirect_target) one page at a
+# time; text is plain text, redirect_target is None for articles.
+
+def open_stream(path, mode="rb"):
+    if path.endswith(".bz2"):
+        return bz2.open(path, mode)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def read_mediawiki_dump(path):
+    """
+    Articles (namespace 0) and redirects of a MediaWiki XML dump.
+    Every page element is cleared once it's read, so memory stays flat.
+    """
+    from xml.etree.ElementTree import iterparse
+
+    with open_stream(path) as stream:
+        events = iterparse(stream, events=("start", "end"))
+        _, root = next(events)
+        for event, elem in events:
+            if event != "end" or elem.tag.rsplit("}", 1)[-1] != "page":
+                continue
+            fields = {child.tag.rsplit("}", 1)[-1]: child for child in elem}
+            title = fields["title"].text if "title" in fields else None
+            ns = fields["ns"].text if "ns" in fields else "0"
+            revision = fields.get("revision")
+            text = ""
+            if revision is not None:
+                for child in revision:
+                    if child.tag.rsplit("}", 1)[-1] == "text":
+                        text = child.text or ""
+            elem.clear()
+            root.clear()
+            if not title or ns != "0":
+                continue
+            redirect = fields.get("redirect")
+            if redirect is not None and redirect.get("title"):
+                yield title, "", redirect.get("title")
+                continue
+            match = _REDIRECT.match(text.lstrip())
+            if match:
+                yield title, "", match.group(1).strip()
+                continue
+            yield title, wikitext_to_text(text), None
+
+
+def read_json_lines(path):
+    """
+    {"title": ..., "text": ...} per line (e.g. WikiExtractor output).
+    """
+    with open_stream(path, "rt") as lines:
+        for line in lines:
+            if line.strip():
+                page = json.loads(line)
+                yield page["title"], " ".join(page["text"].split())[:MAX_LEAD_CHARS], None
+
+
+def read_text_files(directory):
+    """
+    Every .txt / .md file is one article, titled after the file name.
+    """
+    for folder, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.endswith((".txt", ".md")):
+                with open(os.path.join(folder, name), encoding="utf-8", errors="replace") as f:
+                    yield os.path.splitext(name)[0], f.read().strip()[:MAX_LEAD_CHARS], None
+
+
+def read_corpus(path):
+    if os.path.isdir(path):
+        return read_text_files(path)
+    if ".jsonl" in path or ".ndjson" in path:
+        return read_json_lines(path)
+    return read_mediawiki_dump(path)
+
+
+# ===============================================
+#                 SQLite FTS5 Index
+# ===============================================
+
+class WikiIndex(SQLiteStore):
+    """
+    Titles, lead sections and redirects in SQLite with an FTS5 table.
+    """
+
+    def __init__(self, path=WIKI_INDEX_PATH):
+        super().__init__(path)
+
+    def _create_tables(self, conn):
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(title, summary, tokenize='porter unicode61')")
+        conn.execute("CREATE TABLE IF NOT EXISTS titles (key TEXT PRIMARY KEY, page INTEGER NOT NULL) WITHOUT ROWID")
+        conn.execute("CREATE TABLE IF NOT EXISTS redirects (key TEXT PRIMARY KEY, target TEXT NOT NULL) WITHOUT ROWID")
+
+    def add_pages(self, pages):
+        """
+        Store (title, text, redirect_target) pages in one transaction.
+        A title that is already indexed is replaced.
+        """
+        with self._lock, self._conn:
+            for title, text, redirect in pages:
+                key = title_key(title)
+                if redirect is not None:
+                    self._conn.execute("INSERT OR REPLACE INTO redirects (key, target) VALUES (?, ?)", (key, redirect))
+                    continue
+                if not text:
+                    continue
+                old = self._conn.execute("SELECT page FROM titles WHERE key = ?", (key,)).fetchone()
+                if old is not None:
+                    self._conn.execute("DELETE FROM pages WHERE rowid = ?", old)
+                page = self._conn.execute("INSERT INTO pages (title, summary) VALUES (?, ?)", (title, text)).lastrowid
+                self._conn.execute("INSERT OR REPLACE INTO titles (key, page) VALUES (?, ?)", (key, page))
+
+    def optimize(self):
+        """
+        Merge the FTS segments written while indexing (faster lookups).
+        """
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO pages (pages) VALUES ('optimize')")
+
+    def page(self, title):
+        """
+        (title, summary) of the page with this title (redirects followed), or None.
+        """
+        key = title_key(title)
+        with self._lock:
+            redirect = self._conn.execute("SELECT target FROM redirects WHERE key = ?", (key,)).fetchone()
+            if redirect is not None:
+                key = title_key(redirect[0])
+            return self._conn.execute(
+                "SELECT pages.title, pages.summary FROM titles JOIN pages ON pages.rowid = titles.page WHERE titles.key = ?",
+                (key,),
+            ).fetchone()
+
+    def search(self, query, limit=5):
+        """
+        Best matching (title, summary) pages: every word first, any word
+        if that finds nothing. Words in the title weigh more.
+        """
+        for operator in (" ", " OR "):
+            match = fts_query(query, operator)
+            if not match:
+                return []
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT title, summary FROM pages WHERE pages MATCH ? ORDER BY bm25(pages, 10.0, 1.0) LIMIT ?",
+                    (match, limit),
+                ).fetchall()
+            if rows:
+                return rows
+        return []
+
+    def lookup(self, query):
+        """
+        Query -> (title, summary) of the best page, or None.
+        """
+        page = self.page(query)
+        if page is None:
+            pages = self.search(query, limit=1)
+            page = pages[0] if pages else None
+        if page is None:
+            return None
+        return page[0], trim_summary(page[1])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+
+
+def build_index(corpus_path, index_path, batch=BATCH_PAGES, limit=None, progress_every=50000):
+    """
+    Stream a dump/corpus into the index, batch by batch.
+    Returns {"pages", "redirects", "seconds", "peak_rss_mb"} (peak_rss_mb is None
+    where the resource module is missing, e.g. Windows).
+    """
+    index = WikiIndex(index_path)
+    index._conn.execute("PRAGMA synchronous=OFF")
+    start = time.perf_counter()
+    pages = redirects = 0
+    pending = []
+    for page in read_corpus(corpus_path):
+        pending.append(page)
+        if page[2] is None:
+            pages += 1
+        else:
+            redirects += 1
+        if len(pending) >= batch:
+            index.add_pages(pending)
+            pending = []
+        if progress_every and (pages + redirects) % progress_every == 0:
+            print(f"{pages} articles, {redirects} redirects, {time.perf_counter() - start:.0f}s")
+        if limit and pages >= limit:
+            break
+    index.add_pages(pending)
+    index.optimize()
+    try:
+        import resource   # Unix only
+        peak_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        peak_rss_mb = None
+    return {
+        "pages": pages,
+        "redirects": redirects,
+        "seconds": round(time.perf_counter() - start, 2),
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+# ===============================================
+#                 CLI
+# ===============================================
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline Wikipedia index for Scribe")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="index a dump, JSON lines file or directory of text files")
+    build.add_argument("corpus")
+    build.add_argument("--index", default=WIKI_INDEX_PATH or "wiki_index.db")
+    build.add_argument("--batch", type=int, default=BATCH_PAGES, help="pages per transaction")
+    build.add_argument("--limit", type=int, help="stop after this many articles")
+
+    search = commands.add_parser("search", help="look up a query like the agent does")
+    search.add_argument("query")
+    search.add_argument("--index", default=WIKI_INDEX_PATH or "wiki_index.db")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        stats = build_index(args.corpus, args.index, args.batch, args.limit)
+        size = os.path.getsize(args.index) / 1e6
+        print(f"Indexed {stats['pages']} articles and {stats['redirects']} redirects in {stats['seconds']}s "
+              f"(peak memory {stats['peak_rss_mb']} MB, index {size:.1f} MB)")
+    else:
+        start = time.perf_counter()
+        page = WikiIndex(args.index).lookup(args.query)
+        took = (time.perf_counter() - start) * 1000
+        print(f"{page[0]}\n\n{page[1]}" if page else "Nothing found.")
+        print(f"\n({took:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+
+"""
+Multi-process mode for the bot: one front process, N worker processes.
+
+One bot process runs all the CPU-side work (prompt building, JSON
+parsing, markdown rendering, phi's own overhead) on a single core. Here:
+
+- the front process receives updates (polling or webhook) and only
+  forwards them, as JSON, to a worker,
+- the worker is chosen by chat id, so all messages and commands of a
+  chat (including /cancel) go to the same worker, in the order they came,
+- every worker runs the normal bot handlers (queue, cache, agents) and
+  sends its replies to Telegram itself with the same bot token,
+- the front checks the workers: a worker that died or stopped sending
+  heartbeats (its event loop is stuck) is killed and started again.
+
+    python ScribBot.py --workers 4
+"""
+
+
+import asyncio, multiprocessing, os, queue, time
+from telegram import Update
+from telegram.ext import ApplicationBuilder, TypeHandler
+
+
+WORKERS = int(os.getenv("SCRIBE_WORKERS", "0"))                              # 0 = single process
+HEARTBEAT_INTERVAL = float(os.getenv("SCRIBE_WORKER_HEARTBEAT", "1"))        # seconds
+HEARTBEAT_TIMEOUT = float(os.getenv("SCRIBE_WORKER_HEARTBEAT_TIMEOUT", "30"))  # seconds without heartbeat = stuck
+
+
+def shard_for(chat_id, workers):
+    """
+    Same chat -> same worker, every time.
+    """
+    return int(chat_id or 0) % workers
+
+
+# ===============================================
+#                 Worker process
+# ===============================================
+
+def worker_main(index, token, updates, heartbeat):
+    """
+    Entry point of a worker process.
+    """
+    try:
+        asyncio.run(_worker_loop(index, token, updates, heartbeat))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_loop(index, token, updates, heartbeat):
+    # Imported here: the worker builds its own agents, pools and caches
+    import ScribBot
+    from metrics import METRICS_PORT, start_metrics_server
+
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT) + 1 + index)
+    app = ScribBot.build_application(token, webhook=True)
+    ScribBot.agent_pool.prewarm([ScribBot.model_router.pick()], count=ScribBot.MAX_CONCURRENT_RUNS)
+    async with app:
+        await app.start()
+        print(f"Worker {index} ready (pid {os.getpid()})")
+        while True:
+            heartbeat.value = time.time()
+            try:
+                data = await asyncio.to_thread(updates.get, True, HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                continue
+            if data is None:
+                break
+            await app.update_queue.put(Update.de_json(data, app.bot))
+        await app.stop()
+
+
+# ===============================================
+#                 Front process
+# ===============================================
+
+class Worker:
+    def __init__(self, index, token, context):
+        self.index = index
+        self.token = token
+        self.context = context
+        self.updates = context.Queue()
+        self.heartbeat = context.Value("d", 0.0)
+        self.process = None
+        self.restarts = 0
+        self.started_at = 0.0
+
+    def start(self):
+        self.heartbeat.value = time.time()
+        self.started_at = time.time()
+        self.process = self.context.Process(
+            target=worker_main,
+            args=(self.index, self.token, self.updates, self.heartbeat),
+            name=f"scribe-worker-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+
+    def healthy(self, timeout):
+        return self.process.is_alive() and time.time() - self.heartbeat.value < timeout
+
+    def stop(self, timeout=10):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.updates.put(None)
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class WorkerPool:
+    """
+    Starts the workers, forwards updates by chat id, restarts workers
+    that crashed or hang.
+    """
+
+    def __init__(self, count, token, heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        # spawn: every worker starts from a clean interpreter, no threads
+        # or connections copied from the front process
+        context = multiprocessing.get_context("spawn")
+        self.workers = [Worker(i, token, context) for i in range(count)]
+        self.heartbeat_timeout = heartbeat_timeout
+        self.forwarded = 0
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def dispatch(self, update):
+        chat = update.effective_chat
+        worker = self.workers[shard_for(chat.id if chat else 0, len(self.workers))]
+        worker.updates.put(update.to_dict())
+        self.forwarded += 1
+
+    def check(self):
+        """
+        Restart every worker that died or stopped sending heartbeats.
+        A new worker gets some time to start before it is checked.
+        Returns the indexes of restarted workers.
+        """
+        restarted = []
+        for worker in self.workers:
+            starting = time.time() - worker.started_at < self.heartbeat_timeout
+            if worker.healthy(self.heartbeat_timeout) or (starting and worker.process.is_alive()):
+                continue
+            reason = "exited" if not worker.process.is_alive() else "stopped responding"
+            print(f"Worker {worker.index} {reason} (exit code {worker.process.exitcode}), restarting it")
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.process.join()
+            worker.restarts += 1
+            worker.start()
+            restarted.append(worker.index)
+        return restarted
+
+    async def monitor(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            self.check()
+
+    def stats(self):
+        return [
+            {
+                "worker": worker.index,
+                "pid": worker.process.pid if worker.process else None,
+                "alive": worker.process.is_alive() if worker.process else False,
+                "restarts": worker.restarts,
+            }
+            for worker in self.workers
+        ]
+
+
+def build_front_application(pool, token, webhook=False):
+    """
+    The front process' Application: no bot handlers, every update is
+    forwarded to a worker. Starts the workers and their health checks
+    with the application, stops them with it.
+    """
+
+    async def forward(update, context):
+        pool.dispatch(update)
+
+    async def post_init(app):
+        pool.start()
+        app.bot_data["worker_monitor"] = asyncio.create_task(pool.monitor())
+
+    async def post_shutdown(app):
+        monitor = app.bot_data.pop("worker_monitor", None)
+        if monitor is not None:
+            monitor.cancel()
+        await asyncio.to_thread(pool.stop)
+
+    builder = ApplicationBuilder().token(token).concurrent_updates(True).post_init(post_init).post_shutdown(post_shutdown)
+    if webhook:
+        builder = builder.updater(None)
+    app = builder.build()
+    app.add_handler(TypeHandler(Update, forward))
+    return app